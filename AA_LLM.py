@@ -6,14 +6,16 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Google Gemini API endpoint
+# GEMINI_API_BASE can point at a local stand-in (see mock_gemini_server.py), which needs no key
+API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1").rstrip("/")
 API_KEY = os.getenv("GEMINI_API_KEY")
-if not API_KEY:
+if not API_KEY and "GEMINI_API_BASE" not in os.environ:
     raise ValueError(
         "GEMINI_API_KEY not found in environment variables. "
         "Please create a .env file with your API key. "
         "See .env.example for reference."
     )
-API_URL = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash:generateContent?key={API_KEY}"
+API_URL = f"{API_BASE}/models/gemini-2.5-flash:generateContent?key={API_KEY or 'unused'}"
 
 
 def get_architecture_advice(prompt):
@@ -0,0 +1,339 @@
+"""
+Retrieval quality and speed evaluation for the Telecom Architecture Advisor.
+
+Ingests the bundled knowledge_base/ documents at each chunk size in a grid,
+runs the golden query set (benchmarks/golden_queries.json) through
+hybrid_search for every semantic-weight / n_results combination, and reports
+per configuration:
+
+- recall@k, MRR and nDCG@k against the expected source/phrase judgements
+- retrieval latency (hybrid_search plus context formatting, p50/p95)
+- context tokens added to the prompt (estimated at 4 characters per token)
+
+Chunk sizes are evaluated in parallel worker processes, each with its own
+scratch directory and in-memory ChromaDB. The report marks the Pareto-optimal
+configurations (no other configuration is at least as good on quality, latency
+and tokens and better on one) and the change of every configuration against
+the current settings (CHUNK_SIZE, HYBRID_SEMANTIC_WEIGHT, RETRIEVAL_RESULTS),
+so a faster setting that loses grounding is visible before it ships.
+
+With --rerank, every configuration is also evaluated with cross-encoder
+reranking (RERANK): hybrid_search fetches --rerank-candidates chunks and the
+best k by cross-encoder score are kept. Comparing a reranked small k against
+a wide k without reranking shows the prompt tokens saved and what the
+reranker costs in latency, at equal or better recall and nDCG.
+
+Usage:
+    python benchmarks/eval_retrieval.py
+    python benchmarks/eval_retrieval.py --chunk-sizes 150,300,500 --weights 0.5,0.7,1.0 --k 3,5 --markdown eval.md
+    python benchmarks/eval_retrieval.py --chunk-sizes 500 --weights 0.7 --k 3 --min-recall 0.8 --min-ndcg 0.6
+    python benchmarks/eval_retrieval.py --chunk-sizes 500 --weights 0.7 --k 3,10 --rerank --rerank-candidates 20
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.append(REPO_ROOT)
+
+from run_benchmarks import MOCK_PORT, git_revision, knowledge_files, percentile, scratch_collection  # noqa: E402
+
+DEFAULT_GOLDEN = os.path.join(BENCH_DIR, "golden_queries.json")
+CHARS_PER_TOKEN = 4
+
+# Higher is better for these; lower is better for the cost metrics
+QUALITY_METRICS = ("recall_at_k", "mrr", "ndcg_at_k")
+COST_METRICS = ("p95_ms", "context_tokens")
+CONFIG_FIELDS = ("chunk_size", "semantic_weight", "k", "rerank_candidates")
+
+
+# --- Scoring ---
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def matches(doc: str, meta: Dict, expected: Dict) -> bool:
+    """A chunk satisfies an expected entry if it comes from that source and contains the phrase."""
+    return meta.get("source") == expected["source"] and _normalize(expected["contains"]) in _normalize(doc)
+
+
+def score_ranking(docs: List[str], metadatas: List[Dict], expected: List[Dict], k: int) -> Dict[str, float]:
+    """
+    recall@k, reciprocal rank and nDCG@k for one ranked result list.
+
+    Gains are binary and each expected entry is credited once, at the first
+    chunk that satisfies it, so several chunks quoting the same phrase don't
+    push nDCG above 1.
+    """
+    found = set()
+    first_hit: Optional[int] = None
+    dcg = 0.0
+    for rank, (doc, meta) in enumerate(zip(docs[:k], metadatas[:k]), 1):
+        new = {i for i, item in enumerate(expected) if i not in found and matches(doc, meta, item)}
+        if new:
+            found |= new
+            first_hit = first_hit or rank
+            dcg += 1 / math.log2(rank + 1)
+    ideal = sum(1 / math.log2(rank + 1) for rank in range(1, min(len(expected), k) + 1))
+    return {
+        "recall_at_k": len(found) / len(expected),
+        "mrr": 1 / first_hit if first_hit else 0.0,
+        "ndcg_at_k": dcg / ideal if ideal else 0.0,
+    }
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+# --- Worker side ---
+
+def _init_worker(workdir: str) -> None:
+    """Give each worker process its own scratch directory (vector store, analytics, logs)."""
+    path = tempfile.mkdtemp(prefix=f"worker_{os.getpid()}_", dir=workdir)
+    os.chdir(path)
+    # Retrieval only: Gemini is never called, so don't require an API key
+    os.environ.setdefault("GEMINI_API_BASE", f"http://127.0.0.1:{MOCK_PORT}/v1beta")
+
+
+def evaluate_config(advisor, golden: List[Dict], weight: float, k: int, repeats: int,
+                    rerank_candidates: int = 0) -> Dict:
+    """
+    Run every golden query against the current collection with one weight / k setting.
+
+    With rerank_candidates, that many hybrid results are reranked by the
+    cross-encoder and the top k kept. Reranker scores are cached per (query,
+    chunk), so the cache is cleared before each timed run.
+    """
+    latencies: List[float] = []
+    per_query: List[Dict] = []
+    reranker = advisor.get_reranker() if rerank_candidates else None
+    for item in golden:
+        for _ in range(repeats):
+            if reranker is not None:
+                reranker.cache.clear()
+            start = time.perf_counter()
+            docs, metadatas, scores = advisor.hybrid_search(item["question"], n_results=max(k, rerank_candidates),
+                                                            semantic_weight=weight)
+            if reranker is not None:
+                docs, metadatas, scores = reranker.rerank([item["question"]], [(docs, metadatas, scores)], [k])[0]
+            context, _ = advisor.format_context_with_citations(docs, metadatas, scores)
+            latencies.append(time.perf_counter() - start)
+        quality = score_ranking(docs, metadatas, item["expected"], k)
+        per_query.append({
+            "id": item["id"],
+            **{name: round(value, 4) for name, value in quality.items()},
+            "context_tokens": estimate_tokens(context),
+            "retrieved": [meta.get("source") for meta in metadatas],
+        })
+    return {
+        **{name: round(statistics.mean(q[name] for q in per_query), 4) for name in QUALITY_METRICS},
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "context_tokens": round(statistics.mean(q["context_tokens"] for q in per_query), 1),
+        "misses": [q["id"] for q in per_query if q["recall_at_k"] < 1.0],
+        "queries": per_query,
+    }
+
+
+def configurations(chunk_sizes: List[int], weights: List[float], ks: List[int],
+                   rerank_candidates: int = 0) -> List[Tuple[int, float, int, int]]:
+    """Every evaluated (chunk_size, semantic_weight, k, rerank_candidates), each also reranked if given."""
+    return [(chunk_size, weight, k, candidates)
+            for chunk_size in chunk_sizes for weight in weights for k in ks
+            for candidates in ([0, rerank_candidates] if rerank_candidates else [0])]
+
+
+def evaluate_chunk_size(chunk_size: int, weights: List[float], ks: List[int],
+                        golden: List[Dict], repeats: int, rerank_candidates: int = 0) -> List[Dict]:
+    """
+    Ingest the knowledge base at one chunk size and evaluate every weight / k combination on it
+    (each also reranked from rerank_candidates, if given).
+    """
+    import chromadb
+    import telecom_advisor_enhanced as advisor
+
+    client = chromadb.EphemeralClient()
+    advisor.CHUNK_SIZE = chunk_size
+    advisor.RERANK = bool(rerank_candidates)
+    paths = [path for group in knowledge_files().values() for path in group]
+    results = []
+    with scratch_collection(advisor, client, f"eval_chunks_{chunk_size}") as collection:
+        start = time.perf_counter()
+        advisor.upload_multiple_files(paths, "evaluation", "evaluation")
+        ingest_seconds = time.perf_counter() - start
+        # Warm the embedding model and BM25 path so the first configuration isn't penalised
+        advisor.hybrid_search(golden[0]["question"], n_results=max(ks))
+        advisor.get_reranker()  # load the cross-encoder before anything is timed
+        for _, weight, k, candidates in configurations([chunk_size], weights, ks, rerank_candidates):
+            result = {"chunk_size": chunk_size, "semantic_weight": weight, "k": k,
+                      "rerank_candidates": candidates,
+                      "corpus_chunks": collection.count(), "ingest_seconds": round(ingest_seconds, 2)}
+            result.update(evaluate_config(advisor, golden, weight, k, repeats, candidates))
+            results.append(result)
+    return results
+
+
+# --- Report ---
+
+def config_key(result: Dict) -> Tuple[int, float, int, int]:
+    return result["chunk_size"], result["semantic_weight"], result["k"], result["rerank_candidates"]
+
+
+def dominates(a: Dict, b: Dict) -> bool:
+    """True if a is no worse than b on every objective and strictly better on at least one."""
+    no_worse = (all(a[m] >= b[m] for m in QUALITY_METRICS) and all(a[m] <= b[m] for m in COST_METRICS))
+    better = (any(a[m] > b[m] for m in QUALITY_METRICS) or any(a[m] < b[m] for m in COST_METRICS))
+    return no_worse and better
+
+
+def mark_pareto(results: List[Dict]) -> None:
+    for result in results:
+        result["pareto"] = not any(dominates(other, result) for other in results if other is not result)
+
+
+def add_deltas(results: List[Dict], reference: Dict) -> None:
+    """Change of each metric against the reference configuration; flags any loss of grounding quality."""
+    for result in results:
+        result["delta"] = {m: round(result[m] - reference[m], 4) for m in QUALITY_METRICS + COST_METRICS}
+        result["degrades_grounding"] = any(result["delta"][m] < 0 for m in QUALITY_METRICS)
+
+
+def markdown_table(results: List[Dict], reference_key: Tuple[int, float, int, int]) -> str:
+    lines = [
+        "| chunk_size | weight | k | rerank | recall@k | MRR | nDCG@k | p50 ms | p95 ms | ctx tokens | Pareto | vs current |",
+        "|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|:---:|---|",
+    ]
+    for r in results:
+        if config_key(r) == reference_key:
+            note = "current"
+        else:
+            d = r["delta"]
+            note = (f"nDCG {d['ndcg_at_k']:+.3f}, recall {d['recall_at_k']:+.3f}, "
+                    f"p95 {d['p95_ms']:+.1f} ms, tokens {d['context_tokens']:+.0f}")
+            if r["degrades_grounding"]:
+                note = "⚠ " + note
+        lines.append(
+            f"| {r['chunk_size']} | {r['semantic_weight']:.2f} | {r['k']} "
+            f"| {'top ' + str(r['rerank_candidates']) if r['rerank_candidates'] else '-'} "
+            f"| {r['recall_at_k']:.3f} | {r['mrr']:.3f} "
+            f"| {r['ndcg_at_k']:.3f} | {r['p50_ms']:.1f} | {r['p95_ms']:.1f} | {r['context_tokens']:.0f} "
+            f"| {'★' if r['pareto'] else ''} | {note} |"
+        )
+    return "\n".join(lines)
+
+
+def _parse_list(value: str, cast) -> List:
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Telecom Architecture Advisor retrieval evaluation")
+    parser.add_argument("--golden", default=DEFAULT_GOLDEN, help="Golden query set (JSON)")
+    parser.add_argument("--chunk-sizes", default="150,300,500", help="Words per chunk to evaluate")
+    parser.add_argument("--weights", default="0.3,0.5,0.7,1.0", help="Semantic weights for hybrid_search")
+    parser.add_argument("--k", default="3,5", help="n_results values (chunks put in the prompt)")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per query and configuration")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Parallel worker processes (default: one per chunk size, capped at CPU count; "
+                             "use 1 for the least noisy latency numbers)")
+    parser.add_argument("--rerank", action="store_true",
+                        help="Also evaluate every configuration with cross-encoder reranking (RERANK_MODEL)")
+    parser.add_argument("--rerank-candidates", type=int, default=int(os.getenv("RERANK_CANDIDATES", "20")),
+                        help="hybrid_search results the cross-encoder reranks down to k")
+    parser.add_argument("--output", default="eval_results.json", help="Where to write JSON results")
+    parser.add_argument("--markdown", help="Also write the Pareto report as a markdown table")
+    parser.add_argument("--min-recall", type=float, help="Exit 1 if the current configuration's recall@k is lower")
+    parser.add_argument("--min-ndcg", type=float, help="Exit 1 if the current configuration's nDCG@k is lower")
+    args = parser.parse_args()
+    args.repeats = max(1, args.repeats)
+
+    with open(args.golden, encoding="utf-8") as f:
+        golden = json.load(f)["queries"]
+    output = os.path.abspath(args.output)
+    markdown = os.path.abspath(args.markdown) if args.markdown else None
+
+    # The configuration currently deployed is always part of the grid so every row has a reference
+    rerank_candidates = args.rerank_candidates if args.rerank else 0
+    current_rerank = os.getenv("RERANK", "false").lower() == "true"
+    reference_key = (int(os.getenv("CHUNK_SIZE", "500")), float(os.getenv("HYBRID_SEMANTIC_WEIGHT", "0.7")),
+                     int(os.getenv("RETRIEVAL_RESULTS", "3")), rerank_candidates if current_rerank else 0)
+    chunk_sizes = sorted(set(_parse_list(args.chunk_sizes, int)) | {reference_key[0]})
+    weights = sorted(set(_parse_list(args.weights, float)) | {reference_key[1]})
+    ks = sorted(set(_parse_list(args.k, int)) | {reference_key[2]})
+
+    workdir = tempfile.mkdtemp(prefix="advisor_eval_")
+    workers = args.workers or min(len(chunk_sizes), os.cpu_count() or 1)
+    grid = configurations(chunk_sizes, weights, ks, rerank_candidates)
+    print(f"Evaluating {len(grid)} configurations on {len(golden)} queries with {workers} worker(s)...")
+    start = time.perf_counter()
+    # spawn: workers load their own embedding model instead of inheriting a forked one
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(workdir,)) as pool:
+        futures = [pool.submit(evaluate_chunk_size, size, weights, ks, golden, args.repeats, rerank_candidates)
+                   for size in chunk_sizes]
+        results = [result for future in futures for result in future.result()]
+    elapsed = time.perf_counter() - start
+
+    reference = next(r for r in results if config_key(r) == reference_key)
+    mark_pareto(results)
+    add_deltas(results, reference)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "workers": workers,
+            "golden_set": os.path.relpath(os.path.abspath(args.golden), REPO_ROOT),
+            "queries": len(golden),
+            "repeats": args.repeats,
+            "elapsed_seconds": round(elapsed, 1),
+            "reference": dict(zip(CONFIG_FIELDS, reference_key)),
+            "rerank_model": os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2") if args.rerank else None,
+        },
+        "pareto": [dict(zip(CONFIG_FIELDS, config_key(r))) for r in results if r["pareto"]],
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    table = markdown_table(results, reference_key)
+    if markdown:
+        with open(markdown, "w", encoding="utf-8") as f:
+            f.write(f"# Retrieval evaluation ({report['meta']['timestamp']}, {report['meta']['git_revision']})\n\n"
+                    f"{len(golden)} golden queries, ★ = Pareto-optimal, ⚠ = lower recall/MRR/nDCG than current\n\n"
+                    f"{table}\n")
+    print()
+    print(table)
+    if reference["misses"]:
+        print(f"\nCurrent configuration misses: {', '.join(reference['misses'])}")
+    print(f"\n✓ Results written to {output}" + (f" and {markdown}" if markdown else ""))
+
+    failures = []
+    if args.min_recall is not None and reference["recall_at_k"] < args.min_recall:
+        failures.append(f"recall@k {reference['recall_at_k']:.3f} < {args.min_recall}")
+    if args.min_ndcg is not None and reference["ndcg_at_k"] < args.min_ndcg:
+        failures.append(f"nDCG@k {reference['ndcg_at_k']:.3f} < {args.min_ndcg}")
+    if failures:
+        print(f"\n✗ Current configuration below quality floor: {'; '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,584 @@
+"""
+End-to-end benchmark suite for the Telecom Architecture Advisor.
+
+Measures ingestion throughput per file type, chunk_text and embedding
+throughput, query-embedding throughput from concurrent callers with and
+without micro-batching, hybrid_search / retrieve_context_with_citations latency on
+synthetic corpora (1k/10k/100k chunks), 1,000-question workloads retrieved one
+by one against retrieve_context_with_citations_batch, one collection against
+domain shards (SHARD_KEY), knowledge-base snapshot build and
+restore against re-ingestion, and full get_architecture_advice_with_rag
+latency against the in-process mock Gemini server - also with a wide
+n_results against cross-encoder reranking (RERANK) of more candidates down to
+RETRIEVAL_RESULTS, reporting the prompt tokens each sends. Results (p50/p95/p99,
+ops/s, memory high-water mark) are written as JSON and can be compared against
+a stored baseline to catch regressions before deploying. The embedding
+backend in use (EMBEDDING_BACKEND) is recorded with the results; run the
+suite once per backend to compare them.
+
+Everything runs in a scratch working directory with an in-memory ChromaDB, so
+the real ./chroma_db and analytics.json are never touched.
+
+Usage:
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --sizes 1000,10000,100000 --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --max-regression 0.2
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+
+MOCK_PORT = 8097
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.md', '.txt')
+
+
+# --- Measurement helpers ---
+
+def reset_peak_rss() -> None:
+    """Reset the kernel's peak-RSS counter (Linux only; no-op elsewhere)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size since the last reset, in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KB on Linux, bytes on macOS, and never resets
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def measure(fn: Callable[[], Optional[int]], iterations: int, warmup: int = 1,
+            units: str = "ops") -> Dict:
+    """
+    Time fn over several iterations.
+
+    fn may return a work count (e.g. chunks produced) so throughput is reported
+    in those units; otherwise each call counts as one operation.
+    """
+    for _ in range(warmup):
+        fn()
+    gc.collect()
+    reset_peak_rss()
+    latencies, work = [], 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        done = fn()
+        latencies.append(time.perf_counter() - start)
+        work += done if isinstance(done, int) else 1
+    total = sum(latencies)
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "ops_per_sec": round(work / total, 3) if total else 0.0,
+        "units": units,
+        "rss_hwm_mb": round(peak_rss_mb(), 1),
+    }
+
+
+# --- Fixtures ---
+
+@contextmanager
+def scratch_collection(advisor, client, name: str) -> Iterator:
+    """Point the advisor at a fresh in-memory collection (unsharded) for the duration of the block."""
+    original, original_shards = advisor.collection, advisor.shard_set
+    collection = client.get_or_create_collection(name=name, embedding_function=advisor.embedding_function)
+    advisor.collection, advisor.shard_set = collection, None
+    try:
+        yield collection
+    finally:
+        advisor.collection, advisor.shard_set = original, original_shards
+        client.delete_collection(name)
+
+
+@contextmanager
+def scratch_shards(advisor, client, name: str, key: str = "domain") -> Iterator:
+    """Point the advisor at a fresh in-memory knowledge base sharded by key for the duration of the block."""
+    from telecom_advisor_shards import ShardSet
+    original = advisor.shard_set
+    shard_set = ShardSet(client, advisor.embedding_function, name, key, workers=advisor.SHARD_WORKERS)
+    advisor.shard_set = shard_set
+    try:
+        yield shard_set
+    finally:
+        advisor.shard_set = original
+        shard_set.pool.shutdown()
+        for shard in shard_set.shards():
+            client.delete_collection(shard.name)
+
+
+def knowledge_files() -> Dict[str, List[str]]:
+    """Bundled knowledge_base/ files grouped by extension."""
+    files: Dict[str, List[str]] = {}
+    kb_dir = os.path.join(REPO_ROOT, "knowledge_base")
+    for fname in sorted(os.listdir(kb_dir)):
+        ext = os.path.splitext(fname)[1].lower()
+        if ext in SUPPORTED_EXTENSIONS:
+            files.setdefault(ext, []).append(os.path.join(kb_dir, fname))
+    return files
+
+
+def vocabulary() -> List[str]:
+    """Words from the bundled markdown docs, used to generate realistic synthetic chunks."""
+    words: List[str] = []
+    for path in knowledge_files().get(".md", []):
+        with open(path, encoding="utf-8") as f:
+            words.extend(w for w in f.read().split() if w.isalpha())
+    return words or ["telecom", "billing", "microservices", "latency", "network", "api"]
+
+
+def synthetic_chunks(words: List[str], count: int, length: int = 120, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(words, k=length)) for _ in range(count)]
+
+
+def populate_synthetic(collection, chunks: List[str], dim: int, seed: int = 11,
+                       domains: Tuple[str, ...] = ("benchmark",)) -> None:
+    """
+    Bulk-load chunks with random unit vectors (retrieval cost doesn't depend on embedding quality).
+
+    Chunks are assigned to domains round-robin.
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    batch = 5000
+    for start in range(0, len(chunks), batch):
+        texts = chunks[start:start + batch]
+        vectors = rng.standard_normal((len(texts), dim)).astype("float32")
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        collection.add(
+            ids=[f"syn_{start + i}" for i in range(len(texts))],
+            documents=texts,
+            embeddings=vectors.tolist(),
+            metadatas=[{"topic": "synthetic", "domain": domains[(start + i) % len(domains)], "chunk_index": start + i}
+                       for i in range(len(texts))],
+        )
+
+
+QUERIES = [
+    "How should a telecom billing platform scale during peak traffic?",
+    "Compare microservices and monolithic deployment for rating and mediation",
+    "Which TM Forum Open APIs cover customer management?",
+    "What are the drawbacks of a monolithic billing system?",
+    "How does service inventory track service instances?",
+]
+
+
+# --- Benchmarks ---
+
+def bench_ingestion(advisor, client, iterations: int) -> Dict[str, Dict]:
+    results = {}
+    uploaders = {
+        ".pdf": advisor.upload_pdf_to_knowledge_base,
+        ".docx": advisor.upload_word_doc_to_knowledge_base,
+        ".md": advisor.upload_text_file_to_knowledge_base,
+        ".txt": advisor.upload_text_file_to_knowledge_base,
+    }
+    for ext, paths in knowledge_files().items():
+        counter = iter(range(10 ** 6))
+
+        def _ingest():
+            with scratch_collection(advisor, client, f"bench_ingest_{next(counter)}"):
+                return sum(uploaders[ext](path, "benchmark", "benchmark") for path in paths)
+
+        stats = measure(_ingest, iterations, units="chunks")
+        stats["files"] = len(paths)
+        stats["bytes"] = sum(os.path.getsize(p) for p in paths)
+        results[f"ingest{ext}"] = stats
+    return results
+
+
+def bench_chunk_text(advisor, words: List[str], iterations: int) -> Dict[str, Dict]:
+    word_count = 200_000
+    text = " ".join(random.Random(3).choices(words, k=word_count))
+
+    def _chunk():
+        advisor.chunk_text(text)
+        return word_count
+
+    return {"chunk_text": measure(_chunk, iterations, units="words")}
+
+
+def bench_embedding(advisor, words: List[str], iterations: int) -> Dict[str, Dict]:
+    results = {}
+    for batch_size in (1, 32):
+        texts = synthetic_chunks(words, batch_size, length=120, seed=batch_size)
+        results[f"embedding.batch{batch_size}"] = measure(
+            lambda: len(advisor.embedding_function(texts)), iterations, units="texts"
+        )
+    return results
+
+
+def measure_concurrent(fn: Callable[[int], None], threads: int, per_thread: int, units: str = "ops") -> Dict:
+    """Call fn from several threads at once; throughput is over wall time, latencies are per call."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def _worker(worker: int) -> List[float]:
+        latencies = []
+        for n in range(per_thread):
+            start = time.perf_counter()
+            fn(worker * per_thread + n)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    fn(0)  # warm up
+    gc.collect()
+    reset_peak_rss()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = [latency for batch in pool.map(_worker, range(threads)) for latency in batch]
+    wall = time.perf_counter() - start
+    return {
+        "iterations": len(latencies),
+        "threads": threads,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "ops_per_sec": round(len(latencies) / wall, 3) if wall else 0.0,
+        "units": units,
+        "rss_hwm_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def bench_query_batching(advisor, words: List[str], iterations: int, threads: int = 8) -> Dict[str, Dict]:
+    """Query embedding throughput from concurrent callers, with and without micro-batching."""
+    queries = synthetic_chunks(words, 256, length=12, seed=42)
+    original = advisor.QUERY_BATCHING
+    results = {}
+    try:
+        for batching in (False, True):
+            advisor.QUERY_BATCHING = batching
+            label = "batched" if batching else "unbatched"
+            # Single caller: batching must not add latency
+            counter = iter(range(10 ** 6))
+            results[f"query_embed.{label}.1thread"] = measure(
+                lambda: len(advisor.embed_queries([queries[next(counter) % len(queries)]])), iterations * 5,
+                units="queries")
+            results[f"query_embed.{label}.{threads}threads"] = measure_concurrent(
+                lambda n: advisor.embed_queries([queries[n % len(queries)]]), threads, iterations * 5,
+                units="queries")
+    finally:
+        advisor.QUERY_BATCHING = original
+    batched = results[f"query_embed.batched.{threads}threads"]
+    batched.update(advisor.query_embedder.stats())
+    batched["speedup_vs_unbatched"] = round(
+        batched["ops_per_sec"] / results[f"query_embed.unbatched.{threads}threads"]["ops_per_sec"], 2)
+    return results
+
+
+def bench_retrieval(advisor, client, words: List[str], sizes: List[int], iterations: int) -> Dict[str, Dict]:
+    results = {}
+    dim = len(advisor.embedding_function(["dimension probe"])[0])
+    for size in sizes:
+        label = f"{size // 1000}k" if size >= 1000 else str(size)
+        # Large corpora are slow per query; keep total runtime bounded
+        runs = max(3, min(iterations, int(iterations * 10_000 / size)))
+        with scratch_collection(advisor, client, f"bench_retrieval_{size}") as collection:
+            start = time.perf_counter()
+            populate_synthetic(collection, synthetic_chunks(words, size), dim)
+            load_seconds = time.perf_counter() - start
+            queries = iter(QUERIES * (runs + 2))
+            stats = measure(lambda: advisor.hybrid_search(next(queries), n_results=5), runs, units="queries")
+            stats["corpus_chunks"] = size
+            stats["load_seconds"] = round(load_seconds, 2)
+            results[f"hybrid_search.{label}"] = stats
+            queries = iter(QUERIES * (runs + 2))
+            stats = measure(lambda: advisor.retrieve_context_with_citations(next(queries)), runs, units="queries")
+            stats["corpus_chunks"] = size
+            results[f"retrieve_context.{label}"] = stats
+    return results
+
+
+def bench_multi_query(advisor, client, words: List[str], sizes: List[int], iterations: int,
+                      questions: int = 1000) -> Dict[str, Dict]:
+    """A batch job's worth of questions retrieved in a loop vs. in one batched call."""
+    results = {}
+    dim = len(advisor.embedding_function(["dimension probe"])[0])
+    rng = random.Random(3)
+    workload = [rng.choice(QUERIES) + " " + " ".join(rng.choices(words, k=4)) for _ in range(questions)]
+    runs = max(2, iterations // 10)
+    for size in sizes:
+        label = f"{size // 1000}k" if size >= 1000 else str(size)
+        with scratch_collection(advisor, client, f"bench_multi_query_{size}") as collection:
+            populate_synthetic(collection, synthetic_chunks(words, size), dim)
+            loop = measure(lambda: len([advisor.retrieve_context_with_citations(q) for q in workload]), runs,
+                           units="queries")
+            batched = measure(lambda: len(advisor.retrieve_context_with_citations_batch(workload)), runs,
+                              units="queries")
+            one_by_one = [advisor.retrieve_context_with_citations(q) for q in workload]
+            same = sum(a == b for a, b in zip(one_by_one, advisor.retrieve_context_with_citations_batch(workload)))
+            batched["identical_results"] = round(same / questions, 4)
+            batched["speedup_vs_loop"] = round(batched["ops_per_sec"] / loop["ops_per_sec"], 2)
+            results[f"multi_query.loop.{label}"] = dict(loop, corpus_chunks=size, questions=questions)
+            results[f"multi_query.batched.{label}"] = dict(batched, corpus_chunks=size, questions=questions)
+    return results
+
+
+SHARD_DOMAINS = ("architecture", "compliance", "api_guides", "internal")
+
+
+def bench_sharding(advisor, client, words: List[str], sizes: List[int], iterations: int) -> Dict[str, Dict]:
+    """hybrid_search on one collection vs. the same corpus sharded by domain, unfiltered and domain-filtered."""
+    results = {}
+    dim = len(advisor.embedding_function(["dimension probe"])[0])
+    only_compliance = {"domain": "compliance"}
+    for size in sizes:
+        label = f"{size // 1000}k" if size >= 1000 else str(size)
+        runs = max(3, min(iterations, int(iterations * 10_000 / size)))
+        chunks = synthetic_chunks(words, size)
+        for mode, scratch in (("single", scratch_collection), ("sharded", scratch_shards)):
+            with scratch(advisor, client, f"bench_sharding_{mode}_{size}") as store:
+                populate_synthetic(store, chunks, dim, domains=SHARD_DOMAINS)
+                for scope, where in (("all", None), ("domain", only_compliance)):
+                    queries = iter(QUERIES * (runs + 2))
+                    stats = measure(lambda: advisor.hybrid_search(next(queries), n_results=5, where=where), runs,
+                                    units="queries")
+                    stats["corpus_chunks"] = size
+                    stats["shards"] = len(advisor.knowledge_shards())
+                    results[f"sharding.{mode}.{scope}.{label}"] = stats
+        for scope in ("all", "domain"):
+            sharded = results[f"sharding.sharded.{scope}.{label}"]
+            sharded["speedup_vs_single"] = round(
+                sharded["ops_per_sec"] / results[f"sharding.single.{scope}.{label}"]["ops_per_sec"], 2)
+    return results
+
+
+def bench_snapshot(advisor, client, iterations: int) -> Dict[str, Dict]:
+    """Re-ingesting the bundled knowledge base vs. building and restoring a snapshot of it."""
+    from telecom_advisor_snapshot import build_snapshot, restore_snapshot
+    paths = [path for group in knowledge_files().values() for path in group]
+    counter = iter(range(10 ** 6))
+
+    def _reingest():
+        with scratch_collection(advisor, client, f"bench_reingest_{next(counter)}"):
+            return advisor.upload_multiple_files(paths, "benchmark", "benchmark")
+
+    results = {"snapshot.reingest": measure(_reingest, iterations, units="chunks")}
+    snapshot_path = os.path.abspath("bench_snapshot.tar")
+    with scratch_collection(advisor, client, "bench_snapshot_source") as collection:
+        advisor.upload_multiple_files(paths, "benchmark", "benchmark")
+        results["snapshot.build"] = measure(
+            lambda: build_snapshot(collection, snapshot_path, advisor.EMBEDDING_MODEL)["chunks"],
+            iterations, units="chunks")
+
+    def _restore():
+        with scratch_collection(advisor, client, f"bench_restore_{next(counter)}") as collection:
+            manifest, _ = restore_snapshot(snapshot_path, collection, advisor.EMBEDDING_MODEL)
+            return manifest["chunks"]
+
+    stats = measure(_restore, iterations, units="chunks")
+    stats["bytes"] = os.path.getsize(snapshot_path)
+    stats["speedup_vs_reingest"] = round(results["snapshot.reingest"]["p50_ms"] / stats["p50_ms"], 1)
+    results["snapshot.restore"] = stats
+    return results
+
+
+def bench_end_to_end(advisor, client, iterations: int) -> Dict[str, Dict]:
+    with scratch_collection(advisor, client, "bench_e2e"):
+        for paths in knowledge_files().values():
+            advisor.upload_multiple_files(paths, "benchmark", "benchmark")
+        # Distinct questions so request coalescing and caches don't flatter the numbers
+        counter = iter(range(10 ** 6))
+
+        def _advise():
+            n = next(counter)
+            advisor.get_architecture_advice_with_rag(f"{QUERIES[n % len(QUERIES)]} (variant {n})")
+
+        stats = measure(_advise, iterations, units="requests")
+    return {"advice.end_to_end": stats}
+
+
+def bench_rerank(advisor, client, iterations: int, wide_k: int = 10) -> Dict[str, Dict]:
+    """
+    End-to-end advice putting wide_k hybrid results in the prompt, against
+    reranking RERANK_CANDIDATES of them down to RETRIEVAL_RESULTS.
+
+    The mock charges per prompt token (--prompt-tokens-per-second), so the
+    shorter prompt shows up in latency; retrieval quality of the two setups
+    is compared by benchmarks/eval_retrieval.py --rerank.
+    """
+    results: Dict[str, Dict] = {}
+    settings = advisor.RERANK, advisor.RETRIEVAL_RESULTS
+    with scratch_collection(advisor, client, "bench_rerank"):
+        for paths in knowledge_files().values():
+            advisor.upload_multiple_files(paths, "benchmark", "benchmark")
+        counter = iter(range(10 ** 6))
+
+        def _advise():
+            n = next(counter)
+            advisor.get_architecture_advice_with_rag(f"{QUERIES[n % len(QUERIES)]} (variant {n})")
+
+        try:
+            for name, rerank, k in (("advice.wide_context", False, wide_k),
+                                    ("advice.reranked", True, settings[1])):
+                advisor.RERANK, advisor.RETRIEVAL_RESULTS = rerank, k
+                advisor.get_reranker()  # load the model outside the timed runs
+                stats = measure(_advise, iterations, units="requests")
+                prompts = [advisor.build_advice_prompt(query)[0] for query in QUERIES]
+                stats["prompt_tokens"] = round(statistics.mean((len(p) + 3) // 4 for p in prompts), 1)
+                stats["context_chunks"] = k
+                results[name] = stats
+        finally:
+            advisor.RERANK, advisor.RETRIEVAL_RESULTS = settings
+    wide, reranked = results["advice.wide_context"], results["advice.reranked"]
+    reranked["prompt_token_reduction"] = round(1 - reranked["prompt_tokens"] / wide["prompt_tokens"], 3)
+    reranked["p50_speedup"] = round(wide["p50_ms"] / reranked["p50_ms"], 2)
+    return results
+
+
+# --- Baseline comparison ---
+
+def compare_to_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict], max_regression: float) -> List[str]:
+    """Return human-readable regressions beyond the allowed fraction."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if previous.get("p95_ms") and current["p95_ms"] > previous["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.1f} ms -> {current['p95_ms']:.1f} ms")
+        if previous.get("ops_per_sec") and current["ops_per_sec"] < previous["ops_per_sec"] * (1 - max_regression):
+            regressions.append(f"{name}: throughput {previous['ops_per_sec']:.1f} -> "
+                               f"{current['ops_per_sec']:.1f} {current['units']}/s")
+    return regressions
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Telecom Architecture Advisor benchmarks")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write JSON results")
+    parser.add_argument("--sizes", default="1000,10000", help="Synthetic corpus sizes, e.g. 1000,10000,100000")
+    parser.add_argument("--iterations", type=int, default=20, help="Timed iterations per benchmark")
+    parser.add_argument("--only", default="", help="Comma-separated groups: ingest,chunk,embed,batching,retrieval,multi_query,sharding,snapshot,e2e,rerank")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed fractional slowdown vs baseline before failing (default 0.2)")
+    parser.add_argument("--save-baseline", help="Also write these results as a new baseline file")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    save_baseline = os.path.abspath(args.save_baseline) if args.save_baseline else None
+    groups = set(filter(None, args.only.split(","))) or {"ingest", "chunk", "embed", "batching", "retrieval", "multi_query", "sharding", "snapshot", "e2e", "rerank"}
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    # Isolate from the real vector store and analytics, and answer from the mock LLM
+    workdir = tempfile.mkdtemp(prefix="advisor_bench_")
+    os.chdir(workdir)
+    os.environ.setdefault("GEMINI_API_BASE", f"http://127.0.0.1:{MOCK_PORT}/v1beta")
+    # The retrieval groups repeat a few queries; cached query embeddings would flatter them
+    os.environ.setdefault("QUERY_EMBEDDING_CACHE_SIZE", "0")
+    from mock_gemini_server import start_mock_server
+    mock = start_mock_server(["--port", str(MOCK_PORT), "--latency", "fixed:50", "--tokens-per-second", "2000",
+                              "--prompt-tokens-per-second", "20000"])
+
+    import chromadb
+    import telecom_advisor_enhanced as advisor
+    client = chromadb.EphemeralClient()
+    words = vocabulary()
+
+    results: Dict[str, Dict] = {}
+    if "chunk" in groups:
+        results.update(bench_chunk_text(advisor, words, args.iterations))
+    if "embed" in groups:
+        results.update(bench_embedding(advisor, words, args.iterations))
+    if "batching" in groups:
+        results.update(bench_query_batching(advisor, words, args.iterations))
+    if "ingest" in groups:
+        results.update(bench_ingestion(advisor, client, max(3, args.iterations // 4)))
+    if "retrieval" in groups:
+        results.update(bench_retrieval(advisor, client, words, sizes, args.iterations))
+    if "multi_query" in groups:
+        results.update(bench_multi_query(advisor, client, words, sizes, args.iterations))
+    if "sharding" in groups:
+        results.update(bench_sharding(advisor, client, words, sizes, args.iterations))
+    if "snapshot" in groups:
+        results.update(bench_snapshot(advisor, client, max(3, args.iterations // 4)))
+    if "e2e" in groups:
+        results.update(bench_end_to_end(advisor, client, args.iterations))
+    if "rerank" in groups:
+        results.update(bench_rerank(advisor, client, args.iterations))
+    mock.shutdown()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embedding_backend": advisor.EMBEDDING_BACKEND,
+            "onnx_quantized": advisor.ONNX_QUANTIZED,
+            "rerank_model": advisor.RERANK_MODEL,
+            "rerank_backend": advisor.RERANK_BACKEND,
+        },
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    if save_baseline:
+        with open(save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"\n{'benchmark':<28}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>12}  units")
+    for name, stats in results.items():
+        print(f"{name:<28}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+              f"{stats['ops_per_sec']:>12.1f}  {stats['units']}")
+    print(f"\n✓ Results written to {output}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f).get("results", {})
+        regressions = compare_to_baseline(results, baseline, args.max_regression)
+        if regressions:
+            print(f"\n✗ {len(regressions)} regression(s) beyond {args.max_regression:.0%}:")
+            for line in regressions:
+                print(f"   - {line}")
+            sys.exit(1)
+        print(f"✓ No regressions beyond {args.max_regression:.0%} vs {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
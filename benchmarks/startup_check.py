@@ -0,0 +1,236 @@
+"""
+Cold-start benchmark and startup budget check for the Telecom Architecture Advisor.
+
+Starts each entry point in fresh Python processes and reports how long it
+takes to become ready, broken into the phases recorded by
+telecom_advisor_startup (import, model_load, index_open, kb_sync, warm_up,
+other), plus the wall-clock time from process spawn:
+
+- cli        - import the advisor, initialize_knowledge_base(), interactive_cli readiness
+- server     - AdvisorServer warm-up (knowledge base plus first retrieval), as before /readyz turns green
+- streamlit  - the first run of streamlit_app.py through streamlit's AppTest harness
+
+Each entry point gets its own scratch directory holding a copy of
+knowledge_base/ and knowledge_sources.json. Run 1 starts with an empty index
+(first boot of a new pod); later runs reuse the index left behind (a restart).
+The check exits with status 1 when any run exceeds the budget
+(--budget, default STARTUP_BUDGET or 30s).
+
+Usage:
+    python benchmarks/startup_check.py
+    python benchmarks/startup_check.py --entry-points server --runs 5 --budget 20
+    python benchmarks/startup_check.py --imports 15 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.append(REPO_ROOT)
+
+from run_benchmarks import MOCK_PORT, git_revision  # noqa: E402
+
+REPORT_MARKER = "STARTUP_REPORT "
+_REPORT = f"import json; from telecom_advisor_startup import startup_report; print({REPORT_MARKER!r} + json.dumps(startup_report()), flush=True)"
+
+# Each snippet brings an entry point to the point where it would start serving, then prints the report
+ENTRY_POINTS = {
+    "cli": f"""
+import telecom_advisor_enhanced as advisor
+from telecom_advisor_startup import mark_ready
+advisor.initialize_knowledge_base()
+mark_ready("cli", advisor.STARTUP_BUDGET)
+{_REPORT}
+""",
+    "server": f"""
+import asyncio
+import telecom_advisor_server as server_module
+server = server_module.AdvisorServer("127.0.0.1", 0, workers=2, max_queue=0)
+asyncio.run(server._warm_up())
+server.executor.shutdown(wait=False)
+{_REPORT}
+""",
+    "streamlit": f"""
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({os.path.join(REPO_ROOT, "streamlit_app.py")!r}, default_timeout=3600)
+app.run()
+if app.exception:
+    raise SystemExit(f"streamlit_app.py raised: {{app.exception[0].message}}")
+{_REPORT}
+""",
+}
+
+PHASE_ORDER = ("import", "model_load", "index_open", "kb_sync", "warm_up", "other")
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+_REPO_MODULES = ("telecom_advisor", "streamlit_app", "run_benchmarks", "mock_gemini_server")
+
+
+def prepare_workdir(root: str, entry_point: str) -> str:
+    """Scratch directory with the bundled knowledge sources, so relative paths resolve as in the repo."""
+    workdir = os.path.join(root, entry_point)
+    os.makedirs(workdir)
+    shutil.copytree(os.path.join(REPO_ROOT, "knowledge_base"), os.path.join(workdir, "knowledge_base"))
+    sources = os.path.join(REPO_ROOT, "knowledge_sources.json")
+    if os.path.exists(sources):
+        shutil.copy(sources, workdir)
+    return workdir
+
+
+def child_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+    env["METRICS_PORT"] = "0"  # runs are sequential but shouldn't fight over a real app's port
+    # Startup never calls Gemini, so don't require an API key
+    env.setdefault("GEMINI_API_BASE", f"http://127.0.0.1:{MOCK_PORT}/v1beta")
+    return env
+
+
+def run_once(entry_point: str, workdir: str, timeout: float, importtime: bool = False) -> Dict:
+    """Start one fresh process for the entry point and return its startup report plus wall-clock time."""
+    args = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", ENTRY_POINTS[entry_point]]
+    start = time.perf_counter()
+    proc = subprocess.run(args, cwd=workdir, env=child_env(), capture_output=True, text=True, timeout=timeout)
+    wall = time.perf_counter() - start
+    report = next((json.loads(line[len(REPORT_MARKER):]) for line in proc.stdout.splitlines()
+                   if line.startswith(REPORT_MARKER)), None)
+    if proc.returncode != 0 or report is None:
+        tail = "\n".join(proc.stderr.strip().splitlines()[-15:])
+        raise RuntimeError(f"{entry_point} failed to start (exit {proc.returncode}):\n{tail}")
+    # Process exit (interpreter teardown) is included; it is small next to model load
+    report["wall_seconds"] = round(wall, 3)
+    if importtime:
+        report["imports"] = slowest_imports(proc.stderr)
+    return report
+
+
+def slowest_imports(stderr: str, limit: Optional[int] = None) -> List[Dict]:
+    """
+    Cumulative import time per top-level package from `python -X importtime` output.
+
+    A package's figure is its outermost import, so it includes whatever it
+    pulled in (sentence_transformers includes torch, for example).
+    """
+    packages: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        root = match.group(3).split(".")[0]
+        if root.startswith(_REPO_MODULES) or root.startswith("_"):
+            continue
+        packages[root] = max(packages.get(root, 0), int(match.group(2)))
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{"package": name, "cumulative_ms": round(us / 1000, 1)} for name, us in ranked]
+
+
+def summarize(runs: List[Dict]) -> Dict:
+    """Median phases over restarts (runs after the first), with the first boot reported separately."""
+    restarts = runs[1:] or runs
+    phases = sorted({phase for run in restarts for phase in run["phases"]})
+    return {
+        "first_boot_seconds": runs[0]["total_seconds"],
+        "first_boot_wall_seconds": runs[0]["wall_seconds"],
+        "restart_seconds": round(statistics.median(run["total_seconds"] for run in restarts), 3),
+        "restart_wall_seconds": round(statistics.median(run["wall_seconds"] for run in restarts), 3),
+        "max_wall_seconds": max(run["wall_seconds"] for run in runs),
+        "restart_phases": {phase: round(statistics.median(run["phases"].get(phase, 0.0) for run in restarts), 3)
+                           for phase in phases},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Telecom Architecture Advisor startup benchmark")
+    parser.add_argument("--entry-points", default="cli,server,streamlit",
+                        help=f"Comma-separated subset of {', '.join(ENTRY_POINTS)}")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per entry point (run 1 = empty index)")
+    parser.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET", "30")),
+                        help="Seconds each run may take from spawn to ready (0 = report only)")
+    parser.add_argument("--imports", type=int, default=0,
+                        help="Also list the N slowest top-level imports (one extra run with -X importtime)")
+    parser.add_argument("--timeout", type=float, default=900, help="Seconds before a run is abandoned")
+    parser.add_argument("--output", help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    entry_points = [e for e in args.entry_points.split(",") if e]
+    unknown = set(entry_points) - set(ENTRY_POINTS)
+    if unknown:
+        parser.error(f"unknown entry point(s): {', '.join(sorted(unknown))}")
+
+    root = tempfile.mkdtemp(prefix="advisor_startup_")
+    results: Dict[str, Dict] = {}
+    failures: List[str] = []
+    try:
+        for entry_point in entry_points:
+            workdir = prepare_workdir(root, entry_point)
+            runs = []
+            for n in range(max(1, args.runs)):
+                try:
+                    runs.append(run_once(entry_point, workdir, args.timeout))
+                except (RuntimeError, subprocess.TimeoutExpired) as e:
+                    failures.append(f"{entry_point} run {n + 1}: {e}")
+                    break
+                print(f"  {entry_point} run {n + 1}: ready in {runs[-1]['total_seconds']:.2f}s "
+                      f"({runs[-1]['wall_seconds']:.2f}s wall)")
+            if not runs:
+                continue
+            results[entry_point] = {"runs": runs, **summarize(runs)}
+            if args.imports:
+                profiled = run_once(entry_point, workdir, args.timeout, importtime=True)
+                results[entry_point]["imports"] = profiled["imports"][:args.imports]
+            if args.budget:
+                over = [n + 1 for n, run in enumerate(runs) if run["wall_seconds"] > args.budget]
+                if over:
+                    failures.append(f"{entry_point}: run(s) {', '.join(map(str, over))} exceeded the "
+                                    f"{args.budget:.1f}s budget (max {results[entry_point]['max_wall_seconds']:.2f}s)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    seen = {phase for r in results.values() for phase in r["restart_phases"]}
+    phase_names = [p for p in PHASE_ORDER if p in seen] + sorted(seen - set(PHASE_ORDER))
+    print(f"\n{'entry point':<12}{'first boot':>12}{'restart':>10}" + "".join(f"{p:>12}" for p in phase_names))
+    for entry_point, r in results.items():
+        print(f"{entry_point:<12}{r['first_boot_wall_seconds']:>11.2f}s{r['restart_wall_seconds']:>9.2f}s"
+              + "".join(f"{r['restart_phases'].get(p, 0.0):>11.2f}s" for p in phase_names))
+        for item in r.get("imports", []):
+            print(f"    import {item['package']:<28}{item['cumulative_ms']:>10.1f} ms")
+
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "budget_seconds": args.budget or None,
+            },
+            "results": results,
+            "failures": failures,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Results written to {args.output}")
+
+    if failures:
+        print(f"\n✗ {len(failures)} startup check failure(s):")
+        for line in failures:
+            print(f"   - {line}")
+        sys.exit(1)
+    if args.budget:
+        print(f"\n✓ All entry points ready within the {args.budget:.1f}s budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Offline stand-in for the Gemini REST API, for load testing and CI benchmarks.
+
+Implements the response shapes of generateContent and streamGenerateContent
+(JSON array or `alt=sse` server-sent events) with configurable latency
+distributions, prompt and generation token rates, error and 429 injection, and Retry-After headers.
+No network access or API key is needed.
+
+Point the advisor at it with:
+    GEMINI_API_BASE=http://127.0.0.1:8090/v1beta
+
+Usage:
+    python mock_gemini_server.py --port 8090 --latency lognormal:400:0.5 \\
+        --tokens-per-second 80 --rate-limit-rate 0.02 --retry-after 1
+
+Latency specs (milliseconds):
+    fixed:MS                 constant latency
+    uniform:LOW:HIGH         uniformly distributed
+    normal:MEAN:STDDEV       truncated at zero
+    lognormal:MEDIAN:SIGMA   long-tailed, like real LLM endpoints
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+_ROUTE = re.compile(r"^/(?:v1|v1beta)/models/(?P<model>[^/:]+):(?P<method>generateContent|streamGenerateContent)$")
+
+_FILLER = (
+    "In telecom environments the choice depends on traffic profile, regulatory constraints and the "
+    "maturity of the operations team. Independent scaling of rating and mediation helps absorb peaks, "
+    "while a consolidated deployment keeps latency predictable and reduces integration effort. "
+    "TM Forum Open APIs such as TMF629 and TMF638 provide stable contracts between domains, and an "
+    "event-driven backbone decouples order capture from fulfilment. Observability, automated "
+    "rollback and capacity planning are essential regardless of the architecture chosen."
+).split()
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Turn a latency spec such as 'lognormal:400:0.5' into a sampler returning seconds."""
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    try:
+        if kind == "fixed":
+            return lambda: values[0] / 1000
+        if kind == "uniform":
+            return lambda: random.uniform(values[0], values[1]) / 1000
+        if kind == "normal":
+            return lambda: max(0.0, random.gauss(values[0], values[1])) / 1000
+        if kind == "lognormal":
+            mu = math.log(values[0])
+            return lambda: random.lognormvariate(mu, values[1]) / 1000
+    except IndexError:
+        pass
+    raise ValueError(f"Invalid latency spec: {spec!r}")
+
+
+class MockGeminiState:
+    """Shared configuration and counters for all request handler threads."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.latency = parse_latency(args.latency)
+        self.tokens_per_second = args.tokens_per_second
+        self.prompt_tokens_per_second = args.prompt_tokens_per_second
+        self.response_tokens = args.response_tokens
+        self.error_rate = args.error_rate
+        self.rate_limit_rate = args.rate_limit_rate
+        self.retry_after = args.retry_after
+        self.max_concurrency = args.max_concurrency
+        self.in_flight = 0
+        self.counts: Dict[str, int] = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0}
+        self._lock = threading.Lock()
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def admit(self) -> bool:
+        with self._lock:
+            if self.max_concurrency and self.in_flight >= self.max_concurrency:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+
+def _answer_tokens(prompt: str, count: int) -> List[str]:
+    """Deterministic pseudo-answer: echoes the question, cites a source, then filler text."""
+    question = prompt.strip().splitlines()[-1] if prompt.strip() else "your question"
+    match = re.search(r"USER QUESTION:\s*(.+)", prompt)
+    if match:
+        question = match.group(1).strip()
+    words = f"Mock answer regarding: {question[:120]} [Source 1]".split()
+    while len(words) < count:
+        words.extend(_FILLER)
+    return [w + " " for w in words[:count]]
+
+
+def _usage(prompt: str, completion_tokens: int) -> Dict:
+    prompt_tokens = max(1, int(len(prompt.split()) * 1.3))
+    return {
+        "promptTokenCount": prompt_tokens,
+        "candidatesTokenCount": completion_tokens,
+        "totalTokenCount": prompt_tokens + completion_tokens,
+    }
+
+
+def _chunk(text: str, finish: bool = False) -> Dict:
+    candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if finish:
+        candidate["finishReason"] = "STOP"
+    return {"candidates": [candidate]}
+
+
+def make_handler(state: MockGeminiState):
+    class MockGeminiHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+        def _send_json(self, status: HTTPStatus, payload, headers: Dict[str, str] = None) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_error(self, status: HTTPStatus, message: str, headers: Dict[str, str] = None) -> None:
+            self._send_json(status, {"error": {"code": status.value, "message": message,
+                                               "status": status.name}}, headers)
+
+        def do_GET(self):
+            if urlsplit(self.path).path == "/stats":
+                with state._lock:
+                    payload = dict(state.counts, in_flight=state.in_flight)
+                self._send_json(HTTPStatus.OK, payload)
+            else:
+                self._send_error(HTTPStatus.NOT_FOUND, "Not found")
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            route = _ROUTE.match(url.path)
+            if not route:
+                self._send_error(HTTPStatus.NOT_FOUND, f"Unknown method {url.path}")
+                return
+            try:
+                body = json.loads(raw or b"{}")
+                prompt = "".join(part.get("text", "")
+                                 for content in body.get("contents", [])
+                                 for part in content.get("parts", []))
+                max_tokens = int(body.get("generationConfig", {}).get("maxOutputTokens", 2048))
+            except (ValueError, AttributeError):
+                self._send_error(HTTPStatus.BAD_REQUEST, "Invalid JSON payload")
+                return
+
+            state.count("requests")
+            roll = random.random()
+            if roll < state.rate_limit_rate or not state.admit():
+                state.count("rate_limited")
+                self._send_error(HTTPStatus.TOO_MANY_REQUESTS, "Resource has been exhausted (mock)",
+                                 {"Retry-After": str(state.retry_after)})
+                return
+            try:
+                time.sleep(state.latency())
+                if state.prompt_tokens_per_second:
+                    time.sleep(_usage(prompt, 0)["promptTokenCount"] / state.prompt_tokens_per_second)
+                if roll < state.rate_limit_rate + state.error_rate:
+                    state.count("errors")
+                    self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, "Internal error (mock)")
+                    return
+                tokens = _answer_tokens(prompt, min(state.response_tokens, max_tokens))
+                if route.group("method") == "generateContent":
+                    time.sleep(len(tokens) / state.tokens_per_second)
+                    payload = _chunk("".join(tokens), finish=True)
+                    payload["usageMetadata"] = _usage(prompt, len(tokens))
+                    payload["modelVersion"] = route.group("model")
+                    self._send_json(HTTPStatus.OK, payload)
+                else:
+                    sse = parse_qs(url.query).get("alt") == ["sse"]
+                    self._stream(prompt, tokens, sse)
+                state.count("ok")
+            except (BrokenPipeError, ConnectionResetError):
+                logger.debug("Client disconnected")
+            finally:
+                state.release()
+
+        def _stream(self, prompt: str, tokens: List[str], sse: bool) -> None:
+            """Emit ~8-token chunks paced at the configured token rate."""
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "text/event-stream" if sse else "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def _write(data: bytes) -> None:
+                self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            step = 8
+            if not sse:
+                _write(b"[")
+            for start in range(0, len(tokens), step):
+                piece = tokens[start:start + step]
+                time.sleep(len(piece) / state.tokens_per_second)
+                last = start + step >= len(tokens)
+                event = _chunk("".join(piece), finish=last)
+                if last:
+                    event["usageMetadata"] = _usage(prompt, len(tokens))
+                if sse:
+                    _write(f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8"))
+                else:
+                    _write(((b"," if start else b"") + json.dumps(event).encode("utf-8")))
+            if not sse:
+                _write(b"]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return MockGeminiHandler
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Offline mock of the Gemini generateContent API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", default="lognormal:400:0.4",
+                        help="Time to first token, e.g. fixed:200, uniform:100:500, lognormal:400:0.5")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0, help="Generation speed")
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=0.0,
+                        help="Prompt processing speed, adding time per prompt token before the answer (0 = off)")
+    parser.add_argument("--response-tokens", type=int, default=120, help="Tokens per answer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests rejected with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429")
+    parser.add_argument("--max-concurrency", type=int, default=0,
+                        help="Concurrent requests accepted before answering 429 (0 = unlimited)")
+    return parser
+
+
+def start_mock_server(argv: List[str] = None) -> ThreadingHTTPServer:
+    """Start the mock on a background thread (used by benchmarks). Returns the server."""
+    args = build_parser().parse_args(argv or [])
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(MockGeminiState(args)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-gemini", daemon=True).start()
+    return server
+
+
+def main():
+    args = build_parser().parse_args()
+    parse_latency(args.latency)  # fail fast on a bad spec
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(MockGeminiState(args)))
+    server.daemon_threads = True
+    print(f"🧪 Mock Gemini API on http://{args.host}:{args.port}/v1beta  (Ctrl+C to stop)")
+    print(f"   export GEMINI_API_BASE=http://{args.host}:{args.port}/v1beta")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Shutting down mock server...")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,9 +9,10 @@ echo "1. Run Interactive CLI (Enhanced Features)"
 echo "2. Run Web Interface (Streamlit)"
 echo "3. Run Basic RAG Demo"
 echo "4. Install Dependencies"
-echo "5. Exit"
+echo "5. Run HTTP API Server"
+echo "6. Exit"
 echo ""
-read -p "Enter choice [1-5]: " choice
+read -p "Enter choice [1-6]: " choice
 
 case $choice in
     1)
@@ -33,6 +34,10 @@ case $choice in
         echo "Installation complete!"
         ;;
     5)
+        echo "Starting HTTP API server on http://localhost:8080..."
+        python3 telecom_advisor_server.py
+        ;;
+    6)
         echo "Goodbye!"
         exit 0
         ;;
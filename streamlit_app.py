@@ -1,20 +1,36 @@
 import streamlit as st
 import sys
 import os
+import time
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from telecom_advisor_enhanced import (
     get_architecture_advice_with_rag,
-    upload_pdf_to_knowledge_base,
     initialize_knowledge_base,
+    start_knowledge_watcher,
+    start_cache_warmup,
+    submit_upload,
+    ingestion_jobs,
+    extraction_cache,
     compare_architectures,
     export_to_markdown,
     export_to_pdf,
     load_analytics,
-    collection
+    kb_chunk_count,
+    conversation_store,
+    conversation_page,
+    use_tenant,
+    TenantError,
+    memory_diagnostics,
+    start_metrics_server,
+    METRICS_HOST,
+    CONVERSATION_PAGE_SIZE,
+    METRICS_PORT,
+    STARTUP_BUDGET
 )
+from telecom_advisor_startup import mark_ready
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime
@@ -54,13 +70,20 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Prometheus metrics endpoint (started once per process; reruns are no-ops)
+if METRICS_PORT:
+    start_metrics_server(METRICS_PORT, METRICS_HOST)
+
 # Initialize session state
-if 'conversation' not in st.session_state:
-    st.session_state.conversation = []
+if 'history_page' not in st.session_state:
+    st.session_state.history_page = 1  # page of the chat history shown, 1 = latest
 if 'initialized' not in st.session_state:
     with st.spinner("Initializing knowledge base..."):
         initialize_knowledge_base()
     st.session_state.initialized = True
+    mark_ready("streamlit", STARTUP_BUDGET)  # first session only; later sessions are no-ops
+start_knowledge_watcher()  # once per process; no-op unless WATCH_KNOWLEDGE_BASE=true
+start_cache_warmup()  # once per process; prefetches frequent past questions in the background
 
 # Sidebar
 with st.sidebar:
@@ -70,14 +93,33 @@ with st.sidebar:
     
     mode = st.radio(
         "Select Mode:",
-        ["💬 Chat", "⚖️ Compare", "📤 Upload", "📊 Analytics", "💾 Export"]
+        ["💬 Chat", "⚖️ Compare", "📤 Upload", "📊 Analytics", "💾 Export", "🧠 Memory"]
     )
     
     st.markdown("---")
     
     # Knowledge base stats
     st.markdown("### 📚 Knowledge Base")
-    kb_count = collection.count()
+    # Conversations are stored per session ID; the ID in the URL survives reloads and restarts
+    if 'session_id' not in st.session_state:
+        resumed = conversation_store.session(st.query_params.get("session", ""))
+        st.session_state.session_id = resumed['id'] if resumed else None
+        st.session_state.conversation_tenant = st.session_state.tenant = (resumed['tenant'] or "") if resumed else ""
+    tenant = st.text_input("Team knowledge base", key="tenant", placeholder="shared",
+                           help="A team's own knowledge base (e.g. billing, oss, network); empty = shared").strip().lower()
+    try:
+        use_tenant(tenant or None)  # every advisor call below in this run uses it
+    except TenantError as e:
+        st.error(str(e))
+        st.stop()
+    if st.session_state.session_id is None or st.session_state.conversation_tenant != tenant:
+        # History from another knowledge base would leak into prompts
+        st.session_state.session_id = conversation_store.new_session(tenant or None)
+        st.session_state.conversation_tenant = tenant
+        st.session_state.history_page = 1
+    session_id = st.session_state.session_id
+    st.query_params["session"] = session_id
+    kb_count = kb_chunk_count()
     st.metric("Total Chunks", kb_count)
     
     st.markdown("---")
@@ -99,8 +141,22 @@ st.markdown('<div class="main-header">🏗️ Telecom Architecture Advisor</div>
 if mode == "💬 Chat":
     st.markdown("### Ask me anything about telecom architecture!")
     
-    # Display conversation history
-    for exchange in st.session_state.conversation:
+    # Display one page of the conversation history; older pages are read only when asked for
+    history, pages = conversation_page(session_id, st.session_state.history_page)
+    if pages > 1:
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if st.button("⬆️ Earlier", disabled=st.session_state.history_page >= pages):
+                st.session_state.history_page += 1
+                st.rerun()
+        with col2:
+            st.caption(f"Page {st.session_state.history_page} of {pages} "
+                       f"({conversation_store.count(session_id)} exchanges)")
+        with col3:
+            if st.button("⬇️ Later", disabled=st.session_state.history_page <= 1):
+                st.session_state.history_page -= 1
+                st.rerun()
+    for exchange in history:
         with st.chat_message("user"):
             st.write(exchange['user'])
         
@@ -129,14 +185,18 @@ if mode == "💬 Chat":
         # Get response
         with st.chat_message("assistant"):
             with st.spinner("Thinking..."):
-                response, context, citations = get_architecture_advice_with_rag(
+                result = get_architecture_advice_with_rag(
                     user_input,
                     use_rag=use_rag,
                     include_citations=show_citations,
-                    conversation_context=st.session_state.conversation
+                    conversation_context=conversation_store.recent(session_id, 3)
                 )
+                response, context, citations = result
                 
                 st.write(response)
+                stages = ", ".join(f"{stage} {ms:.0f} ms" for stage, ms in result.timings.items()
+                                   if stage in ("retrieval", "generation", "analytics.write"))
+                st.caption(f"⏱️ {result.timings['total'] / 1000:.2f}s ({stages})")
                 
                 if show_citations and citations:
                     with st.expander("📚 View Sources"):
@@ -158,12 +218,8 @@ if mode == "💬 Chat":
                             )
         
         # Save to conversation
-        st.session_state.conversation.append({
-            'user': user_input,
-            'assistant': response,
-            'citations': citations,
-            'timestamp': datetime.now().isoformat()
-        })
+        conversation_store.append(session_id, user_input, response, citations)
+        st.session_state.history_page = 1
         
         st.rerun()
 
@@ -190,12 +246,7 @@ elif mode == "⚖️ Compare":
                 st.markdown(comparison)
                 
                 # Save to conversation
-                st.session_state.conversation.append({
-                    'user': f"Compare {arch1} vs {arch2} for {context}",
-                    'assistant': comparison,
-                    'citations': [],
-                    'timestamp': datetime.now().isoformat()
-                })
+                conversation_store.append(session_id, f"Compare {arch1} vs {arch2} for {context}", comparison)
         else:
             st.warning("Please enter both architectures to compare")
 
@@ -203,9 +254,10 @@ elif mode == "⚖️ Compare":
 elif mode == "📤 Upload":
     st.markdown("### Upload Documents to Knowledge Base")
     
-    st.info("Upload PDF documents to expand the knowledge base. The system will automatically extract text and add it to the vector database.")
+    st.info("Upload PDF, Word or text documents to expand the knowledge base. They are ingested in the "
+            "background: keep chatting while they load, and follow their progress below.")
     
-    uploaded_file = st.file_uploader("Choose a PDF file", type=['pdf'])
+    uploaded_files = st.file_uploader("Choose files", type=['pdf', 'docx', 'txt', 'md'], accept_multiple_files=True)
     
     col1, col2 = st.columns(2)
     with col1:
@@ -213,22 +265,52 @@ elif mode == "📤 Upload":
     with col2:
         domain = st.selectbox("Domain", ["architecture", "network", "compliance", "infrastructure", "services"])
     
-    if uploaded_file is not None and st.button("📥 Upload to Knowledge Base", type="primary"):
-        # Save uploaded file temporarily
-        temp_path = f"temp_{uploaded_file.name}"
-        with open(temp_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
-        with st.spinner("Processing PDF..."):
-            chunks_added = upload_pdf_to_knowledge_base(temp_path, topic or "uploaded", domain)
-        
-        # Clean up
-        os.remove(temp_path)
-        
-        if chunks_added > 0:
-            st.success(f"✅ Successfully added {chunks_added} chunks from {uploaded_file.name}")
-        else:
-            st.error("❌ Failed to extract text from PDF")
+    if 'upload_jobs' not in st.session_state:
+        st.session_state.upload_jobs = []  # job IDs submitted from this session
+    
+    if uploaded_files and st.button("📥 Upload to Knowledge Base", type="primary"):
+        for uploaded_file in uploaded_files:
+            # Ingested straight from the upload buffer; nothing is written to the working directory
+            job_id = submit_upload(uploaded_file.name, uploaded_file.getvalue(), topic or "uploaded", domain)
+            if job_id is None:
+                st.info(f"ℹ️ {uploaded_file.name} is already in the knowledge base")
+            else:
+                st.session_state.upload_jobs.append(job_id)
+    
+    jobs = [job for job in map(ingestion_jobs.get, reversed(st.session_state.upload_jobs)) if job]
+    if jobs:
+        st.markdown("#### ⏳ Ingestion Jobs")
+    for job in jobs:
+        pages = f"{job['pages_done']}/{job['pages_total']}" if job['pages_total'] else job['pages_done']
+        chunks = f"{job['chunks_done']}/{job['chunks_total']}" if job['chunks_total'] else job['chunks_done']
+        eta = f", ~{job['eta_seconds']:.0f}s left" if job['eta_seconds'] is not None else ""
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.progress(job['fraction'], text=f"**{job['name']}** — {job['stage']}: {pages} pages extracted, "
+                                              f"{chunks} chunks embedded{eta}")
+            if job['state'] == "done":
+                st.success(f"✅ Added {job['chunks_added']} chunks from {job['name']} in {job['elapsed_seconds']:.1f}s")
+            elif job['state'] == "failed":
+                st.error(f"❌ {job['name']}: {job['error']}")
+            elif job['state'] == "cancelled":
+                st.warning(f"⏹️ {job['name']} was cancelled; nothing was added")
+        with col2:
+            if job['state'] in ("queued", "running") and st.button("Cancel", key=f"cancel_{job['id']}"):
+                ingestion_jobs.cancel(job['id'])
+                st.rerun()
+    
+    if extraction_cache is not None:
+        with st.expander("🗃️ Extraction cache"):
+            cache_stats = extraction_cache.stats()
+            st.caption(f"{cache_stats['documents']} documents, {cache_stats['pages']} pages, "
+                       f"{cache_stats['stored_mb']} MB stored. Re-uploading any of them skips text extraction.")
+            for entry in extraction_cache.documents(20):
+                st.text(f"{entry['name']}: {entry['pages']} pages, {entry['hits']} hits, "
+                        f"last used {entry['last_used'][:16]}")
+    
+    if any(job['state'] in ("queued", "running") for job in jobs):
+        time.sleep(1)  # live progress: rerun until every job has finished
+        st.rerun()
 
 # Analytics Mode
 elif mode == "📊 Analytics":
@@ -246,7 +328,7 @@ elif mode == "📊 Analytics":
         st.metric("Unique Topics", len(analytics.get('topics', {})))
     
     with col3:
-        st.metric("KB Chunks", collection.count())
+        st.metric("KB Chunks", kb_chunk_count())
     
     st.markdown("---")
     
@@ -298,16 +380,17 @@ elif mode == "📊 Analytics":
 elif mode == "💾 Export":
     st.markdown("### Export Conversation")
     
-    if not st.session_state.conversation:
+    exchange_count = conversation_store.count(session_id)
+    if not exchange_count:
         st.warning("No conversation to export yet. Start chatting first!")
     else:
-        st.info(f"Current conversation has {len(st.session_state.conversation)} exchanges")
+        st.info(f"Current conversation has {exchange_count} exchanges")
         
         col1, col2 = st.columns(2)
         
         with col1:
             if st.button("📄 Export as Markdown", type="primary"):
-                filename = export_to_markdown(st.session_state.conversation)
+                filename = export_to_markdown(list(conversation_store.iter_turns(session_id)))
                 st.success(f"✅ Exported to {filename}")
                 
                 with open(filename, 'r') as f:
@@ -320,7 +403,7 @@ elif mode == "💾 Export":
         
         with col2:
             if st.button("📕 Export as PDF", type="primary"):
-                filename = export_to_pdf(st.session_state.conversation)
+                filename = export_to_pdf(list(conversation_store.iter_turns(session_id)))
                 st.success(f"✅ Exported to {filename}")
                 
                 with open(filename, 'rb') as f:
@@ -334,13 +417,77 @@ elif mode == "💾 Export":
         st.markdown("---")
         
         st.markdown("#### 💬 Conversation Preview")
-        for idx, exchange in enumerate(st.session_state.conversation, 1):
-            with st.expander(f"Exchange {idx}: {exchange['user'][:60]}..."):
+        preview_pages = -(-exchange_count // CONVERSATION_PAGE_SIZE)
+        preview_page = st.number_input("Page (1 = latest)", min_value=1, max_value=preview_pages, value=1) \
+            if preview_pages > 1 else 1
+        preview, _ = conversation_page(session_id, preview_page)
+        for exchange in preview:
+            with st.expander(f"Exchange {exchange['seq']}: {exchange['user'][:60]}..."):
                 st.markdown(f"**Question:** {exchange['user']}")
                 st.markdown(f"**Answer:** {exchange['assistant']}")
                 if exchange.get('citations'):
                     st.markdown(f"**Sources:** {len(exchange['citations'])} citations")
 
+# Memory Diagnostics Mode (admin)
+elif mode == "🧠 Memory":
+    st.markdown("### Memory Diagnostics")
+    
+    report = memory_diagnostics.report()
+    store_stats = conversation_store.stats()
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Process RSS", f"{report['rss_mb']} MB")
+    with col2:
+        st.metric("Conversation Store", f"{store_stats['size_mb']} MB",
+                  help=f"{store_stats['turns']} exchanges in {store_stats['sessions']} sessions on disk; "
+                       f"this session has {conversation_store.count(session_id)}")
+    with col3:
+        st.metric("KB Chunks", kb_chunk_count())
+    
+    if not report["enabled"]:
+        st.info("Allocation tracking is off. Start the app with `MEMORY_DIAGNOSTICS=true` to attribute "
+                "memory to request stages and allocation sites.")
+    else:
+        if report["samples"]:
+            st.markdown("#### 📈 RSS and Traced Memory Over Time")
+            times = [s["timestamp"] for s in report["samples"]]
+            fig = go.Figure()
+            fig.add_trace(go.Scatter(x=times, y=[s["rss_mb"] for s in report["samples"]], name="RSS (MB)"))
+            fig.add_trace(go.Scatter(x=times, y=[s["traced_mb"] for s in report["samples"]], name="Traced (MB)"))
+            fig.update_layout(height=350)
+            st.plotly_chart(fig, use_container_width=True)
+        
+        st.markdown("#### 📦 Net Growth by Stage")
+        st.dataframe(
+            [{"stage": stage, **stats} for stage, stats in report["stages"].items()],
+            use_container_width=True
+        )
+        
+        st.markdown("#### 📍 Largest Live Allocation Sites")
+        st.dataframe(report["top_allocations"], use_container_width=True)
+        
+        if report["requests"]:
+            st.markdown("#### 🔍 Recent Requests")
+            for entry in reversed(report["requests"][-10:]):
+                with st.expander(f"{entry['name']} {entry['trace_id']} — {entry['delta_kb']:+.1f} KB"):
+                    st.write(entry["stages_kb"])
+                    st.dataframe(entry["top_growth"], use_container_width=True)
+        
+        if report["samples"]:
+            st.markdown("#### 🧮 Most Common Object Types (latest sample)")
+            st.write(report["samples"][-1]["top_types"])
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("📸 Take Sample Now"):
+                memory_diagnostics.sample()
+                st.rerun()
+        with col2:
+            if st.button("💾 Dump Report", type="primary"):
+                path = memory_diagnostics.dump()
+                st.success(f"✅ Report written to {path} (raw snapshot alongside as .tracemalloc)")
+
 # Footer
 st.markdown("---")
 st.markdown("""
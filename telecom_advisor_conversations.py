@@ -0,0 +1,191 @@
+"""
+Persistent conversation store for the Telecom Architecture Advisor.
+
+Chat history used to live in st.session_state and in a list inside the CLI
+loop, so it was lost on restart and every Streamlit rerun walked all of it.
+ConversationStore keeps it in SQLite instead:
+
+- One row per session (id, tenant, timestamps, turn count) and one row per
+  turn, keyed by (session_id, seq). Turns are only ever appended.
+- WAL journal mode, so readers (the chat view, exports) never block the writer
+  and each append is a single small commit
+- Every read is an indexed range scan on (session_id, seq): the last few
+  turns for the prompt, one page of history for the chat view, or all turns
+  in batches for an export. Render and prompt-build cost depends on the page
+  size, not on how long the session has run.
+
+Connections are per thread (sqlite3 objects can't be shared across threads),
+opened lazily on first use.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    tenant TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    turns INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at);
+CREATE TABLE IF NOT EXISTS turns (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    user TEXT NOT NULL,
+    assistant TEXT NOT NULL,
+    citations TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+class ConversationStore:
+    """
+    SQLite-backed, append-only chat history keyed by session ID.
+
+    Turns are returned as the dicts the advisor already uses for conversation
+    context and exports ({"user", "assistant", "citations", "timestamp"}), plus
+    their position in the session as "seq" (1-based).
+
+    Args:
+        path: SQLite database file (created if missing)
+    """
+
+    def __init__(self, path: str = "conversations.db"):
+        self.path = path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # durable across app crashes; WAL keeps commits cheap
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(_SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def new_session(self, tenant: Optional[str] = None) -> str:
+        """Start an empty session and return its ID."""
+        session_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        self._connection().execute(
+            "INSERT INTO sessions (id, tenant, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            (session_id, tenant, now, now)
+        )
+        return session_id
+
+    def session(self, session_id: str) -> Optional[Dict]:
+        """Session row (id, tenant, created_at, updated_at, turns), or None if unknown."""
+        row = self._connection().execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return dict(row) if row else None
+
+    def sessions(self, limit: int = 20, tenant: Optional[str] = None) -> List[Dict]:
+        """Most recently active sessions of a tenant (None = the shared knowledge base), newest first."""
+        rows = self._connection().execute(
+            "SELECT s.*, (SELECT user FROM turns t WHERE t.session_id = s.id AND t.seq = 1) AS first_question "
+            "FROM sessions s WHERE s.tenant IS ? ORDER BY s.updated_at DESC LIMIT ?",
+            (tenant, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def append(self, session_id: str, user: str, assistant: str, citations: Optional[List[Dict]] = None,
+               timestamp: Optional[str] = None) -> int:
+        """
+        Add a turn at the end of a session.
+
+        Returns:
+            The turn's seq
+        """
+        timestamp = timestamp or datetime.now().isoformat()
+        conn = self._connection()
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent appends get consecutive seqs
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT turns FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"Unknown conversation session {session_id}")
+            seq = row["turns"] + 1
+            conn.execute(
+                "INSERT INTO turns (session_id, seq, user, assistant, citations, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, seq, user, assistant, json.dumps(citations or [], default=str), timestamp)
+            )
+            conn.execute("UPDATE sessions SET turns = ?, updated_at = ? WHERE id = ?", (seq, timestamp, session_id))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return seq
+
+    def count(self, session_id: str) -> int:
+        """Turns in a session (0 if unknown)."""
+        row = self._connection().execute("SELECT turns FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row["turns"] if row else 0
+
+    def page(self, session_id: str, before: Optional[int] = None, limit: int = 20) -> List[Dict]:
+        """
+        The `limit` turns just before seq `before` (default: the latest), oldest first.
+
+        Paging backwards from the end: pass the first returned turn's seq as
+        `before` to get the previous page.
+        """
+        rows = self._connection().execute(
+            "SELECT * FROM turns WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+            (session_id, before if before is not None else 2 ** 62, limit)
+        ).fetchall()
+        return [self._turn(row) for row in reversed(rows)]
+
+    def recent(self, session_id: str, n: int = 3) -> List[Dict]:
+        """Last n turns, oldest first - the history put in prompts."""
+        return self.page(session_id, limit=n)
+
+    def iter_turns(self, session_id: str, batch: int = 500) -> Iterator[Dict]:
+        """Every turn of a session in order, read `batch` rows at a time."""
+        after = 0
+        while True:
+            rows = self._connection().execute(
+                "SELECT * FROM turns WHERE session_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (session_id, after, batch)
+            ).fetchall()
+            for row in rows:
+                yield self._turn(row)
+            if len(rows) < batch:
+                return
+            after = rows[-1]["seq"]
+
+    def stats(self) -> Dict:
+        """Sessions, turns and database size on disk."""
+        conn = self._connection()
+        sessions, turns = conn.execute("SELECT COUNT(*), COALESCE(SUM(turns), 0) FROM sessions").fetchone()
+        size = sum(os.path.getsize(self.path + suffix) for suffix in ("", "-wal")
+                   if os.path.exists(self.path + suffix))
+        return {"sessions": sessions, "turns": turns, "size_mb": round(size / 1e6, 2)}
+
+    @staticmethod
+    def _turn(row: sqlite3.Row) -> Dict:
+        return {
+            "seq": row["seq"],
+            "user": row["user"],
+            "assistant": row["assistant"],
+            "citations": json.loads(row["citations"]),
+            "timestamp": row["timestamp"],
+        }
@@ -0,0 +1,514 @@
+"""
+Embedding backends for the Telecom Architecture Advisor.
+
+EMBEDDING_BACKEND selects how EMBEDDING_MODEL runs, for ingestion and
+queries alike:
+
+- torch (default) - sentence-transformers on PyTorch
+- onnx            - the same model exported to ONNX and run with ONNX Runtime,
+                    optionally int8 dynamically quantized. Serving needs only
+                    onnxruntime, tokenizers and numpy, so torch can be left out
+                    of the image.
+
+The ONNX model is exported once, where sentence-transformers is installed (e.g.
+an image build step), and checked against PyTorch before it is rolled out:
+
+    python telecom_advisor_embeddings.py export models/all-MiniLM-L6-v2-onnx --quantize
+    python telecom_advisor_embeddings.py parity models/all-MiniLM-L6-v2-onnx --quantized
+
+Both backends compute the same model's embeddings, so vectors are
+interchangeable: switching backend needs no re-ingestion and snapshots stay
+valid. The parity check measures how close they are.
+
+QueryEmbeddingBatcher sits in front of either backend at query time and
+merges the texts of concurrent requests into one batched forward pass.
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings, Space
+from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+
+from telecom_advisor_metrics import QUERY_EMBED_BATCH_SIZE, QUERY_EMBED_QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+ONNX_CONFIG_FILE = "advisor_onnx.json"
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_FILE = "model_int8.onnx"
+BACKENDS = ("torch", "onnx")
+
+
+def default_onnx_dir(model_name: str) -> str:
+    return os.path.join("models", f"{os.path.basename(model_name.rstrip('/'))}-onnx")
+
+
+def load_onnx_model(model_dir: str, quantized: bool, threads: int, max_length_key: str,
+                    export_command: str) -> Tuple[Dict, Any, set, Any]:
+    """
+    Open an exported model for CPU inference, as both ONNX backends (embeddings, reranking) do.
+
+    Args:
+        model_dir: Directory the export wrote
+        quantized: Use the int8 dynamically quantized model
+        threads: ONNX Runtime intra-op threads (0 = one per physical core)
+        max_length_key: Config entry holding the tokenizer's truncation length
+        export_command: Command that writes model_dir, suggested when it is missing
+
+    Returns:
+        (export config, ONNX Runtime session, its input names, padding and truncating tokenizer)
+
+    Raises:
+        FileNotFoundError: Nothing (or no quantized model) was exported to model_dir
+    """
+    import onnxruntime
+    from tokenizers import Tokenizer
+
+    config_path = os.path.join(model_dir, ONNX_CONFIG_FILE)
+    if not os.path.exists(config_path):
+        raise FileNotFoundError(f"No exported ONNX model in {model_dir}; run `{export_command}` first")
+    with open(config_path) as f:
+        config = json.load(f)
+    model_file = ONNX_QUANTIZED_FILE if quantized else ONNX_MODEL_FILE
+    if not os.path.exists(os.path.join(model_dir, model_file)):
+        raise FileNotFoundError(f"{model_file} not found in {model_dir}"
+                                + ("; export with --quantize" if quantized else ""))
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    session = onnxruntime.InferenceSession(os.path.join(model_dir, model_file), options,
+                                           providers=["CPUExecutionProvider"])
+    input_names = {i.name for i in session.get_inputs()}
+
+    tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+    tokenizer.enable_truncation(max_length=config[max_length_key])
+    tokenizer.enable_padding(pad_id=config["pad_token_id"], pad_token=config["pad_token"])
+    return config, session, input_names, tokenizer
+
+
+def length_sorted_batches(lengths: Sequence[int], batch_size: int) -> Iterator[List[int]]:
+    """Row indices in batches of similar length, so little compute goes to padding."""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    for start in range(0, len(order), batch_size):
+        yield order[start:start + batch_size]
+
+
+def onnx_feeds(encodings, input_names: set) -> Dict[str, np.ndarray]:
+    """Session inputs for a batch of tokenizer encodings."""
+    feeds = {
+        "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+        "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+    }
+    if "token_type_ids" in input_names:
+        feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+    return feeds
+
+
+class ONNXEmbeddingFunction(EmbeddingFunction[Documents]):
+    """
+    Sentence embeddings from an exported transformer run with ONNX Runtime.
+
+    Inputs are sorted by length and embedded in batches padded only to their
+    longest member, so a batch of short queries doesn't pay for one long chunk.
+
+    ChromaDB only sees the sentence-transformer identity of the same model,
+    so a collection created by either backend opens with the other.
+
+    Args:
+        model_dir: Directory written by export_onnx()
+        quantized: Use the int8 dynamically quantized model
+        threads: ONNX Runtime intra-op threads (0 = one per physical core)
+        batch_size: Texts per inference call
+    """
+
+    # Live functions by model, so rebuilding one from a ChromaDB config doesn't load PyTorch
+    _instances: Dict[str, "ONNXEmbeddingFunction"] = {}
+
+    def __init__(self, model_dir: str, quantized: bool = False, threads: int = 0, batch_size: int = 32):
+        self.config, self.session, self.input_names, self.tokenizer = load_onnx_model(
+            model_dir, quantized, threads, "max_seq_length",
+            f"python telecom_advisor_embeddings.py export {model_dir}"
+        )
+        self.model_dir = model_dir
+        self.model_name = self.config["model_name"]
+        self.quantized = quantized
+        self.threads = threads
+        self.batch_size = max(1, batch_size)
+        ONNXEmbeddingFunction._instances[self.model_name] = self
+
+    def __call__(self, input: Documents) -> Embeddings:
+        texts = list(input)
+        output = np.empty((len(texts), self.config["dimension"]), dtype=np.float32)
+        for rows in length_sorted_batches([len(text) for text in texts], self.batch_size):
+            output[rows] = self._embed_batch([texts[i] for i in rows])
+        return list(output)
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        feeds = onnx_feeds(self.tokenizer.encode_batch(texts), self.input_names)
+        hidden = self.session.run(None, feeds)[0]
+
+        if self.config["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        else:
+            mask = feeds["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.config["normalize"]:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    @staticmethod
+    def name() -> str:
+        return SentenceTransformerEmbeddingFunction.name()
+
+    def get_config(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "device": "cpu", "normalize_embeddings": False, "kwargs": {}}
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "EmbeddingFunction[Documents]":
+        instance = ONNXEmbeddingFunction._instances.get(config.get("model_name"))
+        return instance if instance is not None else SentenceTransformerEmbeddingFunction.build_from_config(config)
+
+    def default_space(self) -> Space:
+        return "cosine"
+
+    def supported_spaces(self) -> List[Space]:
+        return ["cosine", "l2", "ip"]
+
+
+class _BatchRequest:
+    __slots__ = ("texts", "future", "enqueued")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class QueryEmbeddingBatcher:
+    """
+    Micro-batches query embeddings from concurrent callers.
+
+    Callers block in __call__ while a worker thread embeds their texts
+    together with everyone else's. Requests that arrive while a batch is
+    running form the next one. Once traffic is concurrent (the last batch
+    served several callers, or more arrived meanwhile), the worker also lingers
+    for more requests: up to max_wait, but never more than half a typical
+    forward pass (waiting longer than that costs more than it saves), and only
+    until as many callers are queued as the last batch served. A lone caller
+    is embedded right away, so single-user latency is unchanged.
+
+    Args:
+        embed: The embedding function (texts -> vectors)
+        max_batch: Most texts per forward pass
+        max_wait: Seconds the first request of a batch may wait for company under load
+    """
+
+    def __init__(self, embed: Callable[[List[str]], Embeddings], max_batch: int = 32, max_wait: float = 0.005):
+        self.embed = embed
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self._queue: Deque[_BatchRequest] = deque()
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._concurrent = False
+        self._last_requests = 1
+        self._forward_seconds = 0.0  # moving average of one forward pass
+        self._batches = 0
+        self._requests = 0
+        self._texts = 0
+        self._largest = 0
+        self._wait_total = 0.0
+
+    def __call__(self, texts: List[str]) -> Embeddings:
+        request = _BatchRequest(list(texts))
+        with self._cond:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="query-embedder", daemon=True)
+                self._worker.start()
+            self._queue.append(request)
+            self._cond.notify()
+        return request.future.result()
+
+    def _take_batch(self) -> List[_BatchRequest]:
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            linger = min(self.max_wait, self._forward_seconds / 2)
+            if self._concurrent and linger > 0:
+                deadline = self._queue[0].enqueued + linger
+                while (len(self._queue) < self._last_requests
+                       and sum(len(r.texts) for r in self._queue) < self.max_batch):
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            batch, size = [], 0
+            while self._queue and (not batch or size + len(self._queue[0].texts) <= self.max_batch):
+                request = self._queue.popleft()
+                batch.append(request)
+                size += len(request.texts)
+            # Linger next time only if this batch had company, or more requests are already waiting
+            self._concurrent = len(batch) > 1 or bool(self._queue)
+            self._last_requests = len(batch)
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            started = time.perf_counter()
+            texts = [text for request in batch for text in request.texts]
+            try:
+                vectors = list(self.embed(texts))
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            forward = time.perf_counter() - started
+            offset = 0
+            for request in batch:
+                request.future.set_result(vectors[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+
+            waits = [started - request.enqueued for request in batch]
+            QUERY_EMBED_BATCH_SIZE.observe(len(texts))
+            for wait in waits:
+                QUERY_EMBED_QUEUE_WAIT.observe(wait)
+            with self._cond:
+                self._batches += 1
+                self._requests += len(batch)
+                self._texts += len(texts)
+                self._largest = max(self._largest, len(texts))
+                self._wait_total += sum(waits)
+                self._forward_seconds = forward if self._batches == 1 else 0.8 * self._forward_seconds + 0.2 * forward
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "batches": self._batches,
+                "requests": self._requests,
+                "texts": self._texts,
+                "mean_batch_size": round(self._texts / self._batches, 2) if self._batches else 0.0,
+                "largest_batch": self._largest,
+                "mean_queue_wait_ms": round(self._wait_total / self._requests * 1000, 3) if self._requests else 0.0,
+                "queued": len(self._queue),
+            }
+
+
+def create_embedding_function(backend: str, model_name: str, onnx_dir: Optional[str] = None,
+                              quantized: bool = False, threads: int = 0,
+                              batch_size: int = 32) -> EmbeddingFunction:
+    """
+    The embedding function for a backend.
+
+    Raises:
+        ValueError: Unknown backend, or the ONNX export was made from a different model
+        FileNotFoundError: The ONNX model hasn't been exported to onnx_dir
+    """
+    if backend == "torch":
+        return SentenceTransformerEmbeddingFunction(model_name=model_name)
+    if backend != "onnx":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r} (expected one of {', '.join(BACKENDS)})")
+    function = ONNXEmbeddingFunction(onnx_dir or default_onnx_dir(model_name), quantized, threads, batch_size)
+    if function.model_name != model_name:
+        raise ValueError(f"ONNX model in {function.model_dir} was exported from {function.model_name!r}, "
+                         f"but EMBEDDING_MODEL is {model_name!r}")
+    logger.info("Embedding with ONNX Runtime (%s%s, %s threads, batch %d)", function.model_dir,
+                ", int8" if quantized else "", threads or "auto", function.batch_size)
+    return function
+
+
+def export_onnx(model_name: str, output_dir: str, quantize: bool = False, opset: int = 17) -> Dict:
+    """
+    Export a sentence-transformers model for the onnx backend (needs torch).
+
+    Writes the transformer as model.onnx (plus model_int8.onnx with
+    quantize), its tokenizer, and the pooling settings the runtime applies.
+
+    Returns:
+        The exported config
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    modules = {type(module).__name__: module for module in model}
+    pooling_module = modules["Pooling"]
+    # sentence-transformers 6 exposes the mode directly; earlier versions through get_pooling_mode_str()
+    pooling = getattr(pooling_module, "pooling_mode", None) or pooling_module.get_pooling_mode_str()
+    if pooling not in ("mean", "cls"):
+        raise ValueError(f"Pooling mode {pooling!r} is not supported by the ONNX backend")
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids=None):
+            return self.transformer(input_ids=input_ids, attention_mask=attention_mask,
+                                    token_type_ids=token_type_ids).last_hidden_state
+
+    os.makedirs(output_dir, exist_ok=True)
+    sample = tokenizer(["telecom architecture", "a longer sample sentence for export"],
+                       padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(_LastHiddenState(), tuple(sample[name] for name in input_names),
+                          os.path.join(output_dir, ONNX_MODEL_FILE), input_names=input_names,
+                          output_names=["last_hidden_state"], dynamic_axes=dynamic_axes,
+                          opset_version=opset, dynamo=False)
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, "tokenizer.json"))
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(os.path.join(output_dir, ONNX_MODEL_FILE), os.path.join(output_dir, ONNX_QUANTIZED_FILE),
+                         weight_type=QuantType.QInt8)
+
+    config = {
+        "model_name": model_name,
+        "dimension": int(model.encode(["dimension probe"]).shape[1]),
+        "max_seq_length": model.max_seq_length,
+        "pooling": pooling,
+        "normalize": "Normalize" in modules,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "quantized": quantize,
+        "opset": opset,
+    }
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), "w") as f:
+        json.dump(config, f, indent=2)
+    return config
+
+
+def _cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return (a * b).sum(axis=1) / np.clip(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12, None)
+
+
+def _timed_embed(function: EmbeddingFunction, texts: List[str]) -> Tuple[np.ndarray, float]:
+    function(texts[:4])  # warm up (lazy allocations, first-call graph setup)
+    start = time.perf_counter()
+    embeddings = np.asarray(function(texts), dtype=np.float32)
+    return embeddings, time.perf_counter() - start
+
+
+def parity_check(reference: EmbeddingFunction, candidate: EmbeddingFunction,
+                 queries: List[str], documents: List[str]) -> Dict:
+    """
+    Compare a candidate backend's embeddings with the reference (PyTorch) ones.
+
+    Reports per-text cosine similarity and whether each query's nearest
+    document is the same under both, plus throughput of each backend.
+    """
+    texts = queries + documents
+    ref, ref_seconds = _timed_embed(reference, texts)
+    cand, cand_seconds = _timed_embed(candidate, texts)
+    cosine = _cosine_rows(ref, cand)
+
+    def nearest(embeddings: np.ndarray) -> np.ndarray:
+        q, d = embeddings[:len(queries)], embeddings[len(queries):]
+        q = q / np.linalg.norm(q, axis=1, keepdims=True)
+        d = d / np.linalg.norm(d, axis=1, keepdims=True)
+        return (q @ d.T).argmax(axis=1)
+
+    top1 = float((nearest(ref) == nearest(cand)).mean()) if queries and documents else None
+    return {
+        "texts": len(texts),
+        "min_cosine": round(float(cosine.min()), 5),
+        "mean_cosine": round(float(cosine.mean()), 5),
+        "max_abs_diff": round(float(np.abs(ref - cand).max()), 5),
+        "top1_agreement": top1,
+        "reference_texts_per_second": round(len(texts) / ref_seconds, 1),
+        "candidate_texts_per_second": round(len(texts) / cand_seconds, 1),
+    }
+
+
+def _parity_corpus(chunk_words: int = 200) -> Tuple[List[str], List[str]]:
+    """Golden-set questions as queries and the bundled knowledge base, chunked, as documents."""
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    queries_path = os.path.join(repo_dir, "benchmarks", "golden_queries.json")
+    queries = []
+    if os.path.exists(queries_path):
+        with open(queries_path) as f:
+            queries = [item["question"] for item in json.load(f)["queries"]]
+    documents = []
+    knowledge_dir = os.path.join(repo_dir, os.getenv("KNOWLEDGE_DIR", "knowledge_base"))
+    paths = [path for ext in ("md", "txt") for path in glob.glob(os.path.join(knowledge_dir, "**", f"*.{ext}"),
+                                                                   recursive=True)]
+    for path in sorted(paths):
+        with open(path, encoding="utf-8") as f:
+            words = f.read().split()
+        documents += [" ".join(words[i:i + chunk_words]) for i in range(0, len(words), chunk_words)]
+    return queries, documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and check the ONNX embedding backend")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Export EMBEDDING_MODEL to ONNX (needs sentence-transformers/torch)")
+    export.add_argument("output", nargs="?", help="Directory to write (default models/<model>-onnx)")
+    export.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+    export.add_argument("--quantize", action="store_true", help="Also write an int8 dynamically quantized model")
+    parity = sub.add_parser("parity", help="Compare ONNX embeddings with PyTorch on the golden queries and knowledge base")
+    parity.add_argument("model_dir", nargs="?", help="Exported model directory (default models/<model>-onnx)")
+    parity.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+    parity.add_argument("--quantized", action="store_true", help="Check the int8 model")
+    parity.add_argument("--threads", type=int, default=int(os.getenv("EMBEDDING_THREADS", "0")))
+    parity.add_argument("--batch-size", type=int, default=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")))
+    parity.add_argument("--min-cosine", type=float, default=None,
+                        help="Fail below this per-text cosine (default 0.999, or 0.98 with --quantized)")
+    parity.add_argument("--min-top1", type=float, default=0.95,
+                        help="Fail if fewer queries keep the same nearest document")
+    parity.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        output = args.output or default_onnx_dir(args.model)
+        start = time.perf_counter()
+        config = export_onnx(args.model, output, args.quantize)
+        print(f"✓ Exported {args.model} to {output} in {time.perf_counter() - start:.1f}s "
+              f"({config['dimension']}-d, {config['pooling']} pooling{', int8 model too' if args.quantize else ''})")
+        return
+
+    model_dir = args.model_dir or default_onnx_dir(args.model)
+    candidate = create_embedding_function("onnx", args.model, model_dir, args.quantized, args.threads, args.batch_size)
+    reference = create_embedding_function("torch", args.model)
+    queries, documents = _parity_corpus()
+    report = parity_check(reference, candidate, queries, documents)
+    report.update(model=args.model, model_dir=model_dir, quantized=args.quantized,
+                  threads=args.threads, batch_size=args.batch_size)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    min_cosine = args.min_cosine if args.min_cosine is not None else (0.98 if args.quantized else 0.999)
+    failures = []
+    if report["min_cosine"] < min_cosine:
+        failures.append(f"min cosine {report['min_cosine']} < {min_cosine}")
+    if report["top1_agreement"] is not None and report["top1_agreement"] < args.min_top1:
+        failures.append(f"top-1 agreement {report['top1_agreement']:.2f} < {args.min_top1}")
+    if failures:
+        print(f"\n✗ Parity check failed: {'; '.join(failures)}")
+        sys.exit(1)
+    print(f"\n✓ ONNX{' int8' if args.quantized else ''} embeddings match PyTorch "
+          f"(min cosine {report['min_cosine']}, {report['candidate_texts_per_second'] / report['reference_texts_per_second']:.1f}x throughput)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,23 @@
+# Imported first so cold-start time spent on imports is measured (see telecom_advisor_startup.py)
+from telecom_advisor_startup import STARTUP_TIMINGS, mark_ready, record_phase, startup_phase
+import time
+_imports_started = time.perf_counter()
+
 import requests
 import chromadb
-from chromadb.utils import embedding_functions
+from chromadb.config import Settings
 import os
 import json
 import logging
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional
-import PyPDF2
-from rank_bm25 import BM25Okapi
+from typing import Callable, List, Dict, Tuple, Optional, Iterator
 import re
-import docx  # python-docx for Word documents
+import functools
+import hashlib
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from tenacity import (
     retry,
     stop_after_attempt,
@@ -20,18 +28,63 @@ from tenacity import (
 
 from dotenv import load_dotenv
 
+from telecom_advisor_singleflight import SingleFlight, normalize_prompt, fingerprint
+from telecom_advisor_resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    Hedger,
+    LatencyTracker,
+    bounded_timeout,
+    check_deadline,
+    deadline_scope,
+    guarded_timeout,
+    remaining_time,
+    stop_at_deadline,
+    wait_retry_after
+)
+from telecom_advisor_extractive import DEGRADED_MARKER, build_extractive_answer
+from telecom_advisor_cache import TTLCache
+from telecom_advisor_tracing import add_trace_hook, request_trace, span
+from telecom_advisor_logging import setup_logging_from_env
+from telecom_advisor_memory import MemoryDiagnostics
+from telecom_advisor_conversations import ConversationStore
+from telecom_advisor_jobs import InteractivePriority, IngestionJobQueue, Job, extract_pages, extractor_version
+from telecom_advisor_textcache import ExtractionCache
+from telecom_advisor_index import file_sha256, source_key
+from telecom_advisor_shards import Shard, ShardSet
+from telecom_advisor_tenants import (
+    TenantError,
+    TenantKnowledgeBase,
+    TenantRegistry,
+    current_tenant,
+    tenant_collection_name,
+    tenant_scope,
+    use_tenant,
+)
+from telecom_advisor_snapshot import SnapshotError, restore_snapshot
+from telecom_advisor_embeddings import QueryEmbeddingBatcher, create_embedding_function
+from telecom_advisor_rerank import CrossEncoderReranker, create_scorer
+from telecom_advisor_watcher import KnowledgeBaseWatcher, WatchRoot
+from telecom_advisor_warmup import CacheWarmer, top_queries
+from telecom_advisor_metrics import (
+    GEMINI_RESPONSES,
+    GEMINI_RETRIES,
+    INGESTED_CHUNKS,
+    INGESTED_DOCUMENTS,
+    INGEST_SKIPPED_DOCUMENTS,
+    record_gemini_usage,
+    register_counter,
+    register_gauge,
+    start_metrics_server
+)
+
+record_phase("import", time.perf_counter() - _imports_started)
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('telecom_advisor.log'),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging: queued, structured JSON file + console (see telecom_advisor_logging.py)
+setup_logging_from_env()
 logger = logging.getLogger(__name__)
 
 # Configuration constants
@@ -40,48 +93,251 @@ MAX_RETRIES = 3
 MIN_RETRY_WAIT = 1  # seconds
 MAX_RETRY_WAIT = 10  # seconds
 
-# Configuration constants
-REQUEST_TIMEOUT = 30  # seconds
-MAX_RETRIES = 3
-MIN_RETRY_WAIT = 1  # seconds
-MAX_RETRY_WAIT = 10  # seconds
+# Resilience settings for Gemini calls
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "45"))  # end-to-end budget per request, seconds
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "true").lower() != "false"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))  # hedge after this latency quantile
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "1.0"))  # seconds
+HEDGE_WORKERS = int(os.getenv("HEDGE_WORKERS", "0"))  # threads running Gemini attempts (0 = 2x API server workers)
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RECOVERY_TIMEOUT = float(os.getenv("BREAKER_RECOVERY_TIMEOUT", "30"))  # seconds
+
+# Retrieval tuning (see benchmarks/eval_retrieval.py for the quality/latency trade-off)
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))  # words per chunk at ingestion
+HYBRID_SEMANTIC_WEIGHT = float(os.getenv("HYBRID_SEMANTIC_WEIGHT", "0.7"))  # BM25 gets the rest
+RETRIEVAL_RESULTS = int(os.getenv("RETRIEVAL_RESULTS", "3"))  # chunks put in the chat prompt
+RRF_K = 60  # reciprocal-rank fusion damping constant
+# Cross-encoder reranking: score RERANK_CANDIDATES hybrid results, keep the best (see telecom_advisor_rerank)
+RERANK = os.getenv("RERANK", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "torch")  # torch or onnx, as EMBEDDING_BACKEND
+RERANK_ONNX_DIR = os.getenv("RERANK_ONNX_DIR") or None  # default models/<model>-onnx
+RERANK_ONNX_QUANTIZED = os.getenv("RERANK_ONNX_QUANTIZED", "false").lower() == "true"
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))  # hybrid results scored per query
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))  # pairs per cross-encoder forward pass
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "50000"))  # cached (query, chunk) scores
+
+# Compare mode: per-architecture retrieval fan-out and cached comparisons
+COMPARE_RESULTS_PER_QUERY = int(os.getenv("COMPARE_RESULTS_PER_QUERY", "3"))
+COMPARE_CONTEXT_CHUNKS = int(os.getenv("COMPARE_CONTEXT_CHUNKS", "6"))
+COMPARE_CACHE_TTL = float(os.getenv("COMPARE_CACHE_TTL", "3600"))  # seconds
+COMPARE_CACHE_SIZE = int(os.getenv("COMPARE_CACHE_SIZE", "256"))
+_compare_cache = TTLCache(COMPARE_CACHE_SIZE, COMPARE_CACHE_TTL, name="compare")
+
+# Chat caches; retrieval results are keyed by knowledge-base version, so ingestion makes them miss
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))  # 0 = off
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))  # 0 = off
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "3600"))  # seconds
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "0"))  # seconds; 0 = chat answers are always generated
+_query_embedding_cache = TTLCache(QUERY_EMBEDDING_CACHE_SIZE, None, name="query_embedding") \
+    if QUERY_EMBEDDING_CACHE_SIZE > 0 else None
+_retrieval_cache = TTLCache(RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL, name="retrieval") \
+    if RETRIEVAL_CACHE_SIZE > 0 else None
+_answer_cache = TTLCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, name="answer") if ANSWER_CACHE_TTL > 0 else None
+
+# Cache warm-up from analytics history (see telecom_advisor_warmup)
+WARMUP_QUERIES = int(os.getenv("WARMUP_QUERIES", "50"))  # most frequent past questions prefetched (0 = off)
+WARMUP_TARGET_HIT_RATE = float(os.getenv("WARMUP_TARGET_HIT_RATE", "0.9"))  # warm share of their traffic
+WARMUP_MAX_WAIT = float(os.getenv("WARMUP_MAX_WAIT", "20"))  # seconds the server waits for it (0 = no limit)
+WARMUP_ANSWERS = int(os.getenv("WARMUP_ANSWERS", "0"))  # answers pre-generated via Gemini (needs ANSWER_CACHE_TTL)
+WARMUP_ANSWER_INTERVAL = float(os.getenv("WARMUP_ANSWER_INTERVAL", "1"))  # seconds between those Gemini calls
+_compare_flight = SingleFlight("compare")
+
+# Degraded mode: answer extractively from retrieved context when Gemini can't answer in time
+DEGRADED_MODE = os.getenv("DEGRADED_MODE", "true").lower() != "false"
+DEGRADED_ANSWER_SLO = float(os.getenv("DEGRADED_ANSWER_SLO", "0.3"))  # seconds reserved to build it
+
+# Coalesce identical concurrent questions into one retrieval and one Gemini call
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() != "false"
+_retrieval_flight = SingleFlight("retrieval")
+_generation_flight = SingleFlight("generation")
+
+# Per-stage timing: requests slower than TRACE_PROFILE_THRESHOLD seconds keep a profile (0 = off)
+TRACE_PROFILE_THRESHOLD = float(os.getenv("TRACE_PROFILE_THRESHOLD", "0")) or None
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Prometheus metrics endpoint started by the CLI and the Streamlit app (0 = disabled)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Cold-start budget in seconds for each entry point (0 = none); see benchmarks/startup_check.py
+STARTUP_BUDGET = float(os.getenv("STARTUP_BUDGET", "30"))
+
+# Memory diagnostics: tracemalloc around request stages plus periodic RSS/object sampling (opt-in)
+MEMORY_DIAGNOSTICS = os.getenv("MEMORY_DIAGNOSTICS", "false").lower() == "true"
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "10"))
+MEMORY_SAMPLE_INTERVAL = float(os.getenv("MEMORY_SAMPLE_INTERVAL", "60"))  # seconds
+MEMORY_DUMP_PATH = os.getenv("MEMORY_DUMP_PATH") or None  # JSON-lines file for samples
+memory_diagnostics = MemoryDiagnostics(
+    frames=MEMORY_TRACE_FRAMES,
+    sample_interval=MEMORY_SAMPLE_INTERVAL,
+    dump_path=MEMORY_DUMP_PATH
+)
+if MEMORY_DIAGNOSTICS:
+    # Start before the model and index load so their allocations are attributed too
+    memory_diagnostics.start()
+
+# Chat history of the CLI and the Streamlit app, persisted across restarts (SQLite, opened on first use)
+CONVERSATION_DB = os.getenv("CONVERSATION_DB", "conversations.db")
+CONVERSATION_PAGE_SIZE = int(os.getenv("CONVERSATION_PAGE_SIZE", "20"))  # exchanges rendered per page
+conversation_store = ConversationStore(CONVERSATION_DB)
+
+# Embedding model; snapshots built with another model are rejected on restore
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# How the model runs, for ingestion and queries: torch (sentence-transformers) or onnx (see telecom_advisor_embeddings.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR") or None  # default models/<model>-onnx
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "false").lower() == "true"  # int8 dynamically quantized model
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # ONNX Runtime intra-op threads (0 = per core)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))  # texts per ONNX inference call
+# Query embeddings of concurrent requests share forward passes (see QueryEmbeddingBatcher)
+QUERY_BATCHING = os.getenv("QUERY_BATCHING", "true").lower() != "false"
+QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", "32"))  # most query texts per forward pass
+QUERY_BATCH_WAIT = float(os.getenv("QUERY_BATCH_WAIT", "0.005"))  # seconds a batch may wait for company under load
+# Prebuilt knowledge-base snapshot restored into an empty index at startup (see telecom_advisor_snapshot.py)
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH") or None
+
+# Incremental sync of changed files in the knowledge sources (see telecom_advisor_watcher.py)
+WATCH_KNOWLEDGE_BASE = os.getenv("WATCH_KNOWLEDGE_BASE", "false").lower() == "true"
+WATCH_BACKEND = os.getenv("WATCH_BACKEND", "auto")  # auto (watchdog if installed), watchdog or polling
+WATCH_DEBOUNCE = float(os.getenv("WATCH_DEBOUNCE", "2"))  # seconds a file must be quiet before it is synced
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "5"))  # seconds between scans when polling
+# Sharding: one collection and lexical index per value of this metadata key (e.g. domain); unset = one collection
+SHARD_KEY = os.getenv("SHARD_KEY", "").strip() or None
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "8"))  # threads fanning a query out across shards
+# Tenants: per-team knowledge bases selected per request (see telecom_advisor_tenants)
+TENANT_MAX_OPEN = int(os.getenv("TENANT_MAX_OPEN", "8"))  # tenants whose indexes and caches stay resident
+CHROMA_TENANT_MEMORY_MB = int(os.getenv("CHROMA_TENANT_MEMORY_MB", "256"))  # vector-index memory per open knowledge base
+# Cap on loaded vector indexes (0 = none); by default room for the shared knowledge base and TENANT_MAX_OPEN tenants
+CHROMA_MEMORY_LIMIT_MB = int(os.getenv("CHROMA_MEMORY_LIMIT_MB") or (TENANT_MAX_OPEN + 1) * CHROMA_TENANT_MEMORY_MB)
+# Background ingestion of uploads (see telecom_advisor_jobs)
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "1"))  # uploads ingested at the same time
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "64"))  # chunks embedded between progress updates
+INGEST_YIELD_MAX_WAIT = float(os.getenv("INGEST_YIELD_MAX_WAIT", "2"))  # seconds a batch waits for chat requests
+# Text extracted from PDFs and Word files, reused while the bytes are unchanged (see telecom_advisor_textcache)
+EXTRACTION_CACHE_DB = os.getenv("EXTRACTION_CACHE_DB", "extraction_cache.db")  # empty = always re-extract
+EXTRACTION_CACHE_MAX_MB = float(os.getenv("EXTRACTION_CACHE_MAX_MB", "1024"))  # compressed text kept
+extraction_cache = ExtractionCache(EXTRACTION_CACHE_DB, EXTRACTION_CACHE_MAX_MB) if EXTRACTION_CACHE_DB else None
 
 # ChromaDB collection initialization (copied from telecom_advisor_rag.py)
 try:
-    chroma_client = chromadb.PersistentClient(path="./chroma_db")
-    embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
-    )
-    collection = chroma_client.get_or_create_collection(
-        name="telecom_knowledge",
-        embedding_function=embedding_function
-    )
+    with startup_phase("index_open"):
+        # With a memory limit, ChromaDB unloads the least recently used collections' vector indexes
+        chroma_settings = Settings(chroma_segment_cache_policy="LRU",
+                                   chroma_memory_limit_bytes=CHROMA_MEMORY_LIMIT_MB * 1024 * 1024) \
+            if CHROMA_MEMORY_LIMIT_MB > 0 else Settings()
+        chroma_client = chromadb.PersistentClient(path="./chroma_db", settings=chroma_settings)
+    with startup_phase("model_load"):
+        embedding_function = create_embedding_function(
+            EMBEDDING_BACKEND,
+            EMBEDDING_MODEL,
+            onnx_dir=ONNX_MODEL_DIR,
+            quantized=ONNX_QUANTIZED,
+            threads=EMBEDDING_THREADS,
+            batch_size=EMBEDDING_BATCH_SIZE
+        )
+    with startup_phase("index_open"):
+        collection = chroma_client.get_or_create_collection(
+            name="telecom_knowledge",
+            embedding_function=embedding_function
+        )
+        # One fan-out pool for the shared knowledge base's shards and every tenant's
+        shard_pool = ThreadPoolExecutor(max_workers=SHARD_WORKERS, thread_name_prefix="shard") if SHARD_KEY else None
+        shard_set = ShardSet(chroma_client, embedding_function, "telecom_knowledge", SHARD_KEY,
+                             pool=shard_pool) if SHARD_KEY else None
+    query_embedder = QueryEmbeddingBatcher(embedding_function, QUERY_BATCH_SIZE, QUERY_BATCH_WAIT)
     logger.info("ChromaDB initialized successfully")
 except Exception as e:
     logger.error(f"Failed to initialize ChromaDB: {e}")
     raise
 
+_reranker: Optional[CrossEncoderReranker] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """The cross-encoder reranker, loaded on first use (None while RERANK is off)."""
+    global _reranker
+    if not RERANK:
+        return None
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                scorer = create_scorer(RERANK_BACKEND, RERANK_MODEL, onnx_dir=RERANK_ONNX_DIR,
+                                       quantized=RERANK_ONNX_QUANTIZED, threads=EMBEDDING_THREADS,
+                                       batch_size=RERANK_BATCH_SIZE)
+                _reranker = CrossEncoderReranker(scorer, cache_size=RERANK_CACHE_SIZE)
+    return _reranker
+
+
+if RERANK:
+    with startup_phase("model_load"):
+        get_reranker()
+
 # Google Gemini API Configuration
+# GEMINI_API_BASE can point at a local stand-in (see mock_gemini_server.py), which needs no key
+DEFAULT_GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", DEFAULT_GEMINI_API_BASE).rstrip("/")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
-    error_msg = "GEMINI_API_KEY not found in environment variables. Please create a .env file with your Gemini API key."
-    logger.error(error_msg)
-    raise ValueError(error_msg)
-API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={GEMINI_API_KEY}"
+    if GEMINI_API_BASE == DEFAULT_GEMINI_API_BASE:
+        error_msg = "GEMINI_API_KEY not found in environment variables. Please create a .env file with your Gemini API key."
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+    GEMINI_API_KEY = "unused"
+    logger.warning(f"No GEMINI_API_KEY set; using custom endpoint {GEMINI_API_BASE}")
+API_URL = f"{GEMINI_API_BASE}/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
+STREAM_API_URL = f"{GEMINI_API_BASE}/models/{GEMINI_MODEL}:streamGenerateContent?alt=sse&key={GEMINI_API_KEY}"
 logger.info("Gemini API configured successfully")
 
+# Fail fast while Gemini is unhealthy; hedge calls that run past the tail latency
+gemini_breaker = CircuitBreaker(
+    "gemini",
+    failure_threshold=BREAKER_FAILURE_THRESHOLD,
+    recovery_timeout=BREAKER_RECOVERY_TIMEOUT
+)
+gemini_hedger = Hedger(
+    LatencyTracker(),
+    percentile=HEDGE_PERCENTILE,
+    min_delay=HEDGE_MIN_DELAY,
+    enabled=HEDGE_REQUESTS,
+    max_workers=HEDGE_WORKERS or 2 * int(os.getenv("ADVISOR_WORKERS", "8"))
+)
+
+
+def _is_endpoint_failure(e: requests.exceptions.RequestException) -> bool:
+    """Whether an error says the endpoint is unhealthy (as opposed to a bad request)."""
+    if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+        return e.response.status_code >= 500 or e.response.status_code in (408, 429)
+    return True
+
+
+def _retry_sleep(seconds: float) -> None:
+    """tenacity sleep hook so backoff time shows up as its own stage in request traces."""
+    GEMINI_RETRIES.inc()
+    with span("gemini.retry_wait"):
+        time.sleep(seconds)
+
 
 # Retry decorator for API calls
 @retry(
-    stop=stop_after_attempt(MAX_RETRIES),
-    wait=wait_exponential(multiplier=MIN_RETRY_WAIT, max=MAX_RETRY_WAIT),
+    stop=stop_after_attempt(MAX_RETRIES) | stop_at_deadline,
+    wait=wait_retry_after(wait_exponential(multiplier=MIN_RETRY_WAIT, max=MAX_RETRY_WAIT), MAX_RETRY_WAIT),
     retry=retry_if_exception_type((requests.exceptions.RequestException, requests.exceptions.Timeout)),
-    before_sleep=before_sleep_log(logger, logging.WARNING)
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    sleep=_retry_sleep,
+    reraise=True
 )
 def call_gemini_api(prompt: str, temperature: float = 0.7, max_tokens: int = 2048) -> Dict:
     """
     Call Gemini API with retry logic and error handling.
     
+    Each attempt is bounded by the remaining request deadline, may be hedged
+    with a duplicate call when it runs past the observed tail latency, and is
+    refused outright while the circuit breaker is open.
+    
     Args:
         prompt: The prompt to send to Gemini
         temperature: Temperature for response generation
@@ -92,6 +348,8 @@ def call_gemini_api(prompt: str, temperature: float = 0.7, max_tokens: int = 204
         
     Raises:
         requests.exceptions.RequestException: For API call failures
+        CircuitOpenError: If the circuit breaker is open
+        DeadlineExceeded: If the request budget is spent
     """
     headers = {"Content-Type": "application/json"}
     
@@ -102,37 +360,160 @@ def call_gemini_api(prompt: str, temperature: float = 0.7, max_tokens: int = 204
             "maxOutputTokens": max_tokens
         }
     }
-    
-    try:
-        logger.debug(f"Calling Gemini API with prompt length: {len(prompt)}")
-        response = requests.post(
-            API_URL, 
-            headers=headers, 
-            json=data, 
-            timeout=REQUEST_TIMEOUT
-        )
+
+    timeout = guarded_timeout(gemini_breaker, REQUEST_TIMEOUT)
+
+    def _post() -> Dict:
+        # Per attempt: a hedge starts later than the primary, with less of the budget left
+        attempt_timeout = bounded_timeout(timeout)
+        try:
+            response = requests.post(
+                API_URL, 
+                headers=headers, 
+                json=data, 
+                timeout=attempt_timeout
+            )
+        except requests.exceptions.Timeout:
+            GEMINI_RESPONSES.labels(code="timeout").inc()
+            raise
+        except requests.exceptions.RequestException:
+            GEMINI_RESPONSES.labels(code="network").inc()
+            raise
+        GEMINI_RESPONSES.labels(code=str(response.status_code)).inc()
         response.raise_for_status()
-        logger.info("Gemini API call successful")
         return response.json()
+
+    try:
+        logger.debug("Calling Gemini API with prompt length: %d", len(prompt))
+        with span("gemini.call"):
+            result = gemini_hedger.call(_post)
+        gemini_breaker.record_success()
+        record_gemini_usage(result.get("usageMetadata"))
+        logger.info("Gemini API call successful")
+        return result
     except requests.exceptions.Timeout:
-        logger.error(f"Gemini API request timed out after {REQUEST_TIMEOUT} seconds")
+        gemini_breaker.record_failure()
+        logger.error(f"Gemini API request timed out after {timeout:.1f} seconds")
         raise
     except requests.exceptions.HTTPError as e:
+        if _is_endpoint_failure(e):
+            gemini_breaker.record_failure()
+        else:
+            gemini_breaker.record_success()
         logger.error(f"Gemini API HTTP error: {e.response.status_code} - {e.response.text}")
         raise
     except requests.exceptions.RequestException as e:
+        gemini_breaker.record_failure()
         logger.error(f"Gemini API request failed: {e}")
         raise
+    except BaseException:
+        # No verdict on the endpoint (e.g. deadline hit in the hedger); don't hold a half-open trial slot
+        gemini_breaker.release()
+        raise
 
-def get_architecture_advice_with_rag(
+
+def resilience_stats() -> Dict:
+    """Snapshot of breaker, hedging, coalescing and query-batching counters for monitoring."""
+    return {
+        "circuit_breaker": gemini_breaker.stats(),
+        "hedging": gemini_hedger.stats(),
+        "coalescing": {
+            "retrieval": _retrieval_flight.stats(),
+            "generation": _generation_flight.stats(),
+            "compare": _compare_flight.stats()
+        },
+        "compare_cache": _compare_cache.stats(),
+        "retrieval_cache": _retrieval_cache.stats() if _retrieval_cache else None,
+        "query_embedding_cache": _query_embedding_cache.stats() if _query_embedding_cache else None,
+        "answer_cache": _answer_cache.stats() if _answer_cache else None,
+        "tenants": tenants.stats(),
+        "rerank": get_reranker().stats() if RERANK else None,
+        "query_batching": dict(query_embedder.stats(), enabled=QUERY_BATCHING)
+    }
+
+
+def _chat_caches() -> Dict[str, TTLCache]:
+    caches = {"retrieval": _retrieval_cache, "query_embedding": _query_embedding_cache, "answer": _answer_cache}
+    return {name: cache for name, cache in caches.items() if cache is not None}
+
+
+def _coalescing_hit_ratio(stats: Dict) -> float:
+    calls = stats["leaders"] + stats["followers"]
+    return stats["followers"] / calls if calls else 0.0
+
+
+def _flights() -> Dict[str, SingleFlight]:
+    return {"retrieval": _retrieval_flight, "generation": _generation_flight, "compare": _compare_flight}
+
+
+# Scrape-time metrics (see telecom_advisor_metrics)
+register_gauge("advisor_kb_chunks", "Chunks in the knowledge base collection", lambda: kb_chunk_count())
+register_gauge("advisor_kb_shard_chunks", "Chunks per knowledge-base shard (SHARD_KEY)",
+               lambda: shard_set.stats() if shard_set is not None else {}, labels=["shard"])
+register_gauge("advisor_tenants_open", "Tenant knowledge bases currently open (TENANT_MAX_OPEN at most)",
+               lambda: len(tenants.open_tenants()))
+register_counter("advisor_tenant_opens", "Tenant knowledge bases opened, and closed again as least recently used",
+                 lambda: {"opened": tenants.opened, "evicted": tenants.evictions}, labels=["event"])
+register_gauge("advisor_startup_seconds", "Cold-start time by phase (import, model_load, index_open, kb_sync, ...)",
+               lambda: dict(STARTUP_TIMINGS), labels=["phase"])
+register_gauge(
+    "advisor_cache_hit_ratio", "Hit ratio of answer caches and in-flight coalescing",
+    lambda: {"compare": _compare_cache.stats()["hit_ratio"],
+             **({"extraction": extraction_cache.stats()["hit_ratio"]} if extraction_cache else {}),
+             **({"rerank": _reranker.cache.stats()["hit_ratio"]} if _reranker else {}),
+             **{name: cache.stats()["hit_ratio"] for name, cache in _chat_caches().items()},
+             **{f"{name}_coalescing": _coalescing_hit_ratio(flight.stats())
+                for name, flight in _flights().items()}},
+    labels=["cache"]
+)
+register_gauge("advisor_extraction_cache_documents", "Documents whose extracted text is in the extraction cache",
+               lambda: extraction_cache.stats()["documents"] if extraction_cache else 0)
+register_gauge("advisor_cache_entries", "Entries held in answer caches",
+               lambda: {"compare": len(_compare_cache), **({"rerank": len(_reranker.cache)} if _reranker else {}),
+                        **{name: len(cache) for name, cache in _chat_caches().items()}},
+               labels=["cache"])
+register_gauge("advisor_warmup_hit_rate", "Share of frequent past questions' traffic warmed at startup",
+               lambda: _warmer.hit_rate() if _warmer else 0.0)
+register_gauge("advisor_in_flight", "Distinct computations currently running per coalescing group",
+               lambda: {name: flight.stats()["in_flight"] for name, flight in _flights().items()},
+               labels=["group"])
+register_gauge(
+    "advisor_circuit_breaker_state", "1 for the Gemini circuit breaker's current state",
+    lambda: {state: float(gemini_breaker.state == state)
+             for state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)},
+    labels=["state"]
+)
+register_counter("advisor_circuit_breaker_opened", "Times the Gemini circuit breaker opened",
+                 lambda: gemini_breaker.stats()["times_opened"])
+register_counter("advisor_circuit_breaker_rejected", "Gemini calls refused while the circuit was open",
+                 lambda: gemini_breaker.stats()["rejected"])
+register_counter("advisor_gemini_hedges", "Hedged Gemini calls sent, and those the hedge won",
+                 lambda: {"sent": gemini_hedger.stats()["hedges_sent"], "won": gemini_hedger.stats()["hedge_wins"]},
+                 labels=["result"])
+register_gauge("advisor_gemini_hedge_delay_seconds", "Current delay before a Gemini call is hedged",
+               gemini_hedger.hedge_delay)
+register_gauge("advisor_kb_watch_pending", "Changed knowledge files waiting to be synced",
+               lambda: sum(_watcher.stats()[key] for key in ("pending", "queued")) if _watcher else 0)
+register_counter("advisor_kb_watch_syncs", "Changed knowledge files synced by the watcher",
+                 lambda: {"ok": _watcher.synced, "error": _watcher.errors} if _watcher else {},
+                 labels=["outcome"])
+
+
+def build_advice_prompt(
     prompt: str,
     use_rag: bool = True,
-    include_citations: bool = True,
     conversation_context: List[Dict] = None
 ) -> Tuple[str, str, List[Dict]]:
     """
-    Get architecture advice using RAG with citations and conversation history.
-    Uses Google Gemini API for LLM responses.
+    Assemble the full Gemini prompt for a user question.
+    
+    Args:
+        prompt: User question
+        use_rag: Whether to retrieve knowledge base context
+        conversation_context: Previous exchanges (last 3 are included)
+        
+    Returns:
+        Tuple of (full_prompt, context, citations)
     """
     citations = []
     context = ""
@@ -146,7 +527,11 @@ def get_architecture_advice_with_rag(
 
     # Retrieve relevant context if using RAG
     if use_rag:
-        context, citations = retrieve_context_with_citations(prompt)
+        with span("retrieval"):
+            context, citations = retrieve_for_prompt(prompt)
+        check_deadline("retrieval")
+
+    with span("prompt_build"):
         if context:
             full_prompt = f"""You are an expert telecom architect. Use the following knowledge base context to answer the question accurately.
 
@@ -160,79 +545,380 @@ USER QUESTION:
 Provide a detailed, accurate answer based on the context provided. Reference sources using [Source N] notation when applicable."""
         else:
             full_prompt = f"You are an expert telecom architect.{conversation_prompt}\n\n{prompt}"
+
+    check_deadline("prompt build")
+    return full_prompt, context, citations
+
+
+def _retrieval_key(prompt: str) -> Tuple:
+    """Retrieval cache key: tenant, normalized question, settings and the version of every shard searched."""
+    return (current_tenant(), normalize_prompt(prompt), RETRIEVAL_RESULTS, RERANK,
+            tuple(shard.version() for shard in knowledge_shards()))
+
+
+def retrieve_for_prompt(prompt: str) -> Tuple[str, List[Dict]]:
+    """
+    Context and citations for a chat question, from the retrieval cache if possible.
+
+    Concurrent misses for the same question are coalesced (COALESCE_REQUESTS);
+    empty results aren't cached, so a failed search is retried next time.
+    """
+    key = _retrieval_key(prompt) if _retrieval_cache is not None else None
+    if key is not None:
+        cached = _retrieval_cache.get(key)
+        if cached is not None:
+            return cached
+    if COALESCE_REQUESTS:
+        result = _retrieval_flight.do(key or (current_tenant(), normalize_prompt(prompt)),
+                                      lambda: retrieve_context_with_citations(prompt), timeout=remaining_time())
     else:
-        full_prompt = f"You are an expert telecom architect.{conversation_prompt}\n\n{prompt}"
+        result = retrieve_context_with_citations(prompt)
+    if key is not None and result[0]:
+        _retrieval_cache.set(key, result)
+    return result
 
-    # Call Google Gemini API with retry logic
+
+def extract_answer_text(result: Dict) -> str:
+    """
+    Extract the answer text from a Gemini generateContent response.
+    
+    Args:
+        result: JSON response from Gemini API
+        
+    Returns:
+        Answer text, or a user-facing error message if no text could be found
+    """
+    if "candidates" in result and len(result["candidates"]) > 0:
+        candidate = result["candidates"][0]
+        # Standard path: content.parts -> text
+        if "content" in candidate and isinstance(candidate["content"], dict) and "parts" in candidate["content"]:
+            logger.info("Successfully generated response")
+            return candidate["content"]["parts"][0]["text"]
+
+        # Attempt to extract any string value from the candidate content as a fallback
+        def _extract_text(obj):
+            if isinstance(obj, str):
+                return obj
+            if isinstance(obj, dict):
+                for v in obj.values():
+                    text = _extract_text(v)
+                    if text:
+                        return text
+            if isinstance(obj, list):
+                for item in obj:
+                    text = _extract_text(item)
+                    if text:
+                        return text
+            return None
+
+        text_fallback = _extract_text(candidate.get("content")) or _extract_text(candidate)
+        if text_fallback:
+            logger.warning("Gemini response did not follow expected structure; used fallback text extraction.")
+            return text_fallback
+        error_msg = "Unexpected response structure from Gemini API"
+        logger.error(f"{error_msg}: {result}")
+        return f"Error: {error_msg}. Please try again."
+
+    error_msg = "No candidates in Gemini API response"
+    logger.warning(f"{error_msg}: {result}")
+    return f"Error: {error_msg}. The API may have filtered the content. Please try rephrasing your question."
+
+
+def _describe_request_error(e: Exception) -> str:
+    """Map a Gemini call failure to the user-facing ⚠️ message."""
+    if isinstance(e, CircuitOpenError):
+        error_msg = "The AI service is temporarily unavailable after repeated failures."
+        logger.warning(f"{error_msg} {e}")
+        return f"⚠️ {error_msg} Please try again in {max(1, round(e.retry_in))} seconds."
+    if isinstance(e, TimeoutError):
+        error_msg = "Request exceeded its time budget. The service may be experiencing high load."
+        logger.error(f"{error_msg} ({e})")
+        return f"⚠️ {error_msg} Please try again in a moment."
+    if isinstance(e, requests.exceptions.Timeout):
+        error_msg = f"Request timed out after {REQUEST_TIMEOUT} seconds. The service may be experiencing high load."
+        logger.error(error_msg)
+        return f"⚠️ {error_msg} Please try again in a moment."
+    if isinstance(e, requests.exceptions.HTTPError):
+        error_msg = f"API error occurred: {e.response.status_code}"
+        logger.error(f"{error_msg} - {e.response.text}")
+        return f"⚠️ {error_msg}. Please check your API key and try again."
+    if isinstance(e, requests.exceptions.RequestException):
+        error_msg = "Network error occurred"
+        logger.error(f"{error_msg}: {e}")
+        return f"⚠️ {error_msg}. Please check your internet connection and try again."
+    error_msg = "Unexpected error occurred"
+    logger.exception(f"{error_msg}: {e}")
+    return f"⚠️ {error_msg}: {str(e)}. Please contact support if this persists."
+
+
+def _generation_key(prompt: str, context: str,
+                    conversation_context: Optional[List[Dict]]) -> Tuple[Optional[str], str, str]:
+    """Coalescing key: tenant, normalized question and a fingerprint of what the model will see."""
+    history = json.dumps(
+        [(msg.get('user'), msg.get('assistant')) for msg in (conversation_context or [])[-3:]]
+    )
+    return current_tenant(), normalize_prompt(prompt), fingerprint(context, history)
+
+
+def _generation_budget(context: str) -> Optional[float]:
+    """Remaining budget for generation, holding back time for a degraded answer."""
+    remaining = remaining_time()
+    if remaining is None:
+        return None
+    reserve = DEGRADED_ANSWER_SLO if DEGRADED_MODE and context else 0.0
+    return max(0.0, remaining - reserve)
+
+
+def _degraded_answer(prompt: str, context: str, e: Exception) -> Optional[str]:
+    """Extractive answer from the retrieved context when Gemini failed, if enabled and possible."""
+    if not DEGRADED_MODE or not context:
+        return None
+    if isinstance(e, CircuitOpenError):
+        reason = "the AI service is temporarily unavailable"
+    elif isinstance(e, (TimeoutError, requests.exceptions.Timeout)):
+        reason = "the AI model could not answer in time"
+    elif isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+        if e.response.status_code == 429:
+            reason = "the AI service is rate-limiting requests"
+        else:
+            reason = f"the AI service returned an error ({e.response.status_code})"
+    elif isinstance(e, requests.exceptions.RequestException):
+        reason = "the AI service could not be reached"
+    else:
+        reason = "the AI model could not answer"
+    logger.warning("Serving degraded answer after %s: %s", type(e).__name__, e)
     try:
-        logger.info(f"Processing query: {prompt[:100]}...")
-        result = call_gemini_api(full_prompt)
-
-        # Handle Gemini response structure
-        if "candidates" in result and len(result["candidates"]) > 0:
-            candidate = result["candidates"][0]
-            # Standard path: content.parts -> text
-            if "content" in candidate and isinstance(candidate["content"], dict) and "parts" in candidate["content"]:
-                answer = candidate["content"]["parts"][0]["text"]
-                logger.info("Successfully generated response")
-            else:
-                # Attempt to extract any string value from the candidate content as a fallback
-                def _extract_text(obj):
-                    if isinstance(obj, str):
-                        return obj
-                    if isinstance(obj, dict):
-                        for v in obj.values():
-                            text = _extract_text(v)
-                            if text:
-                                return text
-                    if isinstance(obj, list):
-                        for item in obj:
-                            text = _extract_text(item)
-                            if text:
-                                return text
-                    return None
-
-                text_fallback = _extract_text(candidate.get("content")) or _extract_text(candidate)
-                if text_fallback:
-                    answer = text_fallback
-                    logger.warning("Gemini response did not follow expected structure; used fallback text extraction.")
+        with span("degraded_answer"):
+            return build_extractive_answer(prompt, context, reason=reason, embed_fn=embed_queries,
+                                           time_budget=DEGRADED_ANSWER_SLO)
+    except Exception as build_error:
+        logger.exception(f"Failed to build degraded answer: {build_error}")
+        return None
+
+
+def _answer_outcome(answer: str) -> str:
+    """Classify an answer for metrics: ok, degraded or error."""
+    if answer.startswith(DEGRADED_MARKER):
+        return "degraded"
+    if answer.startswith(("⚠️", "Error:")):
+        return "error"
+    return "ok"
+
+
+class AdviceResult(tuple):
+    """(answer, context, citations) tuple that also carries per-stage timings in ms."""
+
+    def __new__(cls, answer: str, context: str, citations: List[Dict], timings: Dict[str, float]):
+        result = super().__new__(cls, (answer, context, citations))
+        result.timings = timings
+        return result
+
+
+def get_architecture_advice_with_rag(
+    prompt: str,
+    use_rag: bool = True,
+    include_citations: bool = True,
+    conversation_context: List[Dict] = None,
+    deadline: Optional[float] = None
+) -> AdviceResult:
+    """
+    Get architecture advice using RAG with citations and conversation history.
+    Uses Google Gemini API for LLM responses.
+    
+    The whole request (retrieval, prompt build, generation and retries) is
+    bounded by `deadline` seconds, defaulting to REQUEST_DEADLINE. If Gemini
+    cannot answer within it, a degraded extractive answer is built from the
+    retrieved context instead (see DEGRADED_MODE).
+    
+    Returns:
+        AdviceResult unpacking to (answer, context, citations); `.timings` holds
+        milliseconds per stage (retrieval, generation, gemini.call, ...) and total
+    """
+    with request_trace("advice", profile_threshold=TRACE_PROFILE_THRESHOLD, profile_dir=PROFILE_DIR,
+                       query=prompt[:100], use_rag=use_rag) as trace:
+        answer, context, citations = _advise_with_rag(prompt, use_rag, conversation_context, deadline)
+        trace.annotate(citations=len(citations), outcome=_answer_outcome(answer))
+    return AdviceResult(answer, context, citations, trace.timings())
+
+
+def _advise_with_rag(
+    prompt: str,
+    use_rag: bool,
+    conversation_context: Optional[List[Dict]],
+    deadline: Optional[float]
+) -> Tuple[str, str, List[Dict]]:
+    with deadline_scope(REQUEST_DEADLINE if deadline is None else deadline):
+        try:
+            full_prompt, context, citations = build_advice_prompt(prompt, use_rag, conversation_context)
+        except TimeoutError as e:
+            return _describe_request_error(e), "", []
+
+        key = _generation_key(prompt, context, conversation_context)
+        answer = _answer_cache.get(key) if _answer_cache is not None else None
+        if answer is not None:
+            log_query(prompt, [c['topic'] for c in citations])
+            return answer, context, citations
+
+        # Call Google Gemini API with retry logic
+        try:
+            logger.info("Processing query: %.100s...", prompt)
+            with deadline_scope(_generation_budget(context)), span("generation"):
+                if COALESCE_REQUESTS:
+                    result = _generation_flight.do(key, lambda: call_gemini_api(full_prompt),
+                                                   timeout=remaining_time())
                 else:
-                    error_msg = "Unexpected response structure from Gemini API"
-                    logger.error(f"{error_msg}: {result}")
-                    answer = f"Error: {error_msg}. Please try again."
-        else:
-            error_msg = "No candidates in Gemini API response"
-            logger.warning(f"{error_msg}: {result}")
-            answer = f"Error: {error_msg}. The API may have filtered the content. Please try rephrasing your question."
+                    result = call_gemini_api(full_prompt)
+            answer = extract_answer_text(result)
+            if _answer_cache is not None and _answer_outcome(answer) == "ok":
+                _answer_cache.set(key, answer)
+
+        except Exception as e:
+            answer = _degraded_answer(prompt, context, e)
+            if answer is None:
+                return _describe_request_error(e), context, citations
 
         # Log query for analytics
         topics = [c['topic'] for c in citations] if citations else []
         log_query(prompt, topics)
         return answer, context, citations
 
-    except requests.exceptions.Timeout:
-        error_msg = f"Request timed out after {REQUEST_TIMEOUT} seconds. The service may be experiencing high load."
-        logger.error(error_msg)
-        return f"⚠️ {error_msg} Please try again in a moment.", context, citations
 
-    except requests.exceptions.HTTPError as e:
-        error_msg = f"API error occurred: {e.response.status_code}"
-        logger.error(f"{error_msg} - {e.response.text}")
-        return f"⚠️ {error_msg}. Please check your API key and try again.", context, citations
+def stream_gemini_api(prompt: str, temperature: float = 0.7, max_tokens: int = 2048,
+                      timeout: Optional[float] = None) -> Iterator[str]:
+    """
+    Call the Gemini streamGenerateContent endpoint and yield text as it arrives.
+    
+    The connection is established with the same timeout as call_gemini_api; no
+    retries are attempted once text has started flowing to the caller.
+    
+    Args:
+        prompt: The prompt to send to Gemini
+        temperature: Temperature for response generation
+        max_tokens: Maximum tokens in response
+        timeout: Connect/read timeout; defaults to REQUEST_TIMEOUT bounded by the request deadline
+        
+    Yields:
+        Text fragments in generation order
+        
+    Raises:
+        requests.exceptions.RequestException: For API call failures
+    """
+    headers = {"Content-Type": "application/json"}
+    data = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": {
+            "temperature": temperature,
+            "maxOutputTokens": max_tokens
+        }
+    }
 
+    logger.debug("Streaming Gemini API with prompt length: %d", len(prompt))
+    if timeout is None:
+        timeout = guarded_timeout(gemini_breaker, REQUEST_TIMEOUT)
+    else:
+        gemini_breaker.allow()
+    try:
+        response = requests.post(STREAM_API_URL, headers=headers, json=data, timeout=timeout, stream=True)
+        GEMINI_RESPONSES.labels(code=str(response.status_code)).inc()
+        response.raise_for_status()
     except requests.exceptions.RequestException as e:
-        error_msg = "Network error occurred"
-        logger.error(f"{error_msg}: {e}")
-        return f"⚠️ {error_msg}. Please check your internet connection and try again.", context, citations
+        if isinstance(e, requests.exceptions.Timeout):
+            GEMINI_RESPONSES.labels(code="timeout").inc()
+        elif not isinstance(e, requests.exceptions.HTTPError):
+            GEMINI_RESPONSES.labels(code="network").inc()
+        if not isinstance(e, requests.exceptions.HTTPError) or _is_endpoint_failure(e):
+            gemini_breaker.record_failure()
+        else:
+            gemini_breaker.record_success()
+        raise
+    except BaseException:
+        gemini_breaker.release()
+        raise
+    gemini_breaker.record_success()
 
-    except Exception as e:
-        error_msg = "Unexpected error occurred"
-        logger.exception(f"{error_msg}: {e}")
-        return f"⚠️ {error_msg}: {str(e)}. Please contact support if this persists.", context, citations
+    with response:
+        for line in response.iter_lines(decode_unicode=True):
+            # Server-sent events: payload lines are prefixed with "data: "
+            if not line or not line.startswith("data:"):
+                continue
+            payload = line[5:].strip()
+            if not payload:
+                continue
+            try:
+                event = json.loads(payload)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping malformed stream event: {payload[:100]}")
+                continue
+            record_gemini_usage(event.get("usageMetadata"))
+            for candidate in event.get("candidates", []):
+                for part in candidate.get("content", {}).get("parts", []):
+                    if part.get("text"):
+                        yield part["text"]
+    logger.info("Gemini API stream completed")
+
+
+def stream_architecture_advice_with_rag(
+    prompt: str,
+    use_rag: bool = True,
+    include_citations: bool = True,
+    conversation_context: List[Dict] = None,
+    deadline: Optional[float] = None
+) -> Tuple[Iterator[str], str, List[Dict]]:
+    """
+    Streaming variant of get_architecture_advice_with_rag.
+    
+    Retrieval runs eagerly so context and citations are available before the
+    first token; generation happens lazily as the returned iterator is consumed.
+    The deadline bounds retrieval and the time to connect to Gemini.
+    
+    Returns:
+        Tuple of (text_iterator, context, citations)
+    """
+    with deadline_scope(REQUEST_DEADLINE if deadline is None else deadline):
+        try:
+            full_prompt, context, citations = build_advice_prompt(prompt, use_rag, conversation_context)
+        except TimeoutError as e:
+            return iter([_describe_request_error(e)]), "", []
+        # Generation runs after this scope exits, so carry the remaining budget along
+        budget = _generation_budget(context)
+        timeout = REQUEST_TIMEOUT if budget is None else max(0.01, min(REQUEST_TIMEOUT, budget))
+    # Keyed now, in the caller's tenant; the iterator may be consumed outside its tenant_scope
+    key = _generation_key(prompt, context, conversation_context)
+    cached = _answer_cache.get(key) if _answer_cache is not None else None
+    if cached is not None:
+        log_query(prompt, [c['topic'] for c in citations])
+        return iter([cached]), context, citations
+
+    def _generate() -> Iterator[str]:
+        streamed = []
+        try:
+            logger.info("Streaming query: %.100s...", prompt)
+            if COALESCE_REQUESTS:
+                chunks = _generation_flight.stream(key, lambda: stream_gemini_api(full_prompt, timeout=timeout))
+            else:
+                chunks = stream_gemini_api(full_prompt, timeout=timeout)
+            for text in chunks:
+                streamed.append(text)
+                yield text
+            if _answer_cache is not None and streamed:
+                _answer_cache.set(key, "".join(streamed))
+            topics = [c['topic'] for c in citations] if citations else []
+            log_query(prompt, topics)
+        except Exception as e:
+            # A degraded summary only makes sense if nothing was streamed yet
+            degraded = None if streamed else _degraded_answer(prompt, context, e)
+            if degraded is None:
+                yield _describe_request_error(e)
+                return
+            yield degraded
+            topics = [c['topic'] for c in citations] if citations else []
+            log_query(prompt, topics)
+
+    return _generate(), context, citations
 
 
 # --- Minimal retrieve_context_with_citations implementation ---
-def retrieve_context_with_citations(query: str, n_results: int = 3) -> Tuple[str, List[Dict]]:
+def retrieve_context_with_citations(query: str, n_results: Optional[int] = None) -> Tuple[str, List[Dict]]:
     """
     Hybrid retrieve context with citation scoring.
     
@@ -241,47 +927,121 @@ def retrieve_context_with_citations(query: str, n_results: int = 3) -> Tuple[str
     
     Args:
         query: User query text
-        n_results: Number of chunks to return
+        n_results: Number of chunks to return (defaults to RETRIEVAL_RESULTS); with RERANK on,
+            the best of RERANK_CANDIDATES hybrid results by cross-encoder score
     Returns:
         (context, citations)
         context: Concatenated text with source markers
         citations: List of dicts containing source metadata and relevance_score
     """
     try:
-        logger.debug(f"Hybrid retrieving context for query: {query[:120]}...")
-        docs, metadatas, scores = hybrid_search(query, n_results=n_results)
+        logger.debug("Hybrid retrieving context for query: %.120s...", query)
+        k = n_results or RETRIEVAL_RESULTS
+        results = [hybrid_search(query, n_results=rerank_candidates(k))]
+        docs, metadatas, scores = rerank_results([query], results, [k])[0]
         if not docs:
             logger.info("Hybrid search returned no documents")
             return "", []
 
-        # Normalize scores (simple max normalization) for display if mixed scales appear later
-        max_score = max(scores) if scores else 1.0
-        norm_scores = [s / max_score if max_score else 0.0 for s in scores]
-
-        context_parts = []
-        citations: List[Dict] = []
-        for idx, (doc, meta, raw_score, norm_score) in enumerate(zip(docs, metadatas, scores, norm_scores), 1):
-            context_parts.append(f"[Source {idx}] {doc}")
-            citations.append({
-                "source_id": idx,
-                "topic": meta.get('topic', 'general'),
-                "domain": meta.get('domain', 'telecom'),
-                "relevance_score": round(norm_score, 4),
-                "raw_score": round(raw_score, 4),
-                "doc_id": meta.get('doc_id'),
-                "chunk_index": meta.get('chunk_index'),
-                "text_preview": (doc[:140] + "...") if len(doc) > 140 else doc
-            })
-
-        context = "\n\n".join(context_parts)
-        logger.info(f"Hybrid search assembled {len(citations)} citations")
+        context, citations = format_context_with_citations(docs, metadatas, scores)
+        logger.info("Hybrid search assembled %d citations", len(citations))
         return context, citations
     except Exception as e:
         logger.exception(f"Failed hybrid retrieval: {e}")
         return "", []
 
 
+def retrieve_context_with_citations_batch(
+    queries: List[str],
+    n_results=None,
+    where=None
+) -> List[Tuple[str, List[Dict]]]:
+    """
+    retrieve_context_with_citations for many queries, retrieved together by hybrid_search_batch.
+
+    Args:
+        queries: Query texts
+        n_results: Chunks per query (defaults to RETRIEVAL_RESULTS); an int or one per query
+        where: Chroma metadata filter; a dict (or None) for all queries or one per query
+    Returns:
+        One (context, citations) pair per query, in query order
+    """
+    try:
+        ks = [k or RETRIEVAL_RESULTS for k in _per_query(n_results, len(queries), "n_results")]
+        results = hybrid_search_batch(queries, n_results=[rerank_candidates(k) for k in ks], where=where)
+        results = rerank_results(queries, results, ks)
+    except Exception as e:
+        logger.exception(f"Failed batched hybrid retrieval of {len(queries)} queries: {e}")
+        return [("", []) for _ in queries]
+    logger.info("Batched hybrid search answered %d queries", len(queries))
+    return [format_context_with_citations(docs, metadatas, scores) for docs, metadatas, scores in results]
+
+
+def rerank_candidates(k: int) -> int:
+    """hybrid_search results to fetch for a query that should end up with k chunks."""
+    return max(k, RERANK_CANDIDATES) if RERANK else k
+
+
+def rerank_results(
+    queries: List[str],
+    results: List[Tuple[List[str], List[Dict], List[float]]],
+    ks: List[int]
+) -> List[Tuple[List[str], List[Dict], List[float]]]:
+    """
+    Keep the top k of each query's hybrid_search results: by cross-encoder score
+    with RERANK on (all queries scored in one batch), else in hybrid order.
+    """
+    reranker = get_reranker()
+    if reranker is not None:
+        try:
+            with span("retrieval.rerank"):
+                return reranker.rerank(queries, results, ks)
+        except Exception as e:
+            logger.exception(f"Reranking failed, using hybrid order: {e}")
+    return [(docs[:k], metadatas[:k], scores[:k]) for (docs, metadatas, scores), k in zip(results, ks)]
+
+
+def format_context_with_citations(
+    docs: List[str],
+    metadatas: List[Dict],
+    scores: List[float]
+) -> Tuple[str, List[Dict]]:
+    """
+    Number retrieved chunks as [Source N] and build matching citation dicts.
+    
+    Args:
+        docs: Chunk texts in rank order
+        metadatas: Metadata for each chunk
+        scores: Raw relevance score for each chunk
+    Returns:
+        (context, citations)
+    """
+    # Normalize scores (simple max normalization) for display if mixed scales appear later
+    max_score = max(scores) if scores else 1.0
+    norm_scores = [s / max_score if max_score else 0.0 for s in scores]
+
+    context_parts = []
+    citations: List[Dict] = []
+    for idx, (doc, meta, raw_score, norm_score) in enumerate(zip(docs, metadatas, scores, norm_scores), 1):
+        context_parts.append(f"[Source {idx}] {doc}")
+        citations.append({
+            "source_id": idx,
+            "topic": meta.get('topic', 'general'),
+            "domain": meta.get('domain', 'telecom'),
+            "relevance_score": round(norm_score, 4),
+            "raw_score": round(raw_score, 4),
+            "doc_id": meta.get('doc_id'),
+            "chunk_index": meta.get('chunk_index'),
+            "text_preview": (doc[:140] + "...") if len(doc) > 140 else doc
+        })
+
+    return "\n\n".join(context_parts), citations
+
+
 # --- Analytics Functions ---
+_analytics_lock = threading.Lock()
+
+
 def log_query(query: str, topics: List[str]) -> None:
     """
     Append a query and its topics to analytics.json with error handling.
@@ -292,26 +1052,28 @@ def log_query(query: str, topics: List[str]) -> None:
     """
     analytics_file = "analytics.json"
     try:
-        if os.path.exists(analytics_file):
-            with open(analytics_file, "r") as f:
-                analytics = json.load(f)
-        else:
-            analytics = {"queries": [], "topics": {}, "total_queries": 0}
+        # Serialize read-modify-write so concurrent requests don't drop entries
+        with span("analytics.write"), _analytics_lock:
+            if os.path.exists(analytics_file):
+                with open(analytics_file, "r") as f:
+                    analytics = json.load(f)
+            else:
+                analytics = {"queries": [], "topics": {}, "total_queries": 0}
 
-        # Add query
-        analytics["queries"].append({
-            "query": query,
-            "timestamp": datetime.now().isoformat(),
-            "topics": topics
-        })
-        # Update topic counts
-        for topic in topics:
-            analytics["topics"][topic] = analytics["topics"].get(topic, 0) + 1
-        analytics["total_queries"] = analytics.get("total_queries", 0) + 1
-
-        with open(analytics_file, "w") as f:
-            json.dump(analytics, f, indent=2)
-        logger.debug(f"Query logged to analytics: {query[:50]}...")
+            # Add query
+            analytics["queries"].append({
+                "query": query,
+                "timestamp": datetime.now().isoformat(),
+                "topics": topics
+            })
+            # Update topic counts
+            for topic in topics:
+                analytics["topics"][topic] = analytics["topics"].get(topic, 0) + 1
+            analytics["total_queries"] = analytics.get("total_queries", 0) + 1
+
+            with open(analytics_file, "w") as f:
+                json.dump(analytics, f, indent=2)
+        logger.debug("Query logged to analytics: %.50s...", query)
         
     except json.JSONDecodeError as e:
         logger.error(f"Failed to parse analytics file: {e}")
@@ -361,107 +1123,476 @@ def chunk_text(text: str, chunk_size: int = 500) -> List[str]:
     return chunks
 
 
-def add_knowledge_to_db(documents: List[str], metadata_list: List[Dict] = None):
+def add_knowledge_to_db(documents: List[str], metadata_list: List[Dict] = None, chunk_size: Optional[int] = None,
+                        progress: Optional[Callable[[int, int], None]] = None):
     """
     Add knowledge documents to the vector database.
-    
+
     Args:
         documents: List of text documents
         metadata_list: Optional list of metadata dicts for each document
+        chunk_size: Words per chunk (defaults to CHUNK_SIZE)
+        progress: Called as progress(chunks_embedded, total) before each batch of
+            INGEST_EMBED_BATCH chunks is embedded and once all are; it may block
+            (to yield to other work) or raise to abandon the load before anything is stored
     """
     all_chunks = []
     all_metadata = []
     all_ids = []
-    
+
     for idx, doc in enumerate(documents):
-        chunks = chunk_text(doc)
+        with span("ingest.chunk"):
+            chunks = chunk_text(doc, chunk_size or CHUNK_SIZE)
         for chunk_idx, chunk in enumerate(chunks):
             all_chunks.append(chunk)
             chunk_id = f"doc_{idx}_chunk_{chunk_idx}_{datetime.now().timestamp()}"
             all_ids.append(chunk_id)
             
-            # Add metadata
-            metadata = metadata_list[idx] if metadata_list else {}
+            # Add metadata (a copy per chunk, so each keeps its own chunk_index)
+            metadata = dict(metadata_list[idx]) if metadata_list else {}
             metadata['chunk_index'] = chunk_idx
             metadata['doc_id'] = idx
             all_metadata.append(metadata)
     
     # Add to collection
     if all_chunks:
-        collection.add(
-            documents=all_chunks,
-            metadatas=all_metadata,
-            ids=all_ids
-        )
+        with span("ingest.embed"):
+            if progress is None:
+                embeddings = embedding_function(all_chunks)
+            else:
+                embeddings = []
+                for start in range(0, len(all_chunks), INGEST_EMBED_BATCH):
+                    progress(start, len(all_chunks))
+                    embeddings.extend(embedding_function(all_chunks[start:start + INGEST_EMBED_BATCH]))
+                progress(len(all_chunks), len(all_chunks))
+        groups: Dict[Shard, List[int]] = {}
+        for i, metadata in enumerate(all_metadata):
+            groups.setdefault(shard_for(metadata), []).append(i)
+        replaced = dict(_replacing.get())
+        # New chunks and the chunks they replace (see sync_file) change in one step. Only the
+        # shards involved are locked, in name order so concurrent writers can't deadlock.
+        with span("ingest.store"), ExitStack() as locks:
+            for shard in sorted(groups.keys() | replaced.keys(), key=lambda shard: shard.name):
+                locks.enter_context(shard.lock.write())
+            for shard, members in groups.items():
+                shard.collection.add(
+                    documents=[all_chunks[i] for i in members],
+                    embeddings=[embeddings[i] for i in members],
+                    metadatas=[all_metadata[i] for i in members],
+                    ids=[all_ids[i] for i in members]
+                )
+                shard.invalidate()
+            for shard, stale_ids in replaced.items():
+                shard.collection.delete(ids=list(stale_ids))
+                shard.invalidate()
+        INGESTED_CHUNKS.inc(len(all_chunks))
         print(f"✓ Added {len(all_chunks)} chunks to knowledge base")
         return len(all_chunks)
     return 0
 
 
-def hybrid_search(query: str, n_results: int = 5) -> Tuple[List[str], List[Dict], List[float]]:
+_default_shard: Optional[Shard] = None
+# Chunk ids, per shard, that the chunks being added replace (set by sync_file)
+_replacing: contextvars.ContextVar[Tuple[Tuple[Shard, Tuple[str, ...]], ...]] = contextvars.ContextVar(
+    "replacing", default=())
+# What the already-indexed check matches: content from "any" path, from the "same" path (sync_file),
+# or nothing, when re-ingesting ("off")
+_dedup_scope: contextvars.ContextVar[str] = contextvars.ContextVar("dedup_scope", default="any")
+
+
+def _open_tenant(name: str) -> TenantKnowledgeBase:
+    """Open a tenant's collection (or shards), creating it on first use, with empty caches."""
+    base_name = tenant_collection_name(name)
+    compare_cache = TTLCache(COMPARE_CACHE_SIZE, COMPARE_CACHE_TTL, name=f"compare.{name}")
+    if SHARD_KEY:
+        tenant_shards = ShardSet(chroma_client, embedding_function, base_name, SHARD_KEY, pool=shard_pool)
+        return TenantKnowledgeBase(name, None, tenant_shards, compare_cache)
+    tenant_collection = chroma_client.get_or_create_collection(name=base_name, embedding_function=embedding_function)
+    return TenantKnowledgeBase(name, tenant_collection, None, compare_cache)
+
+
+def _forget_tenant(name: str) -> None:
+    """Drop a closed tenant's entries from the caches shared by all tenants (keyed by tenant first)."""
+    for cache in (_retrieval_cache, _answer_cache):
+        if cache is not None:
+            cache.discard_where(lambda key: key[0] == name)
+
+
+tenants = TenantRegistry(_open_tenant, TENANT_MAX_OPEN, on_close=_forget_tenant)
+
+
+def _tenant_kb() -> Optional[TenantKnowledgeBase]:
+    """Knowledge base of the current request's tenant (None = the shared one)."""
+    name = current_tenant()
+    return tenants.get(name) if name is not None else None
+
+
+def _active_shard_set() -> Optional[ShardSet]:
+    kb = _tenant_kb()
+    return kb.shard_set if kb is not None else shard_set
+
+
+def knowledge_shards() -> List[Shard]:
+    """Every shard of the current tenant's knowledge base; without SHARD_KEY, just its collection."""
+    global _default_shard
+    kb = _tenant_kb()
+    if kb is not None:
+        return kb.shards()
+    if shard_set is not None:
+        return shard_set.shards()
+    # Wrapped again if `collection` is swapped out (the benchmarks point it at scratch collections)
+    if _default_shard is None or _default_shard.collection is not collection:
+        _default_shard = Shard(collection.name, collection)
+    return [_default_shard]
+
+
+def shard_for(metadata: Dict) -> Shard:
+    """The shard a chunk with this metadata is stored in."""
+    shards = _active_shard_set()
+    if shards is None:
+        return knowledge_shards()[0]
+    return shards.shard(shards.value_of(metadata))
+
+
+def search_shards(where: Optional[Dict]) -> List[Shard]:
+    """Shards a query with this filter has to search; a filter on SHARD_KEY narrows them down."""
+    shards = _active_shard_set()
+    if shards is None:
+        return knowledge_shards()
+    values = shards.route(where)
+    if values is None:
+        return shards.shards()
+    return [shard for shard in (shards.shard(value, create=False) for value in values) if shard is not None]
+
+
+def kb_chunk_count() -> int:
+    """Chunks in the knowledge base, over all shards."""
+    return sum(shard.count() for shard in knowledge_shards())
+
+
+def shard_stats() -> Optional[Dict]:
+    """Shard key and chunks per shard (None when the knowledge base isn't sharded)."""
+    shards = _active_shard_set()
+    if shards is None:
+        return None
+    return {"key": SHARD_KEY, "chunks": shards.stats()}
+
+
+def document_registry() -> Dict[str, Dict]:
+    """Documents in the knowledge base keyed by file hash, with their chunk ids."""
+    registry: Dict[str, Dict] = {}
+    for shard in knowledge_shards():
+        registry.update(shard.lexical_index().registry())
+    return registry
+
+
+def restore_knowledge_snapshot(path: str) -> bool:
+    """
+    Load a prebuilt snapshot into the (empty) collection instead of ingesting from scratch.
+
+    When sharded, the chunks are distributed over the shards and each shard's
+    lexical index is built on first use.
+
+    Returns:
+        True if restored; False (logged) if the snapshot is missing, corrupt or
+        built with a different embedding model, so the caller can fall back to ingestion
+    """
+    try:
+        shards = _active_shard_set()
+        if shards is not None:
+            manifest, _ = restore_snapshot(path, shards, EMBEDDING_MODEL)
+        else:
+            shard = knowledge_shards()[0]
+            with shard.lock.write():
+                manifest, index = restore_snapshot(path, shard.collection, EMBEDDING_MODEL)
+                shard.adopt(index)
+    except (SnapshotError, OSError) as e:
+        logger.warning("Not restoring snapshot %s: %s", path, e)
+        return False
+    print(f"✓ Restored snapshot {manifest['snapshot_id']}: {manifest['chunks']} chunks "
+          f"from {manifest['documents']} documents")
+    return True
+
+
+def embed_queries(texts: List[str]):
+    """
+    Embed query texts.
+
+    With QUERY_BATCHING on, a few texts share a forward pass with concurrent
+    requests; a large batch is already one and is embedded directly.
+    """
+    if QUERY_BATCHING and len(texts) < QUERY_BATCH_SIZE:
+        return query_embedder(texts)
+    return embedding_function(texts)
+
+
+def _embed_queries_cached(texts: List[str]) -> list:
+    """embed_queries, reusing embeddings of texts seen before (QUERY_EMBEDDING_CACHE_SIZE)."""
+    if _query_embedding_cache is None:
+        return list(embed_queries(texts))
+    embeddings = [_query_embedding_cache.get(text) for text in texts]
+    missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+    if missing:
+        computed = dict(zip(missing, embed_queries(missing)))
+        for text, embedding in computed.items():
+            _query_embedding_cache.set(text, embedding)
+        embeddings = [computed[text] if embedding is None else embedding
+                      for text, embedding in zip(texts, embeddings)]
+    return embeddings
+
+
+def hybrid_search(
+    query: str,
+    n_results: int = 5,
+    semantic_weight: Optional[float] = None,
+    where: Optional[Dict] = None
+) -> Tuple[List[str], List[Dict], List[float]]:
     """
     Perform hybrid search combining semantic and keyword-based search.
-    
+
+    The two rankings are merged with weighted reciprocal-rank fusion, scaled so
+    a chunk ranked first by only one method scores that method's weight (0.7
+    semantic / 0.3 keyword by default) and chunks found by both rank higher.
+
     Args:
         query: User's question
         n_results: Number of results to retrieve
-        
+        semantic_weight: Share of the fused score given to semantic rank
+            (defaults to HYBRID_SEMANTIC_WEIGHT; 1.0 = semantic only, 0.0 = BM25 only)
+        where: Chroma metadata filter, e.g. {"domain": "telecom"} (None = all chunks)
+
     Returns:
         Tuple of (documents, metadata, scores)
     """
+    return hybrid_search_batch([query], n_results, semantic_weight, where)[0]
+
+
+def _per_query(value, count: int, name: str) -> list:
+    """Broadcast a single setting to every query, or check a per-query list has one per query."""
+    if isinstance(value, (list, tuple)):
+        if len(value) != count:
+            raise ValueError(f"{name} has {len(value)} entries for {count} queries")
+        return list(value)
+    return [value] * count
+
+
+def hybrid_search_batch(
+    queries: List[str],
+    n_results=5,
+    semantic_weight: Optional[float] = None,
+    where=None
+) -> List[Tuple[List[str], List[Dict], List[float]]]:
+    """
+    hybrid_search for many queries at once.
+
+    The queries are embedded in one pass, searched with one Chroma query per
+    distinct filter, and BM25-scored with one sparse matrix product, so the
+    fixed cost of a search is paid once per batch instead of once per query.
+    Each result is the same as hybrid_search would return for that query.
+
+    Args:
+        queries: Query texts
+        n_results: Results per query; an int for all queries or a list with one per query
+        semantic_weight: Share of the fused score given to semantic rank (as in hybrid_search)
+        where: Chroma metadata filter; a dict (or None) for all queries or a list with one per query
+
+    Returns:
+        One (documents, metadata, scores) tuple per query, in query order
+    """
+    if not queries:
+        return []
+    weight = HYBRID_SEMANTIC_WEIGHT if semantic_weight is None else semantic_weight
+    ks = _per_query(n_results, len(queries), "n_results")
+    wheres = _per_query(where, len(queries), "where")
+
     # Semantic search using ChromaDB
-    semantic_results = collection.query(
-        query_texts=[query],
-        n_results=n_results
-    )
-    
-    # Get all documents for BM25 keyword search
-    all_docs = collection.get()
-    
-    if all_docs['documents']:
-        # Tokenize documents for BM25
-        tokenized_docs = [doc.lower().split() for doc in all_docs['documents']]
-        bm25 = BM25Okapi(tokenized_docs)
-        
-        # Get BM25 scores
-        tokenized_query = query.lower().split()
-        bm25_scores = bm25.get_scores(tokenized_query)
-        
-        # Get top BM25 results
-        top_bm25_indices = sorted(range(len(bm25_scores)), key=lambda i: bm25_scores[i], reverse=True)[:n_results]
-        
-        # Combine results (semantic + keyword)
-        combined_docs = []
-        combined_metadata = []
-        combined_scores = []
-        
-        # Add semantic results
-        if semantic_results['documents'] and semantic_results['documents'][0]:
-            for doc, meta in zip(semantic_results['documents'][0], semantic_results['metadatas'][0]):
-                if doc not in combined_docs:
-                    combined_docs.append(doc)
-                    combined_metadata.append(meta)
-                    combined_scores.append(0.7)  # Default semantic score
-        
-        # Add top BM25 results
-        for idx in top_bm25_indices:
-            doc = all_docs['documents'][idx]
-            if doc not in combined_docs:
-                combined_docs.append(doc)
-                combined_metadata.append(all_docs['metadatas'][idx])
-                combined_scores.append(0.3)  # Default keyword score
-        
-        return combined_docs[:n_results], combined_metadata[:n_results], combined_scores[:n_results]
-    
-    # Fallback to semantic only
-    if semantic_results['documents'] and semantic_results['documents'][0]:
-        return (semantic_results['documents'][0], 
-                semantic_results['metadatas'][0], 
-                [1.0] * len(semantic_results['documents'][0]))
-    
-    return [], [], []
+    with span("retrieval.embed_query"):
+        query_embeddings = _embed_queries_cached(list(queries))
+    # Queries filtered on SHARD_KEY only go to the shards they can match
+    targets: Dict[Shard, List[int]] = {}
+    for i, filter_ in enumerate(wheres):
+        for shard in search_shards(filter_):
+            targets.setdefault(shard, []).append(i)
+    jobs = list(targets.items())
+    if len(jobs) > 1:
+        pool = _active_shard_set().pool
+        futures = [pool.submit(contextvars.copy_context().run, _search_shard, shard, members,
+                                         queries, query_embeddings, ks, wheres) for shard, members in jobs]
+        shard_results = [future.result() for future in futures]
+    else:
+        shard_results = [_search_shard(shard, members, queries, query_embeddings, ks, wheres)
+                         for shard, members in jobs]
+
+    # Merge the per-shard top-k lists: semantic hits by distance, keyword hits by BM25 score
+    semantic: List[List[Tuple[float, str, Dict]]] = [[] for _ in queries]
+    keyword: List[Optional[List[Tuple[float, str, Dict]]]] = [None] * len(queries)
+    for (_, members), (shard_semantic, shard_keyword) in zip(jobs, shard_results):
+        for i, hits in zip(members, shard_semantic):
+            semantic[i].extend(hits)
+        if shard_keyword is not None:
+            for i, hits in zip(members, shard_keyword):
+                keyword[i] = (keyword[i] or []) + hits
+    semantic = [sorted(hits, key=lambda hit: hit[0])[:k] for hits, k in zip(semantic, ks)]
+
+    if all(hits is None for hits in keyword):
+        # Fallback to semantic only
+        return [([doc for _, doc, _ in hits], [meta for _, _, meta in hits], [1.0] * len(hits))
+                for hits in semantic]
+
+    fused_results = []
+    for semantic_hits, keyword_hits, k in zip(semantic, keyword, ks):
+        # Fuse the two rankings, keyed by document text (the same chunk can come back from both)
+        fused: Dict[str, List] = {}
+        for rank, (_, doc, meta) in enumerate(semantic_hits, 1):
+            entry = fused.setdefault(doc, [meta, 0.0])
+            entry[1] += weight * (RRF_K + 1) / (RRF_K + rank)
+
+        for rank, (_, doc, meta) in enumerate(sorted(keyword_hits or [], key=lambda hit: -hit[0])[:k], 1):
+            entry = fused.setdefault(doc, [meta, 0.0])
+            entry[1] += (1 - weight) * (RRF_K + 1) / (RRF_K + rank)
+
+        ranked = sorted(fused.items(), key=lambda item: item[1][1], reverse=True)[:k]
+        fused_results.append(([doc for doc, _ in ranked],
+                              [meta for _, (meta, _) in ranked],
+                              [score for _, (_, score) in ranked]))
+    return fused_results
+
+
+def _search_shard(
+    shard: Shard,
+    members: List[int],
+    queries: List[str],
+    query_embeddings: list,
+    ks: List[int],
+    wheres: List[Optional[Dict]]
+) -> Tuple[List[List[Tuple[float, str, Dict]]], Optional[List[List[Tuple[float, str, Dict]]]]]:
+    """
+    Semantic and BM25 top-k in one shard for the queries at positions `members`.
+
+    Returns:
+        (semantic hits, keyword hits) per member as (distance or score, document, metadata);
+        keyword hits are None if the shard is empty
+    """
+    groups: Dict[str, List[int]] = {}
+    for i in members:
+        groups.setdefault(json.dumps(wheres[i] or None, sort_keys=True, default=str), []).append(i)
+    semantic: Dict[int, List[Tuple[float, str, Dict]]] = {}
+    # Both rankings come from the same index state, even while the watcher applies an update
+    with shard.lock.read():
+        with span("retrieval.chroma_query"):
+            for group in groups.values():
+                results = shard.collection.query(
+                    query_embeddings=[query_embeddings[i] for i in group],
+                    n_results=max(ks[i] for i in group),
+                    where=wheres[group[0]] or None,
+                    include=["documents", "metadatas", "distances"]
+                )
+                for row, i in enumerate(group):
+                    docs = (results['documents'] or [[]] * len(group))[row] or []
+                    metas = (results['metadatas'] or [[]] * len(group))[row] or []
+                    distances = (results['distances'] or [[]] * len(group))[row] or []
+                    semantic[i] = list(zip(distances, docs, metas))[:ks[i]]
+
+        # BM25 keyword search over the shard's cached lexical index
+        index = shard.lexical_index()
+        keyword = None
+        if index.documents:
+            top = index.top_many([queries[i] for i in members], [ks[i] for i in members],
+                                 [wheres[i] for i in members], with_scores=True)
+            keyword = [[(score, index.documents[pos], index.metadatas[pos]) for pos, score in hits] for hits in top]
+    return [semantic[i] for i in members], keyword
+
+
+def is_already_indexed(path: str) -> bool:
+    """
+    Whether a file with exactly this content is already in the knowledge base.
 
+    Inside sync_file only chunks loaded from the same path count, so a file
+    renamed over another, or edited to match one, is still (re)ingested; when
+    re-ingesting nothing does.
+    """
+    scope = _dedup_scope.get()
+    if scope == "off":
+        return False
+    try:
+        file_hash = file_sha256(path)
+    except OSError:
+        return False
+    return is_hash_indexed(file_hash, source_key(path) if scope == "same" else None)
+
+
+def is_hash_indexed(file_hash: str, source_path: Optional[str] = None) -> bool:
+    """Whether a document with this content hash (SHA-256), optionally from source_path, is already indexed."""
+    return any(shard.has_file_hash(file_hash, source_path) for shard in knowledge_shards())
 
+
+def extract_document_pages(path: str) -> List[str]:
+    """
+    Page texts of a PDF or Word file.
+
+    Text extracted from the same bytes before (by the same extractor version)
+    comes from the extraction cache, without reading or parsing the file again.
+    """
+    kind = os.path.splitext(path)[1].lower().lstrip(".")
+    if extraction_cache is None:
+        with open(path, 'rb') as f:
+            return list(extract_pages(f.read(), kind))
+    file_hash, extractor = file_sha256(path), extractor_version(kind)
+    pages = extraction_cache.get(file_hash, extractor)
+    if pages is None:
+        with span("ingest.parse"), open(path, 'rb') as f:
+            pages = list(extract_pages(f.read(), kind))
+        extraction_cache.put(file_hash, extractor, os.path.basename(path), kind, pages)
+    return pages
+
+
+def show_extraction_cache(limit: int = 20):
+    """Print the extraction cache's size and the documents whose text it holds."""
+    if extraction_cache is None:
+        print("\nℹ️  Extraction cache is off. Set EXTRACTION_CACHE_DB to keep extracted PDF/Word text between runs.")
+        return
+    stats = extraction_cache.stats()
+    print(f"\n🗃️  Extraction cache ({EXTRACTION_CACHE_DB}): {stats['documents']} documents, {stats['pages']} pages, "
+          f"{stats['stored_mb']} MB stored ({stats['text_mb']} MB of text), limit {stats['max_mb']:g} MB")
+    print(f"   This run: {stats['hits']} hits, {stats['misses']} misses")
+    for entry in extraction_cache.documents(limit):
+        print(f"   {entry['pages']:>5} pages  {entry['hits']:>4} hits  {entry['last_used'][:16]}  "
+              f"{entry['name']}  [{entry['extractor']}, {entry['file_hash'][:12]}]")
+
+
+def _skip_indexed(fn):
+    """
+    Skip an upload_* call (returning 0) when the file's content is already indexed.
+
+    Restarts and repeated directory loads then don't duplicate chunks. Skips
+    are logged and counted by file type, but not traced as ingests.
+    """
+    @functools.wraps(fn)
+    def wrapper(path: str, *args, **kwargs):
+        if is_already_indexed(path):
+            print(f"↷ Already indexed, skipping: {os.path.basename(path)}")
+            INGEST_SKIPPED_DOCUMENTS.labels(type=os.path.splitext(path)[1].lower().lstrip(".")).inc()
+            return 0
+        return fn(path, *args, **kwargs)
+    return wrapper
+
+
+def _ingest_trace(fn):
+    """Trace an upload_* function as an "ingest" request keyed by the file it loads."""
+    @functools.wraps(fn)
+    def wrapper(path: str, *args, **kwargs):
+        with request_trace("ingest", profile_threshold=TRACE_PROFILE_THRESHOLD, profile_dir=PROFILE_DIR,
+                           source=os.path.basename(path)) as trace:
+            chunks = fn(path, *args, **kwargs)
+            trace.annotate(chunks=chunks, outcome="ok" if chunks else "error")
+        if chunks:
+            INGESTED_DOCUMENTS.labels(type=os.path.splitext(path)[1].lower().lstrip(".")).inc()
+        return chunks
+    return wrapper
+
+
+@_skip_indexed
+@_ingest_trace
 def upload_pdf_to_knowledge_base(pdf_path: str, topic: str = "uploaded", domain: str = "telecom") -> int:
     """
     Upload a PDF document to the knowledge base.
@@ -475,25 +1606,25 @@ def upload_pdf_to_knowledge_base(pdf_path: str, topic: str = "uploaded", domain:
         Number of chunks added
     """
     try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            
-            if text.strip():
-                metadata = [{"topic": topic, "domain": domain, "source": os.path.basename(pdf_path)}]
-                chunks_added = add_knowledge_to_db([text], metadata)
-                print(f"✓ Successfully added PDF: {os.path.basename(pdf_path)}")
-                return chunks_added
-            else:
-                print(f"✗ No text found in PDF: {os.path.basename(pdf_path)}")
-                return 0
+        with span("ingest.extract"):
+            text = "\n".join(extract_document_pages(pdf_path))
+        
+        if text.strip():
+            metadata = [{"topic": topic, "domain": domain, "source": os.path.basename(pdf_path),
+                         "source_path": source_key(pdf_path), "file_hash": file_sha256(pdf_path)}]
+            chunks_added = add_knowledge_to_db([text], metadata)
+            print(f"✓ Successfully added PDF: {os.path.basename(pdf_path)}")
+            return chunks_added
+        else:
+            print(f"✗ No text found in PDF: {os.path.basename(pdf_path)}")
+            return 0
     except Exception as e:
         print(f"✗ Error uploading PDF: {e}")
         return 0
 
 
+@_skip_indexed
+@_ingest_trace
 def upload_word_doc_to_knowledge_base(doc_path: str, topic: str = "uploaded", domain: str = "telecom") -> int:
     """
     Upload a Word document (.docx) to the knowledge base.
@@ -507,11 +1638,12 @@ def upload_word_doc_to_knowledge_base(doc_path: str, topic: str = "uploaded", do
         Number of chunks added
     """
     try:
-        doc = docx.Document(doc_path)
-        text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
+        with span("ingest.extract"):
+            text = "\n".join(extract_document_pages(doc_path))
         
         if text.strip():
-            metadata = [{"topic": topic, "domain": domain, "source": os.path.basename(doc_path)}]
+            metadata = [{"topic": topic, "domain": domain, "source": os.path.basename(doc_path),
+                         "source_path": source_key(doc_path), "file_hash": file_sha256(doc_path)}]
             chunks_added = add_knowledge_to_db([text], metadata)
             print(f"✓ Successfully added Word document: {os.path.basename(doc_path)}")
             return chunks_added
@@ -523,6 +1655,46 @@ def upload_word_doc_to_knowledge_base(doc_path: str, topic: str = "uploaded", do
         return 0
 
 
+def _parse_front_matter(text: str) -> Tuple[Dict, str]:
+    """Simple YAML-like front matter parser for .md/.txt files."""
+    if text.startswith("---"):
+        try:
+            end = text.find("\n---", 3)
+            if end != -1:
+                raw_yaml = text[3:end].strip()
+                body = text[end+4:]
+                meta = {}
+                for line in raw_yaml.splitlines():
+                    if ':' in line:
+                        k, v = line.split(':', 1)
+                        meta[k.strip()] = v.strip()
+                return meta, body
+        except Exception:
+            pass
+    return {}, text
+
+
+def _text_file_metadata(front_meta: Dict, topic: str, domain: str, source: str, source_path: str,
+                        file_hash: str) -> Dict:
+    """Chunk metadata of a text file: front matter overrides the provided topic/domain."""
+    final_meta = {
+        "topic": front_meta.get("topic", topic),
+        "domain": front_meta.get("domain", domain),
+        "priority": front_meta.get("priority", "medium"),
+        "source": front_meta.get("source", source),
+        "source_type": front_meta.get("source_type", "external"),
+        "source_path": source_path,
+        "file_hash": file_hash
+    }
+    # Include any additional front matter keys
+    for k, v in front_meta.items():
+        if k not in final_meta:
+            final_meta[k] = v
+    return final_meta
+
+
+@_skip_indexed
+@_ingest_trace
 def upload_text_file_to_knowledge_base(file_path: str, topic: str = "uploaded", domain: str = "telecom") -> int:
     """
     Upload a text file (.txt, .md) to the knowledge base.
@@ -535,41 +1707,14 @@ def upload_text_file_to_knowledge_base(file_path: str, topic: str = "uploaded",
     Returns:
         Number of chunks added
     """
-    def _parse_front_matter(text: str) -> Tuple[Dict, str]:
-        """Simple YAML-like front matter parser for .md/.txt files."""
-        if text.startswith("---"):
-            try:
-                end = text.find("\n---", 3)
-                if end != -1:
-                    raw_yaml = text[3:end].strip()
-                    body = text[end+4:]
-                    meta = {}
-                    for line in raw_yaml.splitlines():
-                        if ':' in line:
-                            k, v = line.split(':', 1)
-                            meta[k.strip()] = v.strip()
-                    return meta, body
-            except Exception:
-                pass
-        return {}, text
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
+        with span("ingest.extract"), open(file_path, 'r', encoding='utf-8') as f:
             raw = f.read()
         front_meta, body = _parse_front_matter(raw)
         text = body
         if text.strip():
-            # Merge provided topic/domain only if not overridden in front matter
-            final_meta = {
-                "topic": front_meta.get("topic", topic),
-                "domain": front_meta.get("domain", domain),
-                "priority": front_meta.get("priority", "medium"),
-                "source": front_meta.get("source", os.path.basename(file_path)),
-                "source_type": front_meta.get("source_type", "external")
-            }
-            # Include any additional front matter keys
-            for k, v in front_meta.items():
-                if k not in final_meta:
-                    final_meta[k] = v
+            final_meta = _text_file_metadata(front_meta, topic, domain, os.path.basename(file_path),
+                                             source_key(file_path), file_sha256(file_path))
             chunks_added = add_knowledge_to_db([text], [final_meta])
             print(f"✓ Successfully added text file: {os.path.basename(file_path)} (topic={final_meta['topic']}, domain={final_meta['domain']})")
             return chunks_added
@@ -581,6 +1726,26 @@ def upload_text_file_to_knowledge_base(file_path: str, topic: str = "uploaded",
         return 0
 
 
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt', '.md')
+
+
+def upload_file(file_path: str, topic: str = "uploaded", domain: str = "telecom") -> int:
+    """
+    Upload one PDF, Word or text file, picking the loader by extension.
+
+    Returns:
+        Number of chunks added (0 for unsupported file types)
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.pdf':
+        return upload_pdf_to_knowledge_base(file_path, topic, domain)
+    if ext == '.docx':
+        return upload_word_doc_to_knowledge_base(file_path, topic, domain)
+    if ext in {'.txt', '.md'}:
+        return upload_text_file_to_knowledge_base(file_path, topic, domain)
+    return 0
+
+
 def upload_multiple_files(file_paths: List[str], topic: str = "batch", domain: str = "telecom") -> int:
     """
     Upload multiple files at once to the knowledge base.
@@ -595,20 +1760,13 @@ def upload_multiple_files(file_paths: List[str], topic: str = "batch", domain: s
         Total number of chunks added
     """
     total_chunks = 0
-    supported_extensions = {'.pdf', '.docx', '.txt', '.md'}
     
     for file_path in file_paths:
-        ext = os.path.splitext(file_path)[1].lower()
-        
-        if ext == '.pdf':
-            total_chunks += upload_pdf_to_knowledge_base(file_path, topic, domain)
-        elif ext == '.docx':
-            total_chunks += upload_word_doc_to_knowledge_base(file_path, topic, domain)
-        elif ext in {'.txt', '.md'}:
-            total_chunks += upload_text_file_to_knowledge_base(file_path, topic, domain)
+        if os.path.splitext(file_path)[1].lower() in SUPPORTED_EXTENSIONS:
+            total_chunks += upload_file(file_path, topic, domain)
         else:
             print(f"⚠ Skipping unsupported file type: {file_path}")
-            print(f"  Supported: {', '.join(supported_extensions)}")
+            print(f"  Supported: {', '.join(SUPPORTED_EXTENSIONS)}")
     
     print(f"\n✓ Batch upload complete: {total_chunks} total chunks added from {len(file_paths)} files")
     return total_chunks
@@ -628,18 +1786,17 @@ def upload_directory(directory_path: str, topic: str = "batch", domain: str = "t
     Returns:
         Total number of chunks added
     """
-    supported_extensions = {'.pdf', '.docx', '.txt', '.md'}
     file_paths = []
     
     if recursive:
         for root, dirs, files in os.walk(directory_path):
             for file in files:
-                if os.path.splitext(file)[1].lower() in supported_extensions:
+                if os.path.splitext(file)[1].lower() in SUPPORTED_EXTENSIONS:
                     file_paths.append(os.path.join(root, file))
     else:
         for file in os.listdir(directory_path):
             file_path = os.path.join(directory_path, file)
-            if os.path.isfile(file_path) and os.path.splitext(file)[1].lower() in supported_extensions:
+            if os.path.isfile(file_path) and os.path.splitext(file)[1].lower() in SUPPORTED_EXTENSIONS:
                 file_paths.append(file_path)
     
     if file_paths:
@@ -650,10 +1807,352 @@ def upload_directory(directory_path: str, topic: str = "batch", domain: str = "t
         return 0
 
 
+def _upload_document(name: str, kind: str, pages: List[str], topic: str, domain: str,
+                     file_hash: str) -> Tuple[str, Dict]:
+    """Text and metadata of an upload from its extracted pages."""
+    text = "\n".join(pages)
+    source_path = f"upload:{name}"  # never collides with a watched file's path
+    if kind in ("txt", "md"):
+        front_meta, text = _parse_front_matter(text)
+        return text, _text_file_metadata(front_meta, topic, domain, name, source_path, file_hash)
+    return text, {"topic": topic, "domain": domain, "source": name, "source_path": source_path,
+                  "file_hash": file_hash}
+
+
+def _ingest_upload(job: Job, pages: List[str]) -> int:
+    """Chunk, embed and store an upload's extracted pages (runs on an ingestion job thread)."""
+    params = job.params
+    with request_trace("ingest", profile_threshold=TRACE_PROFILE_THRESHOLD, profile_dir=PROFILE_DIR,
+                       source=job.name, job=job.id) as trace:
+        text, metadata = _upload_document(job.name, job.kind, pages, params["topic"], params["domain"],
+                                          params["file_hash"])
+        if not text.strip():
+            raise ValueError(f"No text found in {job.name}")
+
+        def _progress(done: int, total: int) -> None:
+            job.chunks_done, job.chunks_total = done, total
+            job.stage = "storing" if done == total else "embedding"
+            job.check_cancelled()
+            if done < total:
+                interactive_priority.wait_for_idle()
+
+        job.stage = "embedding"
+        chunks = add_knowledge_to_db([text], [metadata], progress=_progress)
+        trace.annotate(chunks=chunks, outcome="ok" if chunks else "error")
+    INGESTED_DOCUMENTS.labels(type=job.kind).inc()
+    return chunks
+
+
+# Chat turns and comparisons take priority over background ingestion
+interactive_priority = InteractivePriority(max_wait=INGEST_YIELD_MAX_WAIT)
+add_trace_hook(interactive_priority.hook)
+ingestion_jobs = IngestionJobQueue(_ingest_upload, workers=INGEST_JOB_WORKERS, cache=extraction_cache)
+
+
+def submit_upload(name: str, data: bytes, topic: str = "uploaded", domain: str = "telecom") -> Optional[str]:
+    """
+    Queue an uploaded file (held in memory) for background ingestion into the current tenant.
+
+    Returns:
+        Job ID to follow with ingestion_jobs.get(); None if the same content is already indexed
+    """
+    kind = os.path.splitext(name)[1].lower()
+    if kind not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Unsupported file type {kind or name}; supported: {', '.join(SUPPORTED_EXTENSIONS)}")
+    file_hash = hashlib.sha256(data).hexdigest()
+    if is_hash_indexed(file_hash):
+        return None
+    return ingestion_jobs.submit(os.path.basename(name), data, context=contextvars.copy_context(),
+                                 owner=current_tenant(), topic=topic, domain=domain, file_hash=file_hash)
+
+
+def _chunks_from(path: str) -> List[Tuple[Shard, Tuple[str, ...]]]:
+    """Ids of the chunks loaded from path, per shard."""
+    stale = []
+    for shard in knowledge_shards():
+        ids = shard.lexical_index().chunk_ids_for_path(path)
+        if ids:
+            stale.append((shard, tuple(ids)))
+    return stale
+
+
+def sync_file(file_path: str, topic: Optional[str] = None, domain: str = "telecom", reingest: bool = False) -> int:
+    """
+    Bring the knowledge base in line with one file: ingest it if it is new,
+    replace its chunks if it changed, and drop them if it was removed.
+
+    Extraction and embedding happen before the index lock is taken; adding the
+    new chunks and deleting the old ones is then a single write under the lock
+    of each shard involved,
+    so a query sees either the old or the new version of the document, never
+    both or neither. Unchanged files (same content hash at the same path) are
+    left alone; content that is indexed under another path (a rename, or a
+    copy) is ingested for this one too.
+
+    Args:
+        file_path: File that was added, modified or removed
+        topic: Topic tag (defaults to the file name without extension, like the seed loader)
+        domain: Domain tag
+        reingest: Replace the file's chunks even if it is unchanged (e.g. after a CHUNK_SIZE change)
+
+    Returns:
+        Number of chunks added (0 for removals and unchanged files)
+    """
+    stale = _chunks_from(file_path)
+    stale_count = sum(len(ids) for _, ids in stale)
+    if not os.path.exists(file_path):
+        for shard, ids in stale:
+            with shard.lock.write():
+                shard.collection.delete(ids=list(ids))
+                shard.invalidate()
+        if stale:
+            print(f"✓ Removed {stale_count} chunks of deleted file: {os.path.basename(file_path)}")
+        return 0
+
+    token, scope_token = _replacing.set(tuple(stale)), _dedup_scope.set("off" if reingest else "same")
+    try:
+        chunks = upload_file(file_path, topic or os.path.splitext(os.path.basename(file_path))[0], domain)
+    finally:
+        _dedup_scope.reset(scope_token)
+        _replacing.reset(token)
+    if chunks and stale:
+        print(f"✓ Replaced {stale_count} chunks of {'re-ingested' if reingest else 'modified'} file: "
+              f"{os.path.basename(file_path)}")
+    return chunks
+
+
+def _reingest_upload(meta: Dict) -> Optional[int]:
+    """Replace an upload's chunks from its cached text; None if the text isn't in the extraction cache."""
+    name = meta["source"]
+    kind = os.path.splitext(name)[1].lower().lstrip(".")
+    pages = extraction_cache.get(meta["file_hash"], extractor_version(kind)) if extraction_cache else None
+    if not pages:
+        return None
+    text, metadata = _upload_document(name, kind, pages, meta.get("topic", "uploaded"),
+                                      meta.get("domain", "telecom"), meta["file_hash"])
+    token = _replacing.set(tuple(_chunks_from(meta["source_path"])))
+    try:
+        return add_knowledge_to_db([text], [metadata])
+    finally:
+        _replacing.reset(token)
+
+
+def reingest_knowledge_base() -> Dict:
+    """
+    Re-chunk and re-embed every document of the current knowledge base, e.g.
+    after changing CHUNK_SIZE or EMBEDDING_MODEL.
+
+    Each document's new chunks replace its old ones in one write (as in
+    sync_file), keeping its topic and domain. Files are read from their
+    source path, with PDF and Word text from the extraction cache; uploads
+    are rebuilt from the extraction cache alone. Documents that can be
+    rebuilt from neither (removed files, plain-text uploads, which aren't
+    cached, and text added without a file) keep their chunks and are
+    reported as skipped.
+
+    Returns:
+        {"documents": re-ingested, "chunks": chunks added, "skipped": [source names]}
+    """
+    by_path: Dict[str, Dict] = {}
+    for shard in knowledge_shards():
+        for meta in shard.lexical_index().metadatas:
+            by_path.setdefault(meta.get("source_path") or f"source:{meta.get('source', 'unknown')}", meta)
+    documents, chunks, skipped = 0, 0, []
+    for meta in by_path.values():
+        path = meta.get("source_path")
+        added = None
+        if path and meta.get("file_hash"):
+            if path.startswith("upload:"):
+                added = _reingest_upload(meta)
+            elif os.path.exists(path):
+                added = sync_file(path, meta.get("topic"), meta.get("domain", "telecom"), reingest=True)
+        if added:
+            documents += 1
+            chunks += added
+        else:
+            skipped.append(meta.get("source", "unknown"))
+    return {"documents": documents, "chunks": chunks, "skipped": skipped}
+
+
+def watch_roots() -> List[WatchRoot]:
+    """The seed directory and the enabled sources in knowledge_sources.json, as initialize_knowledge_base loads them."""
+    # Seed files take their topic from the file name and aren't searched recursively
+    roots = [WatchRoot(os.getenv('KNOWLEDGE_DIR', 'knowledge_base'), None, "architecture", recursive=False)]
+    try:
+        with open("knowledge_sources.json", 'r') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        config = {}
+    for source in config.get('local_files', []):
+        if source.get('enabled', False):
+            roots.append(WatchRoot(source['path'], source.get('topic', 'document'), source.get('domain', 'telecom')))
+    for source in config.get('directories', []):
+        if source.get('enabled', False):
+            roots.append(WatchRoot(source['path'], source.get('topic', 'directory'), source.get('domain', 'telecom'),
+                                   recursive=source.get('recursive', True)))
+    return roots
+
+
+_watcher: Optional[KnowledgeBaseWatcher] = None
+_watcher_lock = threading.Lock()
+
+
+def start_knowledge_watcher() -> Optional[KnowledgeBaseWatcher]:
+    """
+    Start syncing changed knowledge files in the background (once per process).
+
+    No-op unless WATCH_KNOWLEDGE_BASE=true. Call after initialize_knowledge_base().
+    """
+    global _watcher
+    if not WATCH_KNOWLEDGE_BASE:
+        return None
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = KnowledgeBaseWatcher(
+                watch_roots(),
+                lambda path, root: sync_file(path, root.topic, root.domain),
+                SUPPORTED_EXTENSIONS,
+                debounce=WATCH_DEBOUNCE,
+                poll_interval=WATCH_POLL_INTERVAL,
+                backend=WATCH_BACKEND,
+            ).start()
+    return _watcher
+
+
+_warmer: Optional[CacheWarmer] = None
+_warmer_lock = threading.Lock()
+
+
+def _warm_retrieval(prompt: str) -> None:
+    retrieve_for_prompt(prompt)
+
+
+def _is_retrieval_warm(prompt: str) -> bool:
+    return _retrieval_cache is not None and _retrieval_key(prompt) in _retrieval_cache
+
+
+def _pregenerate_answer(prompt: str) -> bool:
+    """Answer a past question the way a first-turn chat would and cache it; False if already cached."""
+    with deadline_scope(REQUEST_DEADLINE):
+        full_prompt, context, _ = build_advice_prompt(prompt)
+        key = _generation_key(prompt, context, None)
+        if key in _answer_cache:
+            return False
+        answer = extract_answer_text(call_gemini_api(full_prompt))
+    if _answer_outcome(answer) == "ok":
+        _answer_cache.set(key, answer)
+    return True
+
+
+def start_cache_warmup() -> Optional[CacheWarmer]:
+    """
+    Prefetch caches for the most frequent questions in analytics.json (once per process).
+
+    Retrieval results (and their query embeddings) for the top WARMUP_QUERIES
+    questions are filled on a background thread, then up to WARMUP_ANSWERS
+    answers when the answer cache is on. Questions are warmed for the shared
+    knowledge base; analytics doesn't record tenants. Returns None when there
+    is nothing to warm; see CacheWarmer.wait_ready for readiness.
+    """
+    global _warmer
+    if WARMUP_QUERIES <= 0 or _retrieval_cache is None:
+        return None
+    with _warmer_lock:
+        if _warmer is None:
+            queries, history_total = top_queries(load_analytics(), WARMUP_QUERIES, normalize_prompt)
+            _warmer = CacheWarmer(
+                queries,
+                history_total,
+                _warm_retrieval,
+                _is_retrieval_warm,
+                generate=_pregenerate_answer if _answer_cache is not None else None,
+                answer_budget=WARMUP_ANSWERS,
+                answer_interval=WARMUP_ANSWER_INTERVAL,
+                target_hit_rate=WARMUP_TARGET_HIT_RATE,
+                max_wait=WARMUP_MAX_WAIT or None,
+            ).start()
+            logger.info("Warming caches for %d frequent questions", len(queries))
+    return _warmer
+
+
+def warmup_stats() -> Optional[Dict]:
+    """Progress and projected hit rate of the startup cache warm-up (None if it isn't running)."""
+    return _warmer.stats() if _warmer else None
+
+
+def watcher_stats() -> Optional[Dict]:
+    """Backend, queue and sync counts of the knowledge-base watcher (None if it isn't running)."""
+    return _watcher.stats() if _watcher else None
+
+
+def _compare_key(arch1: str, arch2: str, context: str) -> Tuple[Optional[str], str, str, str]:
+    """Cache key for a comparison in the current tenant; the two architectures may be given in either order."""
+    first, second = sorted([normalize_prompt(arch1), normalize_prompt(arch2)])
+    return current_tenant(), first, second, normalize_prompt(context)
+
+
+def _compare_cache_for_tenant() -> TTLCache:
+    """Comparison cache of the current tenant."""
+    kb = _tenant_kb()
+    return kb.compare_cache if kb is not None else _compare_cache
+
+
+def retrieve_comparison_context(
+    arch1: str,
+    arch2: str,
+    context: str,
+    n_results: int = COMPARE_RESULTS_PER_QUERY
+) -> Tuple[str, List[Dict]]:
+    """
+    Retrieve balanced context for a comparison.
+    
+    Runs hybrid searches for each architecture and for the pair in the given
+    context as one batch, then interleaves and dedupes the results so both
+    sides are represented in the prompt.
+    
+    Args:
+        arch1: First architecture
+        arch2: Second architecture
+        context: Context for comparison
+        n_results: Chunks retrieved per query
+    Returns:
+        (context_text, citations)
+    """
+    queries = [
+        f"{arch1} architecture for {context}",
+        f"{arch2} architecture for {context}",
+        f"{arch1} vs {arch2} trade-offs in {context}",
+    ]
+    try:
+        results = hybrid_search_batch(queries, rerank_candidates(n_results))
+        results = rerank_results(queries, results, [n_results] * len(queries))
+    except Exception as e:
+        logger.exception(f"Comparison retrieval failed for '{arch1}' vs '{arch2}': {e}")
+        results = [([], [], [])] * len(queries)
+
+    # Round-robin merge: best chunk for arch1, arch2 and the pair, then the next best, ...
+    docs, metadatas, scores = [], [], []
+    seen = set()
+    for rank in range(n_results):
+        for result_docs, result_metas, result_scores in results:
+            if rank < len(result_docs) and result_docs[rank] not in seen:
+                seen.add(result_docs[rank])
+                docs.append(result_docs[rank])
+                metadatas.append(result_metas[rank])
+                scores.append(result_scores[rank])
+    docs, metadatas, scores = docs[:COMPARE_CONTEXT_CHUNKS], metadatas[:COMPARE_CONTEXT_CHUNKS], scores[:COMPARE_CONTEXT_CHUNKS]
+    return format_context_with_citations(docs, metadatas, scores)
+
+
 def compare_architectures(arch1: str, arch2: str, context: Optional[str] = "telecom systems") -> str:
     """
     Generate a detailed side-by-side comparison of two architectures.
     
+    Context for both architectures is retrieved concurrently and sent to
+    Gemini in a single call. Successful comparisons are cached by the
+    normalized (arch1, arch2, context) in either order, and identical
+    comparisons requested concurrently share one Gemini call.
+    
     Args:
         arch1: First architecture
         arch2: Second architecture
@@ -662,7 +2161,29 @@ def compare_architectures(arch1: str, arch2: str, context: Optional[str] = "tele
     Returns:
         Formatted comparison
     """
-    query = f"""Create a detailed side-by-side comparison table of {arch1} vs {arch2} for {context}.
+    # Ensure context is set
+    if not context:
+        context = "telecom systems"
+
+    with request_trace("compare", profile_threshold=TRACE_PROFILE_THRESHOLD, profile_dir=PROFILE_DIR,
+                       query=f"{arch1} vs {arch2}") as trace:
+        key = _compare_key(arch1, arch2, context)
+        cached = _compare_cache_for_tenant().get(key)
+        if cached is not None:
+            logger.info("Comparison cache hit: %s vs %s", arch1, arch2)
+            answer, topics = cached
+            log_query(f"Compare {arch1} vs {arch2} for {context}", topics)
+        else:
+            answer = _compare_flight.do(key, lambda: _generate_comparison(arch1, arch2, context, key))
+        trace.annotate(outcome="cached" if cached is not None else _answer_outcome(answer))
+    return answer
+
+
+def _generate_comparison(arch1: str, arch2: str, context: str, key: Tuple[Optional[str], str, str, str]) -> str:
+    """Retrieve balanced context, call Gemini once and cache a successful comparison."""
+    with deadline_scope(REQUEST_DEADLINE):
+        kb_context, citations = retrieve_comparison_context(arch1, arch2, context)
+        query = f"""Create a detailed side-by-side comparison table of {arch1} vs {arch2} for {context}.
 
 Include the following aspects:
 1. Scalability
@@ -675,13 +2196,33 @@ Include the following aspects:
 8. Limitations
 
 Format as a clear comparison table."""
-    
-    # Ensure context is set
-    if not context:
-        context = "telecom systems"
+        if kb_context:
+            full_prompt = f"""You are an expert telecom architect. Use the following knowledge base context to answer accurately.
 
-    response, _, _ = get_architecture_advice_with_rag(query, use_rag=True)
-    return response
+CONTEXT FROM KNOWLEDGE BASE:
+{kb_context}
+
+{query}
+
+Reference sources using [Source N] notation when applicable."""
+        else:
+            full_prompt = f"You are an expert telecom architect.\n\n{query}"
+
+        topics = [c['topic'] for c in citations]
+        try:
+            logger.info("Generating comparison: %s vs %s for %s", arch1, arch2, context)
+            with deadline_scope(_generation_budget(kb_context)):
+                answer = extract_answer_text(call_gemini_api(full_prompt))
+        except Exception as e:
+            answer = _degraded_answer(query, kb_context, e)
+            if answer is None:
+                return _describe_request_error(e)
+        else:
+            if not answer.startswith("Error:"):
+                _compare_cache_for_tenant().set(key, (answer, topics))
+
+    log_query(f"Compare {arch1} vs {arch2} for {context}", topics)
+    return answer
 
 
 def export_to_markdown(conversation: List[Dict], filename: str = None):
@@ -783,8 +2324,77 @@ def show_analytics():
     print("\n" + "="*70 + "\n")
 
 
+def show_memory_report():
+    """Print memory diagnostics and write the full report to a JSON file."""
+    report = memory_diagnostics.report()
+    print("\n" + "="*70)
+    print("🧠 MEMORY DIAGNOSTICS")
+    print("="*70)
+    print(f"\nRSS: {report['rss_mb']} MB")
+    if not report["enabled"]:
+        print("\nAllocation tracking is off. Restart with MEMORY_DIAGNOSTICS=true to attribute memory to stages.")
+        return
+    print("\n📦 Net growth by stage:")
+    for stage, stats in list(report["stages"].items())[:10]:
+        print(f"   {stage:<28} {stats['net_kb']:>10.1f} KB over {stats['calls']} calls "
+              f"(peak {stats['max_peak_kb']:.1f} KB)")
+    print("\n📍 Largest live allocation sites:")
+    for site in report["top_allocations"][:10]:
+        print(f"   {site['size_kb']:>10.1f} KB  {site['site']}")
+    path = memory_diagnostics.dump()
+    print(f"\n✓ Full report written to {path}")
+
+
+def show_watcher_status():
+    """Print the knowledge-base watcher's state."""
+    stats = watcher_stats()
+    if stats is None:
+        print("\nℹ️  Knowledge-base watcher is off. Set WATCH_KNOWLEDGE_BASE=true to sync changed files automatically.")
+        return
+    print(f"\n👀 Watching {len(stats['roots'])} source(s) with {stats['backend']}:")
+    for root in stats['roots']:
+        print(f"   {root}")
+    print(f"   Pending: {stats['pending'] + stats['queued']}   Synced: {stats['synced']}   Errors: {stats['errors']}")
+    last = stats['last_sync']
+    if last:
+        print(f"   Last: {last['action']} {os.path.basename(last['path'])} in {last['seconds']:.2f}s "
+              f"({'ok' if last['ok'] else 'failed'})")
+
+
+def conversation_page(session_id: str, page: int = 1, page_size: Optional[int] = None) -> Tuple[List[Dict], int]:
+    """
+    One page of a session's exchanges, counting back from the latest (page 1).
+
+    Returns:
+        (exchanges oldest first, number of pages)
+    """
+    page_size = page_size or CONVERSATION_PAGE_SIZE
+    total = conversation_store.count(session_id)
+    pages = max(1, -(-total // page_size))
+    page = min(max(1, page), pages)
+    return conversation_store.page(session_id, before=total - (page - 1) * page_size + 1, limit=page_size), pages
+
+
+def show_conversation_history(session_id: str, page: str = ""):
+    """Print one page of the session's exchanges ('history 2' = the page before the latest)."""
+    number = int(page) if page.isdigit() else 1
+    exchanges, pages = conversation_page(session_id, number)
+    if not exchanges:
+        print("\nNo exchanges in this session yet.")
+        return
+    print(f"\n🗂️  Session {session_id}, page {min(max(1, number), pages)} of {pages}:")
+    for exchange in exchanges:
+        print(f"\n[{exchange['seq']}] {exchange['timestamp'][:16]}  You: {exchange['user']}")
+        print(f"    Advisor: {exchange['assistant'][:300]}{'...' if len(exchange['assistant']) > 300 else ''}")
+
+
 def interactive_cli():
     """Interactive command-line interface."""
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT, METRICS_HOST)
+    mark_ready("cli", STARTUP_BUDGET)
+    start_knowledge_watcher()
+    start_cache_warmup()
     print("\n" + "="*70)
     print("🎯 TELECOM ARCHITECTURE ADVISOR - Interactive Mode")
     print("="*70)
@@ -794,11 +2404,20 @@ def interactive_cli():
     print("  'export md'                  - Export conversation to markdown")
     print("  'export pdf'                 - Export conversation to PDF")
     print("  'analytics'                  - Show analytics dashboard")
+    print("  'memory'                     - Memory diagnostics report (MEMORY_DIAGNOSTICS=true)")
+    print("  'watch'                      - Knowledge-base watcher status (WATCH_KNOWLEDGE_BASE=true)")
+    print("  'tenant <name>|shared'       - Switch to a team's knowledge base, or back to the shared one")
+    print("  'history [page]'             - Show this session's exchanges, latest page first")
+    print("  'sessions'                   - List recent sessions")
+    print("  'cache-stats'                - Documents whose extracted text is cached")
+    print("  'reingest'                   - Re-chunk and re-embed every document (after a CHUNK_SIZE change)")
+    print("  'resume <session_id>'        - Continue an earlier session")
     print("  'help'                       - Show this help message")
     print("  'quit' or 'exit'             - Exit the program")
     print("\n" + "="*70 + "\n")
     
-    conversation = []
+    session_id = conversation_store.new_session(current_tenant())
+    print(f"Session {session_id} (resume it later with 'resume {session_id}')")
     
     while True:
         try:
@@ -818,6 +2437,13 @@ def interactive_cli():
                 print("  'export md'                  - Export to markdown")
                 print("  'export pdf'                 - Export to PDF")
                 print("  'analytics'                  - Show analytics")
+                print("  'memory'                     - Memory diagnostics")
+                print("  'watch'                      - Watcher status")
+                print("  'tenant <name>|shared'       - Switch knowledge base")
+                print("  'history [page]'             - Show exchanges")
+                print("  'sessions' / 'resume <id>'   - List / continue sessions")
+                print("  'cache-stats'                - Extraction cache")
+                print("  'reingest'                   - Re-chunk every document")
                 print("  'quit' or 'exit'             - Exit")
                 continue
             
@@ -825,6 +2451,55 @@ def interactive_cli():
                 show_analytics()
                 continue
             
+            if user_input.lower() == 'memory':
+                show_memory_report()
+                continue
+
+            if user_input.lower() == 'watch':
+                show_watcher_status()
+                continue
+            
+            if user_input.lower().startswith('tenant '):
+                name = user_input[7:].strip().lower()
+                name = None if name == 'shared' else name
+                use_tenant(name)
+                # History from another knowledge base would leak into prompts
+                session_id = conversation_store.new_session(name)
+                label = "the shared" if name is None else f"{name}'s"
+                print(f"✓ Using {label} knowledge base ({kb_chunk_count()} chunks)")
+                continue
+
+            if user_input.lower().split()[0] == 'history':
+                show_conversation_history(session_id, user_input[7:].strip())
+                continue
+
+            if user_input.lower() == 'cache-stats':
+                show_extraction_cache()
+                continue
+
+            if user_input.lower() == 'reingest':
+                print("\n🔄 Re-ingesting the knowledge base...\n")
+                result = reingest_knowledge_base()
+                print(f"Re-ingest complete: {result['documents']} documents, {result['chunks']} chunks")
+                if result['skipped']:
+                    print(f"Kept as they were (source file gone, or text not cached): {', '.join(result['skipped'])}")
+                continue
+
+            if user_input.lower() == 'sessions':
+                for entry in conversation_store.sessions(tenant=current_tenant()):
+                    print(f"  {entry['id']}  {entry['updated_at'][:16]}  {entry['turns']:>4} exchanges  "
+                          f"{(entry['first_question'] or '')[:50]}")
+                continue
+
+            if user_input.lower().startswith('resume '):
+                resumed = conversation_store.session(user_input[7:].strip())
+                if resumed is None or resumed['tenant'] != current_tenant():
+                    print("No such session for this knowledge base ('sessions' lists them)")
+                else:
+                    session_id = resumed['id']
+                    print(f"✓ Resumed session {session_id} ({resumed['turns']} exchanges)")
+                continue
+
             if user_input.lower().startswith('reload'):
                 print("\n🔄 Reloading external knowledge sources...\n")
                 loaded = load_external_sources_from_config()
@@ -851,15 +2526,15 @@ def interactive_cli():
                 continue
             
             if user_input.lower() in ['export md', 'export markdown']:
-                if conversation:
-                    filename = export_to_markdown(conversation)
+                if conversation_store.count(session_id):
+                    filename = export_to_markdown(list(conversation_store.iter_turns(session_id)))
                 else:
                     print("No conversation to export yet.")
                 continue
             
             if user_input.lower() == 'export pdf':
-                if conversation:
-                    filename = export_to_pdf(conversation)
+                if conversation_store.count(session_id):
+                    filename = export_to_pdf(list(conversation_store.iter_turns(session_id)))
                 else:
                     print("No conversation to export yet.")
                 continue
@@ -869,7 +2544,7 @@ def interactive_cli():
             response, context, citations = get_architecture_advice_with_rag(
                 user_input, 
                 use_rag=True,
-                conversation_context=conversation
+                conversation_context=conversation_store.recent(session_id, 3)
             )
             
             print(f"🤖 Answer:\n{response}\n")
@@ -881,12 +2556,7 @@ def interactive_cli():
                     print(f"       Preview: {cite['text_preview']}")
             
             # Save to conversation history
-            conversation.append({
-                "user": user_input,
-                "assistant": response,
-                "citations": citations,
-                "timestamp": datetime.now().isoformat()
-            })
+            conversation_store.append(session_id, user_input, response, citations)
             
         except KeyboardInterrupt:
             print("\n\n👋 Goodbye!")
@@ -964,8 +2634,9 @@ def load_external_sources_from_config():
         return 0
 
 
+@startup_phase("kb_sync")
 def initialize_knowledge_base():
-    """Initialize the knowledge base.
+    """Initialize the knowledge base (timed as the "kb_sync" startup phase).
 
     New dynamic approach:
     1. Attempt to load seed markdown files from a directory (default: ./knowledge_base).
@@ -1009,13 +2680,23 @@ def initialize_knowledge_base():
                 meta.setdefault('domain', 'architecture')
                 meta.setdefault('source', fname)
                 meta.setdefault('priority', 'medium')
+                meta['source_path'] = source_key(fpath)
+                meta['file_hash'] = file_sha256(fpath)
                 chunks = add_knowledge_to_db([body], [meta])
                 added_chunks += chunks
             except Exception as e:
                 print(f"⚠️  Failed to load {fname}: {e}")
         return added_chunks
 
-    existing = collection.count()
+    if shard_set is not None and shard_set.count() == 0 and collection.count() > 0:
+        moved = shard_set.import_collection(collection)
+        print(f"✓ Split {moved} existing chunks into {len(shard_set.shards())} shards by {SHARD_KEY} "
+              f"(the unsharded telecom_knowledge collection is left as it was)")
+
+    if SNAPSHOT_PATH and kb_chunk_count() == 0:
+        restore_knowledge_snapshot(SNAPSHOT_PATH)
+
+    existing = kb_chunk_count()
     if existing > 10:
         print(f"Knowledge base already contains {existing} chunks. Skipping seed load.")
         load_external_sources_from_config()
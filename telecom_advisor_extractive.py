@@ -0,0 +1,131 @@
+"""
+Degraded-mode extractive answers for the Telecom Architecture Advisor.
+
+When Gemini cannot answer within the request budget (slow, rate-limited or
+circuit open), the advisor still has the retrieved knowledge base chunks. This
+module builds a short answer from them locally: sentences are ranked by query
+term overlap and, time permitting, the best few are re-ranked by embedding
+similarity to the question; each keeps its original [Source N] citation.
+"""
+
+import logging
+import math
+import re
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEGRADED_MARKER = "⚠️ Degraded mode"
+
+_SOURCE_PATTERN = re.compile(r"\[Source (\d+)\]\s*")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])|\s+-\s+|\s*\n+\s*")
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "in", "is", "it", "of", "on", "or", "should", "that", "the", "this", "to", "use", "vs",
+    "we", "what", "when", "which", "why", "with", "you", "our", "my", "me", "between", "compare",
+}
+
+
+def is_degraded_answer(answer: str) -> bool:
+    """Whether an answer was produced by the extractive fallback."""
+    return answer.startswith(DEGRADED_MARKER)
+
+
+def split_sources(context: str) -> List[Tuple[int, str]]:
+    """Split a retrieval context string back into (source_id, text) pairs."""
+    parts = _SOURCE_PATTERN.split(context)
+    # parts = [prefix, id1, text1, id2, text2, ...]
+    return [(int(parts[i]), parts[i + 1].strip()) for i in range(1, len(parts) - 1, 2)]
+
+
+def _tokens(text: str) -> List[str]:
+    return [t for t in _TOKEN_PATTERN.findall(text.lower()) if t not in _STOPWORDS and len(t) > 1]
+
+
+def _is_readable(sentence: str) -> bool:
+    """Skip table-of-contents leaders, page furniture and other non-prose fragments."""
+    if len(sentence) < 40:
+        return False
+    letters = sum(ch.isalpha() for ch in sentence)
+    return letters / len(sentence) > 0.6
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def build_extractive_answer(
+    query: str,
+    context: str,
+    reason: str = "the AI model could not answer in time",
+    embed_fn: Optional[Callable[[List[str]], List[Sequence[float]]]] = None,
+    max_sentences: int = 5,
+    time_budget: float = 0.3,
+    semantic_candidates: int = 20
+) -> Optional[str]:
+    """
+    Build a degraded-mode answer from retrieved context without calling the LLM.
+
+    Args:
+        query: User question
+        context: Retrieval context with [Source N] markers
+        reason: Why the LLM answer is unavailable (shown to the user)
+        embed_fn: Optional embedding function for semantic ranking
+        max_sentences: Number of sentences to include
+        time_budget: Seconds available; embedding ranking is skipped if it would not fit
+        semantic_candidates: Best keyword-scored sentences re-ranked by embedding similarity
+
+    Returns:
+        Markdown answer with citations, or None if no usable sentences were found
+    """
+    start = time.monotonic()
+    candidates: List[Tuple[int, int, str]] = []  # (source_id, position, sentence)
+    for source_id, text in split_sources(context):
+        for position, sentence in enumerate(_SENTENCE_SPLIT.split(text)):
+            sentence = sentence.strip()
+            if _is_readable(sentence):
+                candidates.append((source_id, position, sentence))
+    if not candidates:
+        return None
+    candidates = candidates[:200]
+
+    # Keyword score: IDF-weighted overlap with the question's content words
+    query_terms = set(_tokens(query))
+    sentence_terms = [set(_tokens(sentence)) for _, _, sentence in candidates]
+    doc_freq = {term: sum(term in terms for terms in sentence_terms) for term in query_terms}
+    idf = {term: math.log(1 + len(candidates) / (1 + df)) for term, df in doc_freq.items()}
+    max_idf = sum(idf.values()) or 1.0
+    scores = [sum(idf[t] for t in query_terms & terms) / max_idf for terms in sentence_terms]
+
+    # Semantic score for the keyword shortlist only: one small embedding call, cheap enough for the budget
+    if embed_fn is not None and semantic_candidates > 0 and time.monotonic() - start < time_budget / 3:
+        shortlist = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)[:semantic_candidates]
+        try:
+            vectors = embed_fn([query] + [candidates[i][2] for i in shortlist])
+            query_vec = vectors[0]
+            # Sentences outside the shortlist keep their keyword half only, so they rank below it
+            scores = [0.5 * kw for kw in scores]
+            for i, vec in zip(shortlist, vectors[1:]):
+                scores[i] += 0.5 * max(0.0, _cosine(query_vec, vec))
+        except Exception as e:
+            logger.warning(f"Embedding ranking skipped in degraded mode: {e}")
+
+    ranked = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)[:max_sentences]
+    # Present in source order so related sentences read naturally
+    ranked.sort(key=lambda i: (candidates[i][0], candidates[i][1]))
+
+    lines = [
+        f"{DEGRADED_MARKER} — {reason}, so this summary was extracted directly "
+        f"from the knowledge base. Please retry later for a full answer.",
+        "",
+    ]
+    for i in ranked:
+        source_id, _, sentence = candidates[i]
+        lines.append(f"- {sentence} [Source {source_id}]")
+    logger.info("Built extractive answer from %d sentences in %.0f ms",
+                len(candidates), (time.monotonic() - start) * 1000)
+    return "\n".join(lines)
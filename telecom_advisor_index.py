@@ -0,0 +1,338 @@
+"""
+Cached lexical index and document registry for the Telecom Architecture Advisor.
+
+hybrid_search used to fetch every chunk from ChromaDB and rebuild BM25 on each
+query. LexicalIndex holds the chunk store (ids, texts, metadata) and a BM25
+index built once; the advisor rebuilds it only when the collection changes
+(see telecom_advisor_shards.Shard.lexical_index()).
+
+The same object derives the document registry - one entry per ingested file,
+keyed by the file's SHA-256 - which ingestion uses to skip files that are
+already indexed, and it can be saved to and restored from a knowledge-base
+snapshot (telecom_advisor_snapshot.py) without re-tokenizing.
+
+BM25 scoring goes through a sparse document-term weight matrix derived from
+the index, so a batch of queries is scored with one matrix product
+(LexicalIndex.top_many) and chunk filters use Chroma's `where` syntax
+(matches_where).
+
+ReadWriteLock lets queries run concurrently while an index update (new
+chunks in, a changed document's old chunks out) is applied as one step.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+from scipy import sparse
+
+from telecom_advisor_tracing import span
+
+_BM25_STATE = ("k1", "b", "epsilon", "corpus_size", "avgdl", "doc_len", "doc_freqs", "idf", "average_idf")
+_SCORE_BLOCK_CELLS = 2_000_000  # dense query x chunk scores held at once (16 MB)
+_COMPARISONS = {
+    "$eq": lambda value, target: value == target,
+    "$ne": lambda value, target: value != target,
+    "$gt": lambda value, target: value is not None and value > target,
+    "$gte": lambda value, target: value is not None and value >= target,
+    "$lt": lambda value, target: value is not None and value < target,
+    "$lte": lambda value, target: value is not None and value <= target,
+    "$in": lambda value, target: value in target,
+    "$nin": lambda value, target: value not in target,
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokenization shared by indexing and queries."""
+    return text.lower().split()
+
+
+@functools.lru_cache(maxsize=1024)
+def _hash_file(path: str, mtime_ns: int, size: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file's contents, cached until the file's size or mtime changes."""
+    stat = os.stat(path)
+    return _hash_file(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def get_all(collection, include: List[str], page: int = 10_000) -> Dict[str, list]:
+    """
+    collection.get() of every chunk, read a page at a time.
+
+    A single get() over a large collection can exceed SQLite's limit on bound
+    variables, so the chunks are fetched in pages of `page`.
+    """
+    merged: Dict[str, list] = {"ids": [], **{field: [] for field in include}}
+    offset = 0
+    while True:
+        data = collection.get(include=include, limit=page, offset=offset)
+        merged["ids"].extend(data["ids"])
+        for field in include:
+            merged[field].extend(data[field] if data[field] is not None else [])
+        if len(data["ids"]) < page:
+            return merged
+        offset += page
+
+
+def source_key(path: str) -> str:
+    """How a file's location is stored in chunk metadata: relative to the working directory, like the configured sources."""
+    return os.path.relpath(os.path.abspath(path))
+
+
+def matches_where(metadata: Dict, where: Optional[Dict]) -> bool:
+    """
+    Whether chunk metadata passes a Chroma `where` filter.
+
+    Supports field equality ({"domain": "telecom"}), the comparison operators
+    $eq, $ne, $gt, $gte, $lt, $lte, $in and $nin, and $and / $or.
+    """
+    if not where:
+        return True
+    for field, condition in where.items():
+        if field == "$and":
+            ok = all(matches_where(metadata, clause) for clause in condition)
+        elif field == "$or":
+            ok = any(matches_where(metadata, clause) for clause in condition)
+        elif isinstance(condition, dict):
+            ok = True
+            for op, target in condition.items():
+                if op not in _COMPARISONS:
+                    raise ValueError(f"Unsupported where operator {op!r}")
+                ok = ok and _COMPARISONS[op](metadata.get(field), target)
+        else:
+            ok = metadata.get(field) == condition
+        if not ok:
+            return False
+    return True
+
+
+def _top_positions(scores: np.ndarray, n: int) -> List[int]:
+    """Positions of the n highest scores, ties in position order (as a stable sort would give)."""
+    if n >= len(scores):
+        order = np.argsort(-scores, kind="stable")
+    else:
+        threshold = scores[np.argpartition(-scores, n - 1)[n - 1]]
+        above = np.flatnonzero(scores > threshold)
+        ties = np.flatnonzero(scores == threshold)[:n - len(above)]
+        candidates = np.concatenate([above, ties])
+        order = candidates[np.lexsort((candidates, -scores[candidates]))]
+    return [int(i) for i in order if scores[i] != -np.inf]
+
+
+class ReadWriteLock:
+    """
+    Any number of readers, or one writer.
+
+    Waiting writers hold back new readers, so a steady query load can't starve
+    an update. Not reentrant: don't take read() while already holding it.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class LexicalIndex:
+    """
+    Chunk store plus BM25 index over one snapshot of a collection.
+
+    Args:
+        ids: Chunk ids
+        documents: Chunk texts, aligned with ids
+        metadatas: Chunk metadata, aligned with ids
+        bm25: Prebuilt BM25 index (built from documents when omitted)
+        key: Identifies the collection state this index was built from
+    """
+
+    def __init__(self, ids: List[str], documents: List[str], metadatas: List[Dict],
+                 bm25: Optional[BM25Okapi] = None, key: Optional[Tuple] = None):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = [meta or {} for meta in metadatas]
+        self.key = key
+        if bm25 is None and documents:
+            with span("retrieval.bm25_build"):
+                bm25 = BM25Okapi([tokenize(doc) for doc in documents])
+        self.bm25 = bm25
+        self.file_hashes = {meta["file_hash"] for meta in self.metadatas if meta.get("file_hash")}
+        self._weights: Optional[sparse.csr_matrix] = None
+        self._vocabulary: Dict[str, int] = {}
+        self._masks: Dict[str, np.ndarray] = {}
+        self._matrix_lock = threading.Lock()
+
+    @classmethod
+    def from_collection(cls, collection, key: Optional[Tuple] = None) -> "LexicalIndex":
+        with span("retrieval.collection_get"):
+            data = get_all(collection, ["documents", "metadatas"])
+        return cls(data["ids"], data["documents"], data["metadatas"], key=key)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def top(self, query: str, n: int, where: Optional[Dict] = None) -> List[int]:
+        """Positions of the n best BM25 matches for query (among chunks matching where)."""
+        return self.top_many([query], [n], [where])[0]
+
+    def top_many(self, queries: Sequence[str], ns: Sequence[int],
+                 wheres: Optional[Sequence[Optional[Dict]]] = None, with_scores: bool = False) -> List[list]:
+        """
+        Positions of the best BM25 matches for each query, scored with one sparse matrix product.
+
+        Args:
+            queries: Query texts
+            ns: Matches wanted per query
+            wheres: Chroma-style metadata filter per query (None = all chunks)
+            with_scores: Return (position, score) pairs instead of positions
+
+        Returns:
+            One list of positions per query, best first; scores equal BM25Okapi.get_scores
+        """
+        if self.bm25 is None or not queries:
+            return [[] for _ in queries]
+        wheres = list(wheres) if wheres is not None else [None] * len(queries)
+        weights = self._weight_matrix()
+        with span("retrieval.bm25_score"):
+            rows, cols, counts = [], [], []
+            for row, query in enumerate(queries):
+                terms = Counter(t for t in tokenize(query) if t in self._vocabulary)
+                rows.extend([row] * len(terms))
+                cols.extend(self._vocabulary[t] for t in terms)
+                counts.extend(terms.values())
+            query_matrix = sparse.csr_matrix((counts, (rows, cols)), shape=(len(queries), weights.shape[0]))
+            block = max(1, _SCORE_BLOCK_CELLS // max(1, len(self.ids)))
+            results: List[List[int]] = []
+            for start in range(0, len(queries), block):
+                scores = (query_matrix[start:start + block] @ weights).toarray()
+                for offset, row_scores in enumerate(scores):
+                    where = wheres[start + offset]
+                    if where:
+                        row_scores[~self._mask(where)] = -np.inf
+                    positions = _top_positions(row_scores, ns[start + offset])
+                    results.append([(i, float(row_scores[i])) for i in positions] if with_scores else positions)
+        return results
+
+    def _weight_matrix(self) -> sparse.csr_matrix:
+        """Term x chunk BM25 weights: idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len / avglen))."""
+        if self._weights is None:
+            with self._matrix_lock:
+                if self._weights is None:
+                    with span("retrieval.bm25_matrix"):
+                        bm25 = self.bm25
+                        vocabulary = {term: col for col, term in enumerate(bm25.idf)}
+                        terms, freqs, lengths = [], [], []
+                        for doc_freqs in bm25.doc_freqs:
+                            terms.extend(vocabulary[term] for term in doc_freqs)
+                            freqs.extend(doc_freqs.values())
+                            lengths.append(len(doc_freqs))
+                        docs = np.repeat(np.arange(len(bm25.doc_freqs)), lengths)
+                        tf = np.asarray(freqs, dtype=np.float64)
+                        doc_len = np.asarray(bm25.doc_len, dtype=np.float64)[docs]
+                        idf = np.fromiter(bm25.idf.values(), dtype=np.float64, count=len(vocabulary))
+                        values = idf[terms] * tf * (bm25.k1 + 1) / (
+                            tf + bm25.k1 * (1 - bm25.b + bm25.b * doc_len / bm25.avgdl))
+                        self._vocabulary = vocabulary
+                        self._weights = sparse.csr_matrix(
+                            (values, (terms, docs)), shape=(len(vocabulary), len(bm25.doc_freqs)))
+        return self._weights
+
+    def _mask(self, where: Dict) -> np.ndarray:
+        key = json.dumps(where, sort_keys=True, default=str)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = np.fromiter((matches_where(meta, where) for meta in self.metadatas), dtype=bool,
+                               count=len(self.metadatas))
+            if len(self._masks) >= 64:
+                self._masks.clear()
+            self._masks[key] = mask
+        return mask
+
+    def registry(self) -> Dict[str, Dict]:
+        """Ingested documents keyed by file hash (or by source for text added without a file)."""
+        documents: Dict[str, Dict] = {}
+        for chunk_id, meta in zip(self.ids, self.metadatas):
+            key = meta.get("file_hash") or f"source:{meta.get('source', 'unknown')}"
+            entry = documents.setdefault(key, {
+                "source": meta.get("source", "unknown"),
+                "source_path": meta.get("source_path"),
+                "file_hash": meta.get("file_hash"),
+                "topic": meta.get("topic"),
+                "domain": meta.get("domain"),
+                "chunk_ids": [],
+            })
+            entry["chunk_ids"].append(chunk_id)
+        for entry in documents.values():
+            entry["chunks"] = len(entry["chunk_ids"])
+        return documents
+
+    def chunk_ids_for_path(self, path: str) -> List[str]:
+        """
+        Chunks ingested from the file at path.
+
+        Chunks indexed before source_path was recorded are matched by file name.
+        """
+        key, name = source_key(path), os.path.basename(path)
+        return [chunk_id for chunk_id, meta in zip(self.ids, self.metadatas)
+                if meta.get("source_path") == key or ("source_path" not in meta and meta.get("source") == name)]
+
+    # --- Snapshot support ---
+
+    def bm25_state(self) -> Optional[Dict]:
+        """BM25 statistics as plain data, so a restore doesn't have to re-tokenize every chunk."""
+        if self.bm25 is None:
+            return None
+        return {name: getattr(self.bm25, name) for name in _BM25_STATE}
+
+    @classmethod
+    def from_state(cls, ids: List[str], documents: List[str], metadatas: List[Dict],
+                   state: Optional[Dict], key: Optional[Tuple] = None) -> "LexicalIndex":
+        bm25 = None
+        if state is not None:
+            bm25 = BM25Okapi.__new__(BM25Okapi)
+            bm25.__dict__.update(state, tokenizer=None)
+        return cls(ids, documents, metadatas, bm25=bm25, key=key)
+
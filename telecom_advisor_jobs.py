@@ -0,0 +1,428 @@
+"""
+Background ingestion jobs for the Telecom Architecture Advisor.
+
+Uploads used to be ingested inside the request that received them: the
+Streamlit script run wrote a temp_<name> file into the working directory and
+parsed, embedded and stored it before the page could respond. IngestionJobQueue
+takes the upload's bytes instead and returns a job ID at once:
+
+- Text is extracted in a separate worker process (python -m
+  telecom_advisor_jobs), fed the in-memory buffer on stdin, one page at a
+  time. Pages are streamed back as JSON lines, so progress is live and a
+  cancelled job's process is simply terminated. Parsing big PDFs therefore
+  never holds the serving process's GIL, and the worker imports only the
+  extractors, not the advisor and its model.
+- Chunking, embedding and storing run on a background thread in this process,
+  which owns the embedding model and the ChromaDB client. Chunks are embedded
+  in batches, and before each batch the job waits while interactive requests
+  (chat turns, comparisons) are in flight - see InteractivePriority.
+- PDF and Word text is kept in an ExtractionCache (see telecom_advisor_textcache)
+  when the queue has one, so uploading the same bytes again - after deleting
+  them, or into another tenant - skips the worker process altogether.
+- Each job reports its stage, pages extracted, chunks embedded and an ETA,
+  and can be cancelled until its chunks are stored. Chunks are stored in one
+  step at the end, so a cancelled or failed job leaves nothing behind.
+
+Finished jobs are kept (most recent `keep_finished`) so the UI can show their
+outcome.
+"""
+
+import io
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when extract_pages changes what it returns, so text cached by the old code is re-extracted
+EXTRACTOR_REVISION = 1
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+_FINISHED = (DONE, FAILED, CANCELLED)
+ANY_OWNER = object()  # job lookups not filtered by owner (None is an owner: the shared knowledge base)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been cancelled."""
+
+
+def extract_pages(data: bytes, kind: str) -> Iterator[str]:
+    """
+    Text of a document held in memory, one page at a time.
+
+    Args:
+        data: File contents
+        kind: File extension without the dot (pdf, docx, txt, md)
+
+    Yields:
+        Text per page (PDF); the whole text as one page otherwise
+    """
+    if kind == "pdf":
+        import PyPDF2
+        reader = PyPDF2.PdfReader(io.BytesIO(data))
+        for page in reader.pages:
+            yield page.extract_text() or ""
+    elif kind == "docx":
+        import docx
+        document = docx.Document(io.BytesIO(data))
+        yield "\n".join(paragraph.text for paragraph in document.paragraphs)
+    elif kind in ("txt", "md"):
+        yield data.decode("utf-8")
+    else:
+        raise ValueError(f"Unsupported file type: .{kind}")
+
+
+def extractor_version(kind: str) -> str:
+    """Identifies the code that extracts text from a file type, for keying cached text."""
+    if kind == "pdf":
+        import PyPDF2
+        library = f"PyPDF2-{PyPDF2.__version__}"
+    elif kind == "docx":
+        import docx
+        library = f"python-docx-{getattr(docx, '__version__', 'unknown')}"
+    else:
+        library = "utf-8"
+    return f"{library}/{EXTRACTOR_REVISION}"
+
+
+def page_count(data: bytes, kind: str) -> int:
+    if kind == "pdf":
+        import PyPDF2
+        return len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+    return 1
+
+
+def _extract_main(kind: str) -> None:
+    """
+    Worker-process entry point: document bytes on stdin; {"pages": n}, then
+    {"page": text} per page, then {"done": true} (or {"error": ...}) as JSON lines on stdout.
+    """
+    data = sys.stdin.buffer.read()
+
+    def _send(message: Dict) -> None:
+        sys.stdout.write(json.dumps(message) + "\n")
+        sys.stdout.flush()
+
+    try:
+        _send({"pages": page_count(data, kind)})
+        for text in extract_pages(data, kind):
+            _send({"page": text})
+        _send({"done": True})
+    except Exception as e:
+        _send({"error": f"{type(e).__name__}: {e}"})
+
+
+class InteractivePriority:
+    """
+    Counts interactive requests in flight, so background work can yield to them.
+
+    Register `hook` with telecom_advisor_tracing.add_trace_hook; traces named in
+    `names` count as interactive while they run.
+
+    Args:
+        names: Trace names that are interactive
+        max_wait: Longest a background step waits for interactive requests to
+            finish, so ingestion still progresses under constant load
+    """
+
+    def __init__(self, names: Iterable[str] = ("advice", "compare"), max_wait: float = 2.0):
+        self.names = set(names)
+        self.max_wait = max_wait
+        self.waited = 0.0
+        self._active = 0
+        self._idle = threading.Condition()
+
+    def hook(self, trace) -> Callable[[], None]:
+        if trace.name not in self.names:
+            return lambda: None
+        with self._idle:
+            self._active += 1
+
+        def _finish():
+            with self._idle:
+                self._active -= 1
+                if not self._active:
+                    self._idle.notify_all()
+        return _finish
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def wait_for_idle(self) -> None:
+        """Block while interactive requests are running, up to max_wait seconds."""
+        start = time.monotonic()
+        with self._idle:
+            self._idle.wait_for(lambda: not self._active, timeout=self.max_wait)
+        self.waited += time.monotonic() - start
+
+
+class Job:
+    """
+    One ingestion job and its progress.
+
+    Args:
+        name: File name of the upload
+        data: File contents
+        params: Passed through to the queue's ingest function (topic, domain, ...)
+        owner: Who submitted it (e.g. the tenant); only they see it when lookups name an owner
+    """
+
+    def __init__(self, name: str, data: bytes, params: Dict, owner: Optional[str] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.owner = owner
+        self.kind = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+        self.data: Optional[bytes] = data
+        self.size = len(data)
+        self.params = params
+        self.state = QUEUED
+        self.stage = "queued"
+        self.pages_done = 0
+        self.pages_total: Optional[int] = None
+        self.chunks_done = 0
+        self.chunks_total: Optional[int] = None
+        self.result: Optional[int] = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self.context = None  # contextvars.Context the job runs in (the submitter's tenant)
+        self.process: Optional[subprocess.Popen] = None  # text extraction worker, while it runs
+
+    def check_cancelled(self) -> None:
+        if self.cancel_event.is_set():
+            raise JobCancelled(self.id)
+
+    def fraction(self) -> float:
+        """Share of the work done: extraction and embedding count half each."""
+        extracted = self.pages_done / self.pages_total if self.pages_total else 0.0
+        embedded = self.chunks_done / self.chunks_total if self.chunks_total else 0.0
+        return 1.0 if self.state == DONE else 0.5 * extracted + 0.5 * embedded
+
+    def eta(self) -> Optional[float]:
+        """Seconds left at the rate so far (None until there is a rate)."""
+        fraction = self.fraction()
+        if self.state != RUNNING or not self.started or fraction <= 0.02:
+            return None
+        elapsed = time.time() - self.started
+        return elapsed / fraction * (1 - fraction)
+
+    def progress(self) -> Dict:
+        eta = self.eta()
+        end = self.finished or time.time()
+        return {
+            "id": self.id,
+            "name": self.name,
+            "state": self.state,
+            "stage": self.stage,
+            "pages_done": self.pages_done,
+            "pages_total": self.pages_total,
+            "chunks_done": self.chunks_done,
+            "chunks_total": self.chunks_total,
+            "fraction": round(self.fraction(), 3),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "elapsed_seconds": round(end - self.started, 1) if self.started else 0.0,
+            "chunks_added": self.result,
+            "error": self.error,
+        }
+
+
+class IngestionJobQueue:
+    """
+    Background queue of ingestion jobs with per-job progress and cancellation.
+
+    Args:
+        ingest: Called as ingest(job, pages) on a job thread with the extracted
+            page texts; chunks, embeds and stores them and returns the chunks
+            added. It reports embedding progress on the job and calls
+            job.check_cancelled() between steps.
+        workers: Jobs run at the same time
+        keep_finished: Finished jobs remembered for status queries
+        inline_kinds: File types extracted on the job thread instead of in a
+            worker process (plain text, where a process costs more than it saves)
+        cache: ExtractionCache for the text of the other file types (None = always extract);
+            jobs are looked up by their "file_hash" param
+    """
+
+    def __init__(self, ingest: Callable[[Job, List[str]], int], workers: int = 1, keep_finished: int = 100,
+                 inline_kinds: Iterable[str] = ("txt", "md"), cache=None):
+        self.ingest = ingest
+        self.workers = workers
+        self.keep_finished = keep_finished
+        self.inline_kinds = set(inline_kinds)
+        self.cache = cache
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: "queue.Queue[Job]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, name: str, data: bytes, context=None, owner: Optional[str] = None, **params) -> str:
+        """
+        Queue an upload for ingestion.
+
+        Args:
+            name: File name (its extension picks the extractor)
+            data: File contents
+            context: contextvars.Context to run the job in (e.g. carrying the tenant)
+            owner: Who submitted it, for get(), cancel() and jobs() filtered by owner
+            params: Passed through to the ingest function (topic, domain, ...)
+
+        Returns:
+            The job ID
+        """
+        job = Job(name, data, params, owner)
+        job.context = context
+        with self._lock:
+            self._jobs[job.id] = job
+            self._start_workers()
+        self._queue.put(job)
+        logger.info("Queued ingestion job %s for %s (%d bytes)", job.id, name, job.size)
+        return job.id
+
+    def _job(self, job_id: str, owner) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        return job if job is not None and owner in (ANY_OWNER, job.owner) else None
+
+    def get(self, job_id: str, owner=ANY_OWNER) -> Optional[Dict]:
+        """A job's progress (None if unknown, or submitted by someone other than owner)."""
+        job = self._job(job_id, owner)
+        return job.progress() if job else None
+
+    def cancel(self, job_id: str, owner=ANY_OWNER) -> bool:
+        """Ask a job to stop. Returns False if it is unknown (or not owner's) or already finished."""
+        job = self._job(job_id, owner)
+        if job is None or job.state in _FINISHED:
+            return False
+        job.cancel_event.set()
+        process = job.process
+        if process is not None and process.poll() is None:
+            process.terminate()  # its job thread sees end-of-output and stops
+        return True
+
+    def jobs(self, owner=ANY_OWNER) -> List[Dict]:
+        """Every remembered job (or only owner's), newest first."""
+        with self._lock:
+            return [job.progress() for job in reversed(self._jobs.values())
+                    if owner is ANY_OWNER or job.owner == owner]
+
+    def stats(self) -> Dict[str, int]:
+        """Jobs per state."""
+        counts = {state: 0 for state in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job.state] += 1
+        return counts
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"ingest-job-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job.context is not None:
+                job.context.run(self._run, job)
+            else:
+                self._run(job)
+
+    def _run(self, job: Job) -> None:
+        job.started = time.time()
+        job.state = RUNNING
+        try:
+            job.check_cancelled()
+            job.stage = "extracting"
+            pages = self._extract(job)
+            job.data = None  # the bytes aren't needed any more
+            job.check_cancelled()
+            job.result = self.ingest(job, pages)
+            job.state = DONE
+            job.stage = "done"
+        except JobCancelled:
+            job.state = CANCELLED
+            job.stage = "cancelled"
+            logger.info("Ingestion job %s (%s) cancelled", job.id, job.name)
+        except Exception as e:
+            job.state = FAILED
+            job.stage = "failed"
+            job.error = str(e) or type(e).__name__
+            logger.exception(f"Ingestion job {job.id} ({job.name}) failed: {e}")
+        finally:
+            job.data = None
+            job.finished = time.time()
+            self._forget_old()
+
+    def _extract(self, job: Job) -> List[str]:
+        if job.kind in self.inline_kinds:
+            pages = list(extract_pages(job.data, job.kind))
+            job.pages_total = job.pages_done = len(pages)
+            return pages
+
+        file_hash = job.params.get("file_hash")
+        if self.cache is not None and file_hash:
+            extractor = extractor_version(job.kind)
+            pages = self.cache.get(file_hash, extractor)
+            if pages is None:
+                pages = self._extract_in_process(job)
+                self.cache.put(file_hash, extractor, job.name, job.kind, pages)
+            else:
+                job.pages_total = job.pages_done = len(pages)
+            return pages
+        return self._extract_in_process(job)
+
+    def _extract_in_process(self, job: Job) -> List[str]:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "telecom_advisor_jobs", job.kind],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        job.process = process
+        pages: List[str] = []
+        try:
+            if job.cancel_event.is_set():
+                process.terminate()  # cancelled before the process existed for cancel() to stop
+            try:
+                process.stdin.write(job.data)
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+            for line in process.stdout:
+                message = json.loads(line)
+                if "pages" in message:
+                    job.pages_total = message["pages"]
+                elif "page" in message:
+                    pages.append(message["page"])
+                    job.pages_done = len(pages)
+                elif "error" in message:
+                    raise RuntimeError(f"Could not extract text: {message['error']}")
+                else:
+                    return pages
+            job.check_cancelled()
+            raise RuntimeError(f"Extraction process exited with code {process.wait()}")
+        finally:
+            job.process = None
+            process.stdout.close()
+            if process.poll() is None:
+                process.terminate()
+            process.wait()
+
+    def _forget_old(self) -> None:
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job.state in _FINISHED]
+            for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+                del self._jobs[job_id]
+
+
+if __name__ == "__main__":
+    _extract_main(sys.argv[1])
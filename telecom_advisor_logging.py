@@ -0,0 +1,209 @@
+"""
+Non-blocking logging setup for the Telecom Architecture Advisor.
+
+Request threads only put log records on an in-memory queue (QueueHandler); a
+single background QueueListener thread formats them and does the file and
+console I/O, so slow disks and handler locks never add latency to a request.
+
+- The log file holds one JSON object per line (timestamp, level, logger,
+  message, thread, exception and any `extra=` fields) and rotates both at a
+  size limit and on a time schedule.
+- The console keeps the familiar human-readable format.
+- Messages are %-formatted lazily, on the listener thread, when their
+  arguments are immutable; callers should use logger.info("... %s", value)
+  rather than f-strings so disabled levels cost nothing.
+- DEBUG records can be sampled (e.g. keep 1%) before they reach the queue.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+_IMMUTABLE = (str, int, float, bool, type(None), bytes)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SizedTimedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Numbered-backup rotation (file.1, file.2, ...) triggered by size or time.
+
+    Args:
+        max_bytes: Rotate once the file reaches this size (0 = no size limit)
+        backup_count: Rotated files to keep
+        when: "midnight", "H" (hourly), "D" (every 24h) or "none"
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 0, backup_count: int = 5,
+                 when: str = "midnight", encoding: Optional[str] = None, delay: bool = False):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count,
+                         encoding=encoding, delay=delay)
+        self.when = when
+        self.rollover_at = self._next_rollover(time.time())
+
+    def _next_rollover(self, now: float) -> Optional[float]:
+        if self.when == "midnight":
+            tomorrow = datetime.fromtimestamp(now).date().toordinal() + 1
+            return datetime.fromordinal(tomorrow).timestamp()
+        if self.when == "H":
+            return now + 3600
+        if self.when == "D":
+            return now + 86400
+        return None
+
+    def shouldRollover(self, record: logging.LogRecord) -> int:
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return 1
+        return super().shouldRollover(record)
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        self.rollover_at = self._next_rollover(time.time())
+
+
+class DebugSampler(logging.Filter):
+    """Pass only a fraction of DEBUG records; other levels always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or self.rate >= 1.0 or random.random() < self.rate
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that defers message formatting to the listener thread.
+
+    The stock QueueHandler formats every record in the calling thread. Here the
+    message is merged with its args only if an argument is mutable (and could
+    change before the listener gets to it); exception tracebacks are rendered
+    up front because traceback objects keep frames alive.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # This is the root logger's only handler, so the record can be updated in place
+        if record.args and not all(isinstance(arg, _IMMUTABLE) for arg in
+                                   (record.args.values() if isinstance(record.args, dict) else record.args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(
+    log_file: str = "telecom_advisor.log",
+    level: str = "INFO",
+    file_format: str = "json",
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    rotate_when: str = "midnight",
+    debug_sample_rate: float = 1.0,
+    console: bool = True
+) -> None:
+    """
+    Route all logging through a queue to a background writer thread.
+
+    Replaces any handlers already on the root logger. Calling it again
+    reconfigures logging (the previous listener is stopped first).
+
+    Args:
+        log_file: Path of the rotating log file
+        level: Root log level name
+        file_format: "json" for structured lines, "text" for the console format
+        max_bytes: Rotate when the file reaches this size (0 = time-based only)
+        backup_count: Rotated files to keep
+        rotate_when: Time-based rotation: "midnight", "H", "D" or "none"
+        debug_sample_rate: Fraction of DEBUG records kept (1.0 = all)
+        console: Also write human-readable lines to stderr
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    handlers = []
+    file_handler = SizedTimedRotatingFileHandler(
+        log_file, max_bytes=max_bytes, backup_count=backup_count, when=rotate_when,
+        encoding="utf-8", delay=True
+    )
+    file_handler.setFormatter(JsonFormatter() if file_format == "json" else logging.Formatter(TEXT_FORMAT))
+    handlers.append(file_handler)
+    if console:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        handlers.append(stream_handler)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    if debug_sample_rate < 1.0:
+        queue_handler.addFilter(DebugSampler(debug_sample_rate))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def setup_logging_from_env() -> None:
+    """setup_logging() configured from LOG_* environment variables."""
+    setup_logging(
+        log_file=os.getenv("LOG_FILE", "telecom_advisor.log"),
+        level=os.getenv("LOG_LEVEL", "INFO"),
+        file_format=os.getenv("LOG_FORMAT", "json"),
+        max_bytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+        backup_count=int(os.getenv("LOG_BACKUP_COUNT", "5")),
+        rotate_when=os.getenv("LOG_ROTATE_WHEN", "midnight"),
+        debug_sample_rate=float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0")),
+    )
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,224 @@
+"""
+Memory diagnostics for the Telecom Architecture Advisor.
+
+Opt-in (MEMORY_DIAGNOSTICS=true) because tracemalloc slows allocation-heavy
+code noticeably. When started, MemoryDiagnostics:
+
+- Takes a tracemalloc snapshot before and after every top-level request trace
+  (chat turns, comparisons, ingestion) and keeps the top allocation sites that
+  grew, so a leak can be pinned to a file and line
+- Records the traced-memory delta of every span (retrieval.collection_get,
+  retrieval.bm25_build, ingest.extract, ...) per request and in aggregate
+- Samples RSS, traced memory, GC counts and the most numerous object types on
+  a background thread
+- Dumps everything as JSON (plus a raw .tracemalloc snapshot for offline
+  analysis), and feeds the Streamlit admin page and the HTTP API
+
+Snapshots are process-wide: with concurrent requests, a request's diff also
+contains whatever other threads allocated in the meantime.
+"""
+
+import gc
+import json
+import logging
+import os
+import threading
+import tracemalloc
+from collections import Counter, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from telecom_advisor_metrics import current_rss_bytes, register_gauge
+from telecom_advisor_tracing import Trace, add_span_hook, add_trace_hook
+
+logger = logging.getLogger(__name__)
+
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def _format_stat(stat) -> Dict:
+    frame = stat.traceback[0]
+    return {
+        "site": f"{frame.filename}:{frame.lineno}",
+        "size_kb": round(stat.size / 1024, 1),
+        "count": stat.count,
+    }
+
+
+def _format_diff(stat) -> Dict:
+    entry = _format_stat(stat)
+    entry["size_diff_kb"] = round(stat.size_diff / 1024, 1)
+    entry["count_diff"] = stat.count_diff
+    return entry
+
+
+class MemoryDiagnostics:
+    """
+    tracemalloc-based allocation tracking around request stages.
+
+    Args:
+        frames: Stack frames stored per allocation (more = better attribution, more overhead)
+        top_n: Allocation sites kept per report
+        sample_interval: Seconds between RSS/object-count samples
+        history: Request reports and samples kept in memory
+        dump_path: If set, each sample is appended to this file as a JSON line
+    """
+
+    def __init__(self, frames: int = 10, top_n: int = 15, sample_interval: float = 60.0,
+                 history: int = 100, dump_path: Optional[str] = None):
+        self.frames = frames
+        self.top_n = top_n
+        self.sample_interval = sample_interval
+        self.dump_path = dump_path
+        self.enabled = False
+        self.requests: Deque[Dict] = deque(maxlen=history)
+        self.samples: Deque[Dict] = deque(maxlen=history)
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start tracing allocations, hook into request traces and begin sampling."""
+        if self.enabled:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        add_trace_hook(self._on_trace)
+        add_span_hook(self._on_span)
+        register_gauge("advisor_tracemalloc_bytes", "Memory currently traced by tracemalloc",
+                       lambda: tracemalloc.get_traced_memory()[0])
+        self.enabled = True
+        self._sampler = threading.Thread(target=self._sample_loop, name="memory-sampler", daemon=True)
+        self._sampler.start()
+        logger.info(f"Memory diagnostics enabled ({self.frames} frames, sampling every {self.sample_interval}s)")
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.enabled = False
+        tracemalloc.stop()
+
+    # --- Tracing hooks ---
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+    def _on_trace(self, trace: Trace):
+        if not tracemalloc.is_tracing():
+            return lambda: None
+        before = self._snapshot()
+
+        def _finish():
+            after = self._snapshot()
+            diff = after.compare_to(before, "lineno")
+            growth = sum(stat.size_diff for stat in diff)
+            top = [_format_diff(stat) for stat in diff if stat.size_diff > 0][:self.top_n]
+            trace.annotate(memory_delta_kb=round(growth / 1024, 1))
+            report = {
+                "timestamp": datetime.now().isoformat(),
+                "name": trace.name,
+                "trace_id": trace.trace_id,
+                "delta_kb": round(growth / 1024, 1),
+                "stages_kb": trace.attrs.get("memory_stages_kb", {}),
+                "top_growth": top,
+            }
+            with self._lock:
+                self.requests.append(report)
+        return _finish
+
+    def _on_span(self, trace: Trace, stage: str):
+        if not tracemalloc.is_tracing():
+            return lambda: None
+        # The peak is process-wide, so a nested span's reset makes the outer stage's peak a lower bound
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+
+        def _finish():
+            current, peak = tracemalloc.get_traced_memory()
+            delta_kb = (current - before) / 1024
+            peak_kb = max(0, peak - before) / 1024
+            with self._lock:
+                entry = self.stages.setdefault(stage, {"calls": 0, "net_kb": 0.0, "max_peak_kb": 0.0})
+                entry["calls"] += 1
+                entry["net_kb"] += delta_kb
+                entry["max_peak_kb"] = max(entry["max_peak_kb"], peak_kb)
+            stages = dict(trace.attrs.get("memory_stages_kb", {}))
+            stages[stage] = round(stages.get(stage, 0.0) + delta_kb, 1)
+            trace.annotate(memory_stages_kb=stages)
+        return _finish
+
+    # --- Sampling ---
+
+    def sample(self) -> Dict:
+        """Record RSS, traced memory, GC state and the most common object types now."""
+        traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        type_counts = Counter(type(obj).__name__ for obj in gc.get_objects())
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "rss_mb": round(current_rss_bytes() / (1024 * 1024), 1),
+            "traced_mb": round(traced / (1024 * 1024), 1),
+            "traced_peak_mb": round(peak / (1024 * 1024), 1),
+            "gc_counts": list(gc.get_count()),
+            "gc_garbage": len(gc.garbage),
+            "objects": sum(type_counts.values()),
+            "top_types": dict(type_counts.most_common(10)),
+        }
+        with self._lock:
+            self.samples.append(entry)
+        if self.dump_path:
+            try:
+                with open(self.dump_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+            except OSError as e:
+                logger.warning(f"Could not append memory sample to {self.dump_path}: {e}")
+        return entry
+
+    def _sample_loop(self) -> None:
+        while not self._stop.wait(self.sample_interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"Memory sample failed: {e}")
+
+    # --- Reporting ---
+
+    def top_allocations(self, limit: Optional[int] = None, group_by: str = "lineno") -> List[Dict]:
+        """Largest live allocation sites right now ("lineno", "filename" or "traceback")."""
+        if not tracemalloc.is_tracing():
+            return []
+        stats = self._snapshot().statistics(group_by)
+        return [_format_stat(stat) for stat in stats[:limit or self.top_n]]
+
+    def report(self) -> Dict:
+        """Everything collected so far, for the admin page or a dump."""
+        with self._lock:
+            stages = {name: {"calls": int(entry["calls"]),
+                             "net_kb": round(entry["net_kb"], 1),
+                             "avg_net_kb": round(entry["net_kb"] / entry["calls"], 1),
+                             "max_peak_kb": round(entry["max_peak_kb"], 1)}
+                      for name, entry in self.stages.items()}
+            requests = list(self.requests)
+            samples = list(self.samples)
+        return {
+            "enabled": self.enabled,
+            "rss_mb": round(current_rss_bytes() / (1024 * 1024), 1),
+            "stages": dict(sorted(stages.items(), key=lambda item: item[1]["net_kb"], reverse=True)),
+            "requests": requests,
+            "samples": samples,
+            "top_allocations": self.top_allocations(),
+        }
+
+    def dump(self, path: Optional[str] = None) -> str:
+        """Write report() as JSON and the current snapshot as <path>.tracemalloc. Returns the JSON path."""
+        path = path or f"memory_report_{datetime.now():%Y%m%d_%H%M%S}.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+        if tracemalloc.is_tracing():
+            self._snapshot().dump(os.path.splitext(path)[0] + ".tracemalloc")
+        logger.info(f"Memory report written to {path}")
+        return path
@@ -0,0 +1,208 @@
+"""
+Prometheus metrics for the Telecom Architecture Advisor.
+
+All advisor metrics live in one registry (REGISTRY) so every entry point - the
+CLI, the Streamlit app and the HTTP API - exposes the same series:
+
+- Request and per-stage latency histograms, fed from finished request traces
+  (see telecom_advisor_tracing), labelled by request kind and outcome
+- Gemini responses by status code, retries and prompt/completion tokens
+- Ingested documents and chunks
+- Point-in-time values such as knowledge base size, cache hit ratios, queue
+  depths and memory RSS, read through callbacks at scrape time
+
+start_metrics_server() serves the registry in Prometheus text format on a
+local port; render_metrics() returns the same payload for embedding in
+another HTTP server.
+"""
+
+import logging
+import os
+import resource
+import sys
+import threading
+from typing import Callable, Dict, Optional, Sequence, Tuple, Union
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    ProcessCollector,
+    generate_latest,
+    start_http_server,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from telecom_advisor_tracing import Trace, add_trace_listener
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = CollectorRegistry(auto_describe=True)
+ProcessCollector(registry=REGISTRY)
+
+# Sub-10ms buckets for retrieval stages, up to the 45s default request deadline
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60)
+
+REQUEST_LATENCY = Histogram(
+    "advisor_request_duration_seconds", "End-to-end request latency",
+    ["kind", "outcome"], buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+STAGE_LATENCY = Histogram(
+    "advisor_stage_duration_seconds", "Time spent in each request stage",
+    ["kind", "stage"], buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+REQUESTS = Counter(
+    "advisor_requests", "Completed requests by kind and outcome",
+    ["kind", "outcome"], registry=REGISTRY
+)
+GEMINI_RESPONSES = Counter(
+    "advisor_gemini_responses", "Gemini API responses by HTTP status code, or timeout/network",
+    ["code"], registry=REGISTRY
+)
+GEMINI_RETRIES = Counter(
+    "advisor_gemini_retries", "Gemini calls retried after a failure", registry=REGISTRY
+)
+GEMINI_TOKENS = Counter(
+    "advisor_gemini_tokens", "Tokens reported in Gemini usageMetadata",
+    ["direction"], registry=REGISTRY
+)
+INGESTED_DOCUMENTS = Counter(
+    "advisor_ingested_documents", "Documents ingested into the knowledge base by file type",
+    ["type"], registry=REGISTRY
+)
+INGEST_SKIPPED_DOCUMENTS = Counter(
+    "advisor_ingest_skipped_documents", "Files not ingested because their content is already indexed, by file type",
+    ["type"], registry=REGISTRY
+)
+INGESTED_CHUNKS = Counter(
+    "advisor_ingested_chunks", "Chunks added to the knowledge base", registry=REGISTRY
+)
+QUERY_EMBED_BATCH_SIZE = Histogram(
+    "advisor_query_embedding_batch_size", "Query texts embedded per batched forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128), registry=REGISTRY
+)
+QUERY_EMBED_QUEUE_WAIT = Histogram(
+    "advisor_query_embedding_queue_wait_seconds", "Time a query waited for its embedding batch to start",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5), registry=REGISTRY
+)
+
+CallbackValue = Union[float, Dict[Union[str, Tuple[str, ...]], float]]
+
+
+class _CallbackCollector:
+    """Gauges and counters whose values are read from callbacks at scrape time."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Tuple[str, Callable[[], CallbackValue], Sequence[str], bool]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, documentation: str, fn: Callable[[], CallbackValue],
+                 labels: Sequence[str] = (), counter: bool = False) -> None:
+        with self._lock:
+            self._metrics[name] = (documentation, fn, tuple(labels), counter)
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        with self._lock:
+            metrics = list(self._metrics.items())
+        for name, (documentation, fn, labels, counter) in metrics:
+            try:
+                value = fn()
+            except Exception as e:
+                logger.debug(f"Metric callback {name} failed: {e}")
+                continue
+            family_type = CounterMetricFamily if counter else GaugeMetricFamily
+            family = family_type(name, documentation, labels=labels or None)
+            if labels:
+                for key, sample in value.items():
+                    family.add_metric(key if isinstance(key, tuple) else (key,), float(sample))
+            else:
+                family.add_metric([], float(value))
+            yield family
+
+
+_callbacks = _CallbackCollector()
+REGISTRY.register(_callbacks)
+
+
+def register_gauge(name: str, documentation: str, fn: Callable[[], CallbackValue],
+                   labels: Sequence[str] = ()) -> None:
+    """
+    Expose a value computed at scrape time.
+
+    fn returns a number, or a dict keyed by label value (a tuple of values when
+    there are several labels). Re-registering a name replaces the callback.
+    """
+    _callbacks.register(name, documentation, fn, labels)
+
+
+def register_counter(name: str, documentation: str, fn: Callable[[], CallbackValue],
+                     labels: Sequence[str] = ()) -> None:
+    """Like register_gauge, for monotonically increasing totals kept elsewhere."""
+    _callbacks.register(name, documentation, fn, labels, counter=True)
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process (peak RSS where the current value is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+register_gauge("advisor_memory_rss_bytes", "Resident memory of the advisor process", current_rss_bytes)
+
+
+def record_gemini_usage(usage: Optional[Dict]) -> None:
+    """Count tokens from a Gemini usageMetadata block."""
+    if not usage:
+        return
+    GEMINI_TOKENS.labels(direction="prompt").inc(usage.get("promptTokenCount", 0))
+    GEMINI_TOKENS.labels(direction="completion").inc(usage.get("candidatesTokenCount", 0))
+
+
+def observe_trace(trace: Trace) -> None:
+    """Feed a finished request trace into the latency histograms and request counter."""
+    outcome = str(trace.attrs.get("outcome", "ok"))
+    REQUESTS.labels(kind=trace.name, outcome=outcome).inc()
+    REQUEST_LATENCY.labels(kind=trace.name, outcome=outcome).observe(trace.elapsed())
+    for stage, seconds in trace.stage_seconds().items():
+        STAGE_LATENCY.labels(kind=trace.name, stage=stage).observe(seconds)
+
+
+add_trace_listener(observe_trace)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Current metrics in Prometheus text format, with their content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+_server_lock = threading.Lock()
+_server_port: Optional[int] = None
+
+
+def start_metrics_server(port: int, addr: str = "127.0.0.1") -> bool:
+    """
+    Serve /metrics on a background thread. Safe to call repeatedly.
+
+    Returns False (and logs a warning) if the port is unavailable, e.g. when a
+    second app process is already serving metrics on it.
+    """
+    global _server_port
+    with _server_lock:
+        if _server_port is not None:
+            return True
+        try:
+            start_http_server(port, addr=addr, registry=REGISTRY)
+        except OSError as e:
+            logger.warning(f"Metrics endpoint not started on {addr}:{port}: {e}")
+            return False
+        _server_port = port
+        logger.info(f"Prometheus metrics on http://{addr}:{port}/metrics")
+        return True
@@ -0,0 +1,266 @@
+"""
+Cross-encoder reranking for the Telecom Architecture Advisor.
+
+hybrid_search ranks chunks by fused embedding and BM25 rank, which needs a
+generous n_results before the chunks that actually answer a question are
+reliably among them - and every extra chunk lengthens the Gemini prompt.
+With RERANK on, hybrid_search instead returns RERANK_CANDIDATES candidates,
+a small cross-encoder reads each (question, chunk) pair and scores how well
+the chunk answers the question, and only the best RETRIEVAL_RESULTS go to
+prompt assembly.
+
+- All of a request's pairs (every query of a batch or comparison) are scored
+  in one model call, in batches padded only to their longest member.
+- Scores are cached by (query hash, chunk hash): a repeated question, or a
+  chunk already scored for it, costs nothing the second time. Chunks are
+  identified by their text, so a score stays valid exactly as long as the
+  chunk does, in every tenant and shard.
+- RERANK_BACKEND selects how the model runs, as EMBEDDING_BACKEND does for
+  embeddings: torch (sentence-transformers CrossEncoder) or onnx (the same
+  model exported with `python telecom_advisor_rerank.py export`, run on ONNX
+  Runtime, optionally int8 quantized).
+
+Scores are relevance probabilities in [0, 1] (the logit through a sigmoid),
+so they read the same as citation relevance scores for either backend.
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from telecom_advisor_cache import TTLCache
+from telecom_advisor_embeddings import (
+    BACKENDS,
+    ONNX_CONFIG_FILE,
+    ONNX_MODEL_FILE,
+    ONNX_QUANTIZED_FILE,
+    default_onnx_dir,
+    length_sorted_batches,
+    load_onnx_model,
+    onnx_feeds,
+)
+from telecom_advisor_singleflight import fingerprint
+
+logger = logging.getLogger(__name__)
+
+Pairs = List[Tuple[str, str]]
+SearchResult = Tuple[List[str], List[Dict], List[float]]
+
+
+def _sigmoid(logits: np.ndarray) -> np.ndarray:
+    return 1 / (1 + np.exp(-logits))
+
+
+class ONNXCrossEncoder:
+    """
+    A cross-encoder exported by export_onnx(), run with ONNX Runtime.
+
+    Args:
+        model_dir: Directory written by export_onnx()
+        quantized: Use the int8 dynamically quantized model
+        threads: ONNX Runtime intra-op threads (0 = one per physical core)
+        batch_size: Pairs per inference call
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = False, threads: int = 0, batch_size: int = 32):
+        self.config, self.session, self.input_names, self.tokenizer = load_onnx_model(
+            model_dir, quantized, threads, "max_length", f"python telecom_advisor_rerank.py export {model_dir}"
+        )
+        self.model_dir = model_dir
+        self.model_name = self.config["model_name"]
+        self.batch_size = max(1, batch_size)
+
+    def __call__(self, pairs: Pairs) -> List[float]:
+        scores = np.empty(len(pairs), dtype=np.float32)
+        for rows in length_sorted_batches([len(query) + len(text) for query, text in pairs], self.batch_size):
+            scores[rows] = self._score_batch([pairs[i] for i in rows])
+        return scores.tolist()
+
+    def _score_batch(self, pairs: Pairs) -> np.ndarray:
+        feeds = onnx_feeds(self.tokenizer.encode_batch(pairs), self.input_names)
+        logits = self.session.run(None, feeds)[0]
+        return _sigmoid(logits[:, 0])
+
+
+def create_scorer(backend: str, model_name: str, onnx_dir: Optional[str] = None, quantized: bool = False,
+                  threads: int = 0, batch_size: int = 32) -> Callable[[Pairs], List[float]]:
+    """
+    A function scoring (query, passage) pairs with a backend.
+
+    Raises:
+        ValueError: Unknown backend, or the ONNX export was made from a different model
+        FileNotFoundError: The cross-encoder hasn't been exported to onnx_dir
+    """
+    if backend == "torch":
+        from sentence_transformers import CrossEncoder
+        model = CrossEncoder(model_name, device="cpu")
+        # predict() applies a sigmoid to single-logit models
+        return lambda pairs: [float(s) for s in model.predict(pairs, batch_size=batch_size,
+                                                              show_progress_bar=False)]
+    if backend != "onnx":
+        raise ValueError(f"Unknown RERANK_BACKEND {backend!r} (expected one of {', '.join(BACKENDS)})")
+    scorer = ONNXCrossEncoder(onnx_dir or default_onnx_dir(model_name), quantized, threads, batch_size)
+    if scorer.model_name != model_name:
+        raise ValueError(f"Cross-encoder in {scorer.model_dir} was exported from {scorer.model_name!r}, "
+                         f"but RERANK_MODEL is {model_name!r}")
+    logger.info("Reranking with ONNX Runtime (%s%s, %s threads, batch %d)", scorer.model_dir,
+                ", int8" if quantized else "", threads or "auto", scorer.batch_size)
+    return scorer
+
+
+class CrossEncoderReranker:
+    """
+    Reorders search results by cross-encoder score, with a cache of scored pairs.
+
+    Args:
+        score: Scores a list of (query, passage) pairs in one call
+        cache_size: (query, chunk) scores kept before the least recently used is evicted
+        cache_ttl: Seconds a cached score stays valid (None = no expiry)
+    """
+
+    def __init__(self, score: Callable[[Pairs], List[float]], cache_size: int = 50_000,
+                 cache_ttl: Optional[float] = None):
+        self.score = score
+        self.cache = TTLCache(cache_size, cache_ttl, name="rerank")
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._pairs_scored = 0
+        self._seconds = 0.0
+
+    def scores(self, queries: Sequence[str], passages: Sequence[Sequence[str]]) -> List[List[float]]:
+        """Score of every passage for its query; uncached pairs are scored together in one call."""
+        keys = [[(fingerprint(query), fingerprint(text)) for text in texts]
+                for query, texts in zip(queries, passages)]
+        found: Dict[Tuple[str, str], float] = {}
+        missing: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        for query, texts, row in zip(queries, passages, keys):
+            for text, key in zip(texts, row):
+                if key in found or key in missing:
+                    continue
+                cached = self.cache.get(key)
+                if cached is None:
+                    missing[key] = (query, text)
+                else:
+                    found[key] = cached
+        if missing:
+            start = time.perf_counter()
+            scored = self.score(list(missing.values()))
+            elapsed = time.perf_counter() - start
+            for key, value in zip(missing, scored):
+                found[key] = value
+                self.cache.set(key, value)
+            with self._lock:
+                self._calls += 1
+                self._pairs_scored += len(missing)
+                self._seconds += elapsed
+        return [[found[key] for key in row] for row in keys]
+
+    def rerank(self, queries: Sequence[str], results: Sequence[SearchResult],
+               ks: Sequence[int]) -> List[SearchResult]:
+        """
+        Reorder each query's (documents, metadata, scores) by cross-encoder score and keep its top k.
+
+        The returned scores are the cross-encoder's, replacing the fused hybrid scores.
+        """
+        all_scores = self.scores(queries, [docs for docs, _, _ in results])
+        reranked = []
+        for (docs, metadatas, _), scores, k in zip(results, all_scores, ks):
+            order = sorted(range(len(docs)), key=lambda i: -scores[i])[:k]
+            reranked.append(([docs[i] for i in order], [metadatas[i] for i in order], [scores[i] for i in order]))
+        return reranked
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self.cache.stats(),
+                "model_calls": self._calls,
+                "pairs_scored": self._pairs_scored,
+                "mean_call_ms": round(self._seconds / self._calls * 1000, 3) if self._calls else 0.0,
+            }
+
+
+def export_onnx(model_name: str, output_dir: str, quantize: bool = False, opset: int = 17) -> Dict:
+    """
+    Export a sentence-transformers CrossEncoder for the onnx backend (needs torch).
+
+    Writes the model's relevance logit as model.onnx (plus model_int8.onnx with
+    quantize), its tokenizer and the settings the runtime applies.
+
+    Returns:
+        The exported config
+    """
+    import torch
+    from sentence_transformers import CrossEncoder
+
+    model = CrossEncoder(model_name, device="cpu")
+    transformer = model.model.eval()
+    if transformer.config.num_labels != 1:
+        raise ValueError(f"{model_name} has {transformer.config.num_labels} labels; "
+                         f"only single-score cross-encoders can rerank")
+    tokenizer = model.tokenizer
+
+    class _Logits(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids=None):
+            return self.transformer(input_ids=input_ids, attention_mask=attention_mask,
+                                    token_type_ids=token_type_ids).logits
+
+    os.makedirs(output_dir, exist_ok=True)
+    sample = tokenizer(["telecom architecture", "billing"],
+                       ["a longer sample passage for export", "rating and charging"],
+                       padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+    with torch.no_grad():
+        torch.onnx.export(_Logits(), tuple(sample[name] for name in input_names),
+                          os.path.join(output_dir, ONNX_MODEL_FILE), input_names=input_names,
+                          output_names=["logits"], dynamic_axes=dynamic_axes,
+                          opset_version=opset, dynamo=False)
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, "tokenizer.json"))
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(os.path.join(output_dir, ONNX_MODEL_FILE), os.path.join(output_dir, ONNX_QUANTIZED_FILE),
+                         weight_type=QuantType.QInt8)
+
+    config = {
+        "model_name": model_name,
+        "max_length": min(model.max_length or tokenizer.model_max_length, 512),
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "quantized": quantize,
+        "opset": opset,
+    }
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), "w") as f:
+        json.dump(config, f, indent=2)
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the cross-encoder for the ONNX rerank backend")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Export RERANK_MODEL to ONNX (needs sentence-transformers/torch)")
+    export.add_argument("output", nargs="?", help="Directory to write (default models/<model>-onnx)")
+    export.add_argument("--model", default=os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"))
+    export.add_argument("--quantize", action="store_true", help="Also write an int8 dynamically quantized model")
+    args = parser.parse_args()
+
+    output = args.output or default_onnx_dir(args.model)
+    start = time.perf_counter()
+    export_onnx(args.model, output, args.quantize)
+    print(f"✓ Exported {args.model} to {output} in {time.perf_counter() - start:.1f}s"
+          f"{' (int8 model too)' if args.quantize else ''}")
+
+
+if __name__ == "__main__":
+    main()
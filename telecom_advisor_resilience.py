@@ -0,0 +1,330 @@
+"""
+Resilience layer for Gemini calls: deadlines, circuit breaking and hedged requests.
+
+- Deadlines: deadline_scope() sets a per-request budget in a context variable;
+  every stage (retrieval, prompt build, generation, retries) checks or bounds
+  itself by remaining_time() so a request never overruns its budget.
+- CircuitBreaker: after repeated failures the endpoint is considered unhealthy
+  and calls fail fast with CircuitOpenError until a cool-down has passed; one
+  trial call then decides whether to close the circuit again.
+- Hedger: if a call has not returned after the observed p95 latency, a
+  duplicate is sent and whichever succeeds first is used.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request has used up its time budget."""
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit '{name}' is open; retry in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+# --- Deadlines ---
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Bound everything inside the block by a time budget.
+
+    Nested scopes can only tighten an enclosing deadline, never extend it.
+    """
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left in the current request budget, or None if unbounded."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline(stage: str) -> None:
+    """Raise DeadlineExceeded if the current budget is already spent."""
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(f"Request deadline exceeded during {stage}")
+
+
+def bounded_timeout(timeout: float, stage: str = "generation") -> float:
+    """Clamp a network timeout to the remaining request budget."""
+    check_deadline(stage)
+    remaining = remaining_time()
+    return timeout if remaining is None else min(timeout, remaining)
+
+
+def stop_at_deadline(retry_state) -> bool:
+    """tenacity stop condition: give up when the next backoff would overrun the deadline."""
+    remaining = remaining_time()
+    if remaining is None:
+        return False
+    return remaining <= (getattr(retry_state, "upcoming_sleep", 0) or 0) + 0.1
+
+
+def wait_retry_after(fallback: Callable, max_wait: float) -> Callable:
+    """
+    tenacity wait strategy that honours a server's Retry-After header.
+
+    Uses the header's delay (capped at max_wait) when the failed response
+    carried one, e.g. on 429 or 503, and the fallback strategy otherwise.
+    """
+    def _wait(retry_state) -> float:
+        error = retry_state.outcome.exception() if retry_state.outcome else None
+        response = getattr(error, "response", None)
+        header = response.headers.get("Retry-After") if response is not None else None
+        if header:
+            try:
+                return min(max(0.0, float(header)), max_wait)
+            except ValueError:
+                pass  # HTTP-date form; fall back to exponential backoff
+        return fallback(retry_state)
+    return _wait
+
+
+# --- Circuit breaker ---
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Args:
+        name: Label used in logs and metrics
+        failure_threshold: Consecutive failures that open the circuit
+        recovery_timeout: Seconds to stay open before allowing a trial call
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> None:
+        """Raise CircuitOpenError unless a call may proceed."""
+        with self._lock:
+            if self.state == self.OPEN:
+                waited = time.monotonic() - self.opened_at
+                if waited < self.recovery_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, self.recovery_timeout - waited)
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+                logger.info(f"Circuit '{self.name}' half-open, allowing a trial call")
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, 1.0)
+                self._trial_in_flight = True
+
+    def release(self) -> None:
+        """Give back a trial slot taken by allow() for a call that never reached the endpoint."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                    logger.warning(f"Circuit '{self.name}' opened after "
+                                   f"{self.consecutive_failures} consecutive failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+def guarded_timeout(breaker: CircuitBreaker, timeout: float, stage: str = "generation") -> float:
+    """
+    Network timeout for a call about to go through `breaker`, clamped to the request budget.
+
+    The deadline is checked before the breaker is asked, so a request that has
+    already run out of budget never takes a half-open circuit's trial slot.
+    """
+    timeout = bounded_timeout(timeout, stage)
+    breaker.allow()
+    return timeout
+
+
+# --- Hedged requests ---
+
+class LatencyTracker:
+    """Rolling window of recent call latencies for percentile estimates."""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Latency at quantile q (0-1), or None until enough samples exist."""
+        with self._lock:
+            if len(self._samples) < 20:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Hedger:
+    """
+    Send a duplicate call when the first is slower than the observed tail latency.
+
+    Args:
+        tracker: Latency history used to pick the hedge delay
+        percentile: Quantile of recent latencies after which to hedge (e.g. 0.95)
+        initial_delay: Hedge delay used until enough latency samples exist
+        min_delay: Lower bound on the hedge delay
+        enabled: When False, calls are passed straight through
+        max_workers: Threads running attempts; primary and hedge attempts queue beyond it
+    """
+
+    def __init__(self, tracker: LatencyTracker, percentile: float = 0.95,
+                 initial_delay: float = 8.0, min_delay: float = 1.0, enabled: bool = True,
+                 max_workers: int = 32):
+        self.tracker = tracker
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.enabled = enabled
+        self.calls = 0
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+    def resize(self, max_workers: int) -> None:
+        """Run later attempts on a pool of max_workers threads; running attempts finish on the old one."""
+        with self._lock:
+            if max_workers == self.max_workers:
+                return
+            old, self._executor = self._executor, ThreadPoolExecutor(max_workers=max_workers,
+                                                                     thread_name_prefix="hedge")
+            self.max_workers = max_workers
+        old.shutdown(wait=False)
+
+    def hedge_delay(self) -> float:
+        observed = self.tracker.percentile(self.percentile)
+        return max(self.min_delay, observed if observed is not None else self.initial_delay)
+
+    def _timed(self, fn: Callable):
+        start = time.monotonic()
+        result = fn()
+        self.tracker.record(time.monotonic() - start)
+        return result
+
+    def _submit(self, fn: Callable):
+        # Copy the caller's context so the attempt sees the same request deadline
+        return self._executor.submit(contextvars.copy_context().run, self._timed, fn)
+
+    def call(self, fn: Callable):
+        """Run fn, hedging with a second attempt if it is slow. Returns the first success."""
+        with self._lock:
+            self.calls += 1
+        if not self.enabled:
+            return self._timed(fn)
+
+        delay = self.hedge_delay()
+        primary = self._submit(fn)
+        remaining = remaining_time()
+        done, _ = wait([primary], timeout=delay if remaining is None else max(0.0, min(delay, remaining)))
+        if done:
+            return primary.result()
+        if remaining is not None and remaining <= delay:
+            primary.cancel()
+            raise DeadlineExceeded("Request deadline exceeded during generation")
+
+        logger.info("Hedging slow call after %.2fs", delay)
+        with self._lock:
+            self.hedges_sent += 1
+        pending = {primary: "primary", self._submit(fn): "hedge"}
+        last_error: Optional[BaseException] = None
+        while pending:
+            remaining = remaining_time()
+            done, _ = wait(list(pending), timeout=None if remaining is None else max(0.0, remaining),
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                # Out of budget: leave the attempts to finish (or time out) on their own
+                for future in pending:
+                    future.cancel()
+                raise DeadlineExceeded("Request deadline exceeded during generation")
+            for future in done:
+                label = pending.pop(future)
+                if future.exception() is None:
+                    if label == "hedge":
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                last_error = future.exception()
+        raise last_error
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedges_sent": self.hedges_sent,
+                "hedge_wins": self.hedge_wins,
+                "hedge_win_rate": round(self.hedge_wins / self.hedges_sent, 4) if self.hedges_sent else 0.0,
+                "hedge_delay_seconds": round(self.hedge_delay(), 3),
+                "max_workers": self.max_workers,
+            }
@@ -0,0 +1,608 @@
+"""
+Async HTTP API server for the Telecom Architecture Advisor.
+
+Serves the advisor to other services over JSON/HTTP from a single process that
+shares one warm embedding model and ChromaDB index. Blocking advisor calls run
+on a bounded worker pool; when the pool and its queue are full, new requests
+are rejected with 503 instead of piling up.
+
+Endpoints:
+    GET  /healthz         - Liveness probe (process is up)
+    GET  /readyz          - Readiness probe (knowledge base initialized, caches warmed)
+    POST /advise          - {"question", "use_rag", "include_citations", "conversation"}
+    POST /advise/stream   - Same payload as /advise, answer streamed as server-sent events
+    POST /compare         - {"arch1", "arch2", "context"}
+    POST /retrieve        - {"query", "n_results"}
+    POST /ingest          - {"paths", "topic", "domain"} or {"documents", "metadata"}; paths must lie
+                            inside KNOWLEDGE_DIR or an enabled knowledge_sources.json source
+    POST /ingest/jobs     - {"name", "content_base64", "topic", "domain"}: queue an upload for
+                            background ingestion, returns its job ID
+    GET  /ingest/jobs     - The tenant's ingestion jobs with progress (pages, chunks, ETA), newest first
+    POST /ingest/jobs/cancel - {"id"}
+    GET  /analytics       - Query analytics summary
+    GET  /stats           - Worker pool, circuit breaker, hedging, coalescing, caches, startup timings,
+                            cache warm-up and knowledge-base watcher
+    GET  /metrics         - Prometheus text format (same registry as METRICS_PORT)
+    GET  /debug/memory    - Memory diagnostics report (allocation tracking needs MEMORY_DIAGNOSTICS=true)
+
+/advise and /advise/stream accept an optional "deadline" (seconds)
+that bounds retrieval, prompt build and generation for that request.
+
+/advise, /advise/stream, /compare, /retrieve, /ingest and /ingest/jobs (and
+/ingest/jobs/cancel) use the tenant named
+by a "tenant" field or an X-Tenant header (see telecom_advisor_tenants), and
+the shared knowledge base without one.
+
+Usage:
+    python telecom_advisor_server.py --port 8080 --workers 8 --max-queue 64
+"""
+
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import telecom_advisor_enhanced as advisor
+from telecom_advisor_extractive import is_degraded_answer
+from telecom_advisor_metrics import register_gauge, render_metrics
+from telecom_advisor_startup import mark_ready, startup_phase, startup_report
+from telecom_advisor_tenants import TenantError, validate_tenant
+
+logger = logging.getLogger(__name__)
+
+# Server configuration (overridable via environment or command line)
+SERVER_HOST = os.getenv("ADVISOR_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("ADVISOR_PORT", "8080"))
+WORKER_COUNT = int(os.getenv("ADVISOR_WORKERS", "8"))
+MAX_QUEUE_DEPTH = int(os.getenv("ADVISOR_MAX_QUEUE", "64"))
+MAX_BODY_BYTES = 1024 * 1024  # 1 MB
+MAX_RETRIEVE_RESULTS = 50  # most chunks one POST /retrieve may ask for
+MAX_UPLOAD_BYTES = int(os.getenv("ADVISOR_MAX_UPLOAD_MB", "64")) * 1024 * 1024  # POST /ingest/jobs bodies
+KEEPALIVE_TIMEOUT = 15  # seconds
+
+
+class HTTPError(Exception):
+    """An error that maps directly onto an HTTP error response."""
+
+    def __init__(self, status: HTTPStatus, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+def _require(payload: Dict, field: str) -> str:
+    """Return a required non-empty string field from a request payload."""
+    value = payload.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{field}' is required")
+    return value.strip()
+
+
+def _deadline(payload: Dict) -> Optional[float]:
+    """Optional per-request time budget in seconds."""
+    value = payload.get("deadline")
+    if value is None:
+        return None
+    try:
+        deadline = float(value)
+    except (TypeError, ValueError):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "'deadline' must be a number of seconds")
+    if deadline <= 0:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "'deadline' must be positive")
+    return deadline
+
+
+def _n_results(payload: Dict, default: int = 3) -> int:
+    """Chunks requested from /retrieve: a positive integer up to MAX_RETRIEVE_RESULTS."""
+    value = payload.get("n_results", default)
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "'n_results' must be an integer")
+    try:
+        n_results = int(value)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "'n_results' must be an integer")
+    if not 1 <= n_results <= MAX_RETRIEVE_RESULTS:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'n_results' must be between 1 and {MAX_RETRIEVE_RESULTS}")
+    return n_results
+
+
+def _flag(payload: Dict, field: str, default: bool) -> bool:
+    """Optional JSON boolean field; anything else (e.g. the string "false") is rejected."""
+    value = payload.get(field, default)
+    if not isinstance(value, bool):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{field}' must be true or false")
+    return value
+
+
+def _conversation(payload: Dict) -> Optional[List[Dict]]:
+    """Optional earlier exchanges: a list of {"user", "assistant"} objects."""
+    value = payload.get("conversation")
+    if value is None:
+        return None
+    if not isinstance(value, list) or not all(isinstance(msg, dict) for msg in value):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "'conversation' must be a list of objects")
+    return value or None
+
+
+def _string(payload: Dict, field: str, default: str) -> str:
+    """Optional string field."""
+    value = payload.get(field, default)
+    if not isinstance(value, str):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{field}' must be a string")
+    return value
+
+
+def _list_of(payload: Dict, field: str, kind: type, description: str) -> List:
+    """Required non-empty list field whose items are all of one type."""
+    value = payload.get(field)
+    if not isinstance(value, list) or not value or not all(isinstance(item, kind) for item in value):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{field}' must be a non-empty list of {description}")
+    return value
+
+
+def _ingest_paths(payload: Dict) -> List[str]:
+    """
+    Server-side files and directories for /ingest, each inside a configured
+    knowledge source (KNOWLEDGE_DIR or an enabled knowledge_sources.json entry).
+    """
+    paths = _list_of(payload, "paths", str, "paths")
+    roots = [os.path.realpath(root.path) for root in advisor.watch_roots()]
+    for path in paths:
+        real = os.path.realpath(path)
+        if not any(real == root or real.startswith(root.rstrip(os.sep) + os.sep) for root in roots):
+            raise HTTPError(HTTPStatus.FORBIDDEN, f"'{path}' is not inside a configured knowledge source")
+    return paths
+
+
+def _tenant(payload: Dict) -> Optional[str]:
+    """The request's tenant (its "tenant" field or X-Tenant header); None for the shared knowledge base."""
+    tenant = payload.get("tenant") or None
+    if tenant is not None:
+        try:
+            validate_tenant(tenant)
+        except TenantError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+    return tenant
+
+
+def _in_tenant(payload: Dict, fn: Callable) -> Callable:
+    """fn run against the request's tenant (its "tenant" field or X-Tenant header)."""
+    tenant = _tenant(payload)
+
+    def _call(*args, **kwargs):
+        with advisor.tenant_scope(tenant):
+            return fn(*args, **kwargs)
+    return _call
+
+
+class AdvisorServer:
+    """
+    Minimal asyncio HTTP/1.1 server in front of the advisor functions.
+
+    The event loop only parses requests and writes responses; every call into
+    the advisor runs on the worker pool. Admission control counts requests that
+    are running or waiting for a worker and rejects anything beyond
+    workers + max_queue.
+    """
+
+    def __init__(self, host: str = SERVER_HOST, port: int = SERVER_PORT,
+                 workers: int = WORKER_COUNT, max_queue: int = MAX_QUEUE_DEPTH,
+                 initialize: bool = True):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_queue = max_queue
+        self.initialize = initialize
+        self.ready = False
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="advisor-worker")
+        self._in_flight = 0  # only touched from the event loop thread
+        # Room for every worker's primary Gemini attempt plus a hedge, unless HEDGE_WORKERS says otherwise
+        if not advisor.HEDGE_WORKERS:
+            advisor.gemini_hedger.resize(2 * workers)
+
+        self.routes: Dict[Tuple[str, str], Callable] = {
+            ("GET", "/healthz"): self.handle_health,
+            ("GET", "/readyz"): self.handle_ready,
+            ("POST", "/advise"): self.handle_advise,
+            ("POST", "/compare"): self.handle_compare,
+            ("POST", "/retrieve"): self.handle_retrieve,
+            ("POST", "/ingest"): self.handle_ingest,
+            ("POST", "/ingest/jobs"): self.handle_submit_job,
+            ("GET", "/ingest/jobs"): self.handle_jobs,
+            ("POST", "/ingest/jobs/cancel"): self.handle_cancel_job,
+            ("GET", "/analytics"): self.handle_analytics,
+            ("GET", "/stats"): self.handle_stats,
+            ("GET", "/debug/memory"): self.handle_memory,
+        }
+        self.stream_routes: Dict[Tuple[str, str], Callable] = {
+            ("POST", "/advise/stream"): self.handle_advise_stream,
+        }
+        self.raw_routes: Dict[Tuple[str, str], Callable] = {
+            ("GET", "/metrics"): self.handle_metrics,
+        }
+
+        register_gauge("advisor_server_in_flight", "Requests admitted to the worker pool",
+                       lambda: self._in_flight)
+        register_gauge("advisor_server_queue_depth", "Admitted requests waiting for a worker",
+                       lambda: self.queue_depth)
+        register_gauge("advisor_server_ready", "1 once the knowledge base is initialized",
+                       lambda: float(self.ready))
+
+    # --- Worker pool and admission control ---
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of admitted requests waiting for a free worker."""
+        return max(0, self._in_flight - self.workers)
+
+    def _submit(self, fn: Callable, *args, **kwargs) -> asyncio.Future:
+        """Admit a blocking call onto the worker pool, or raise 503 when saturated."""
+        if self._in_flight >= self.workers + self.max_queue:
+            logger.warning(f"Rejecting request: {self._in_flight} in flight, queue full")
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Server is at capacity, please retry",
+                            headers={"Retry-After": "1"})
+        self._in_flight += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, lambda: fn(*args, **kwargs))
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future: asyncio.Future) -> None:
+        self._in_flight -= 1
+
+    def _require_ready(self) -> None:
+        if not self.ready:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Knowledge base is still initializing",
+                            headers={"Retry-After": "5"})
+
+    async def _warm_up(self) -> None:
+        """
+        Initialize the knowledge base, exercise the model once and warm the caches
+        for frequent past questions (up to WARMUP_MAX_WAIT) before reporting ready.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            if self.initialize:
+                await loop.run_in_executor(self.executor, advisor.initialize_knowledge_base)
+            with startup_phase("warm_up"):
+                await loop.run_in_executor(self.executor, advisor.retrieve_context_with_citations,
+                                           "telecom architecture")
+            warmer = advisor.start_cache_warmup()
+            if warmer is not None:
+                # Waiting only; the warmer does its work on its own thread, not the worker pool
+                with startup_phase("cache_warmup"):
+                    await loop.run_in_executor(None, warmer.wait_ready)
+            self.ready = True
+            mark_ready("server", advisor.STARTUP_BUDGET)
+            advisor.start_knowledge_watcher()
+            logger.info("Advisor server ready")
+        except Exception as e:
+            logger.exception(f"Knowledge base initialization failed: {e}")
+
+    # --- Handlers ---
+
+    async def handle_health(self, payload: Dict) -> Dict:
+        return {"status": "ok"}
+
+    async def handle_ready(self, payload: Dict) -> Dict:
+        self._require_ready()
+        return {
+            "status": "ready",
+            "workers": self.workers,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+        }
+
+    async def handle_advise(self, payload: Dict) -> Dict:
+        self._require_ready()
+        question = _require(payload, "question")
+        result = await self._submit(
+            _in_tenant(payload, advisor.get_architecture_advice_with_rag),
+            question,
+            use_rag=_flag(payload, "use_rag", True),
+            include_citations=_flag(payload, "include_citations", True),
+            conversation_context=_conversation(payload),
+            deadline=_deadline(payload),
+        )
+        answer, context, citations = result
+        return {"answer": answer, "context": context, "citations": citations,
+                "degraded": is_degraded_answer(answer), "timings": result.timings}
+
+    async def handle_compare(self, payload: Dict) -> Dict:
+        self._require_ready()
+        arch1 = _require(payload, "arch1")
+        arch2 = _require(payload, "arch2")
+        context = payload.get("context") or "telecom systems"
+        comparison = await self._submit(_in_tenant(payload, advisor.compare_architectures), arch1, arch2, context)
+        return {"comparison": comparison}
+
+    async def handle_retrieve(self, payload: Dict) -> Dict:
+        self._require_ready()
+        query = _require(payload, "query")
+        n_results = _n_results(payload)
+        context, citations = await self._submit(_in_tenant(payload, advisor.retrieve_context_with_citations),
+                                                query, n_results)
+        return {"context": context, "citations": citations}
+
+    async def handle_ingest(self, payload: Dict) -> Dict:
+        self._require_ready()
+        topic = _string(payload, "topic", "uploaded")
+        domain = _string(payload, "domain", "telecom")
+        if payload.get("documents"):
+            documents = _list_of(payload, "documents", str, "strings")
+            metadata = None
+            if payload.get("metadata") is not None:
+                metadata = _list_of(payload, "metadata", dict, "objects")
+                if len(metadata) != len(documents):
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, "'metadata' must match 'documents' in length")
+            def _ingest():
+                return advisor.add_knowledge_to_db(documents, metadata), advisor.kb_chunk_count()
+        elif payload.get("paths"):
+            paths = _ingest_paths(payload)
+            def _ingest():
+                total = 0
+                for path in paths:
+                    if os.path.isdir(path):
+                        total += advisor.upload_directory(path, topic, domain)
+                    else:
+                        total += advisor.upload_multiple_files([path], topic, domain)
+                return total, advisor.kb_chunk_count()
+        else:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Provide either 'documents' or 'paths'")
+        chunks, total_chunks = await self._submit(_in_tenant(payload, _ingest))
+        return {"chunks_added": chunks, "total_chunks": total_chunks}
+
+    async def handle_submit_job(self, payload: Dict) -> Dict:
+        name = _require(payload, "name")
+        try:
+            data = base64.b64decode(_require(payload, "content_base64"), validate=True)
+        except (binascii.Error, ValueError):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'content_base64' must be base64")
+        topic = payload.get("topic", "uploaded")
+        domain = payload.get("domain", "telecom")
+        try:
+            # Hashing and the duplicate check are quick; the ingestion itself runs on the job queue
+            job_id = await self._submit(_in_tenant(payload, advisor.submit_upload), name, data, topic, domain)
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+        if job_id is None:
+            return {"job": None, "already_indexed": True}
+        return {"job": advisor.ingestion_jobs.get(job_id), "already_indexed": False}
+
+    async def handle_jobs(self, payload: Dict) -> Dict:
+        return {"jobs": advisor.ingestion_jobs.jobs(owner=_tenant(payload))}
+
+    async def handle_cancel_job(self, payload: Dict) -> Dict:
+        job_id = _require(payload, "id")
+        tenant = _tenant(payload)
+        if advisor.ingestion_jobs.get(job_id, owner=tenant) is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No job {job_id}")
+        return {"cancelled": advisor.ingestion_jobs.cancel(job_id, owner=tenant),
+                "job": advisor.ingestion_jobs.get(job_id, owner=tenant)}
+
+    async def handle_analytics(self, payload: Dict) -> Dict:
+        return await self._submit(advisor.load_analytics)
+
+    async def handle_stats(self, payload: Dict) -> Dict:
+        stats = advisor.resilience_stats()
+        stats["worker_pool"] = {
+            "workers": self.workers,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+        }
+        stats["startup"] = startup_report()
+        stats["watcher"] = advisor.watcher_stats()
+        stats["shards"] = advisor.shard_stats()
+        stats["ingestion_jobs"] = advisor.ingestion_jobs.stats()
+        stats["extraction_cache"] = advisor.extraction_cache.stats() if advisor.extraction_cache else None
+        stats["warmup"] = advisor.warmup_stats()
+        return stats
+
+    async def handle_memory(self, payload: Dict) -> Dict:
+        # Snapshots are slow with many live allocations; keep them off the event loop
+        return await self._submit(advisor.memory_diagnostics.report)
+
+    async def handle_metrics(self, payload: Dict) -> Tuple[bytes, str]:
+        return render_metrics()
+
+    async def handle_advise_stream(self, payload: Dict, writer: asyncio.StreamWriter) -> None:
+        """Stream an answer as server-sent events: citations, token*, then done."""
+        self._require_ready()
+        question = _require(payload, "question")
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+        stream_advice = _in_tenant(payload, advisor.stream_architecture_advice_with_rag)
+        # Validated before the 200 headers go out
+        deadline = _deadline(payload)
+        use_rag = _flag(payload, "use_rag", True)
+        include_citations = _flag(payload, "include_citations", True)
+        conversation = _conversation(payload)
+
+        def _emit(item):
+            loop.call_soon_threadsafe(events.put_nowait, item)
+
+        def _produce():
+            try:
+                chunks, context, citations = stream_advice(
+                    question,
+                    use_rag=use_rag,
+                    include_citations=include_citations,
+                    conversation_context=conversation,
+                    deadline=deadline,
+                )
+                _emit(("citations", {"context": context, "citations": citations}))
+                for text in chunks:
+                    if cancelled.is_set():
+                        chunks.close()
+                        break
+                    _emit(("token", {"text": text}))
+            except Exception as e:
+                logger.exception(f"Streaming request failed: {e}")
+                _emit(("error", {"error": str(e)}))
+            finally:
+                _emit(None)
+
+        self._submit(_produce)
+        writer.write(self._head(HTTPStatus.OK, {
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+        }, keep_alive=False))
+        try:
+            while True:
+                item = await events.get()
+                if item is None:
+                    break
+                event, data = item
+                writer.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+                await writer.drain()
+            writer.write(b"event: done\ndata: {}\n\n")
+            await writer.drain()
+        except ConnectionError:
+            logger.info("Client disconnected from stream")
+            cancelled.set()
+
+    # --- HTTP plumbing ---
+
+    @staticmethod
+    def _head(status: HTTPStatus, headers: Dict[str, str], keep_alive: bool) -> bytes:
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: HTTPStatus, payload: Dict,
+                         keep_alive: bool, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        all_headers = {"Content-Type": "application/json", "Content-Length": str(len(body))}
+        all_headers.update(headers or {})
+        writer.write(self._head(status, all_headers, keep_alive) + body)
+        await writer.drain()
+
+    async def _dispatch(self, method: str, path: str, body: bytes,
+                        writer: asyncio.StreamWriter, keep_alive: bool, tenant: Optional[str] = None) -> bool:
+        """Route one request. Returns whether the connection may be reused."""
+        try:
+            try:
+                payload = json.loads(body) if body else {}
+            except json.JSONDecodeError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be valid JSON")
+            if not isinstance(payload, dict):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+            if tenant:
+                payload.setdefault("tenant", tenant)
+
+            key = (method, path)
+            if key in self.stream_routes:
+                await self.stream_routes[key](payload, writer)
+                return False
+            if key in self.routes:
+                result = await self.routes[key](payload)
+                await self._send_json(writer, HTTPStatus.OK, result, keep_alive)
+                return keep_alive
+            if key in self.raw_routes:
+                body, content_type = await self.raw_routes[key](payload)
+                headers = {"Content-Type": content_type, "Content-Length": str(len(body))}
+                writer.write(self._head(HTTPStatus.OK, headers, keep_alive) + body)
+                await writer.drain()
+                return keep_alive
+            all_routes = list(self.routes) + list(self.stream_routes) + list(self.raw_routes)
+            if any(route_path == path for _, route_path in all_routes):
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} not allowed on {path}")
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {path}")
+        except HTTPError as e:
+            await self._send_json(writer, e.status, {"error": e.message}, keep_alive, e.headers)
+            return keep_alive
+        except ConnectionError:
+            return False
+        except Exception as e:
+            logger.exception(f"Unhandled error serving {method} {path}: {e}")
+            await self._send_json(writer, HTTPStatus.INTERNAL_SERVER_ERROR,
+                                  {"error": "Internal server error"}, keep_alive=False)
+            return False
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                parts = request_line.decode("latin-1").rstrip("\r\n").split(" ")
+                if len(parts) != 3:
+                    await self._send_json(writer, HTTPStatus.BAD_REQUEST,
+                                          {"error": "Malformed request line"}, keep_alive=False)
+                    break
+                method, target, version = parts
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                path = urlsplit(target).path.rstrip("/") or "/"
+                length = int(headers.get("content-length") or 0)
+                if length > (MAX_UPLOAD_BYTES if path == "/ingest/jobs" else MAX_BODY_BYTES):
+                    await self._send_json(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                          {"error": "Request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if not await self._dispatch(method.upper(), path, body, writer, keep_alive,
+                                            tenant=headers.get("x-tenant")):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self) -> None:
+        """Start listening and serve until cancelled."""
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        logger.info(f"Advisor API listening on http://{self.host}:{self.port} "
+                    f"({self.workers} workers, queue {self.max_queue})")
+        asyncio.create_task(self._warm_up())
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Telecom Architecture Advisor HTTP API")
+    parser.add_argument("--host", default=SERVER_HOST, help="Interface to bind")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Port to listen on")
+    parser.add_argument("--workers", type=int, default=WORKER_COUNT, help="Worker pool size")
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE_DEPTH,
+                        help="Requests allowed to wait for a worker before returning 503")
+    parser.add_argument("--skip-init", action="store_true",
+                        help="Serve the existing index without loading knowledge sources")
+    args = parser.parse_args()
+
+    server = AdvisorServer(args.host, args.port, args.workers, args.max_queue,
+                           initialize=not args.skip_init)
+    print(f"🚀 Advisor API on http://{args.host}:{args.port}  (Ctrl+C to stop)")
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        print("\n👋 Shutting down gracefully...")
+    finally:
+        server.executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Sharded knowledge base for the Telecom Architecture Advisor.
+
+By default every chunk lives in the single telecom_knowledge collection. With
+SHARD_KEY set (e.g. SHARD_KEY=domain), ShardSet keeps one ChromaDB collection
+per value of that metadata key instead (telecom_knowledge.architecture,
+telecom_knowledge.compliance, ...), each with its own lexical index:
+
+- Queries filtered on the shard key (where={"domain": "compliance"}) search
+  only the matching shard, so their cost follows the shard's size, not the
+  corpus's
+- Other queries fan out across the shards on a thread pool; the advisor merges
+  the per-shard top-k lists (semantic hits by distance, BM25 hits by score)
+- Every shard has its own ReadWriteLock, so ingesting into one shard doesn't
+  hold up queries or ingestion in the others
+
+BM25 statistics (idf, average chunk length) are per shard, as in other
+sharded search engines, so keyword scores from different shards are only
+approximately comparable; semantic distances are exact.
+
+Unsharded, the advisor treats its one collection as a single Shard, so both
+modes share one code path.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from telecom_advisor_index import LexicalIndex, ReadWriteLock, get_all
+
+logger = logging.getLogger(__name__)
+
+_ADD_BATCH = 5000
+
+
+class Shard:
+    """
+    One collection with its own lexical index and lock.
+
+    Queries read under `lock`; index updates write under it, so each becomes
+    visible all at once.
+
+    Args:
+        name: Collection name
+        collection: ChromaDB collection
+        value: Shard-key value the shard holds (None when unsharded)
+    """
+
+    def __init__(self, name: str, collection, value: Optional[str] = None):
+        self.name = name
+        self.collection = collection
+        self.value = value
+        self.lock = ReadWriteLock()
+        self._index: Optional[LexicalIndex] = None
+        self._generation = 0  # bumped by every in-process write, so an index built mid-write is never reused
+        self._index_lock = threading.Lock()
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def _key(self) -> Tuple:
+        return self.collection.id, self.collection.count(), self._generation
+
+    def lexical_index(self) -> LexicalIndex:
+        """
+        BM25 index and chunk store for the shard's collection, rebuilt only when it changes.
+
+        Writes through the advisor invalidate it directly; writes from other
+        processes sharing ./chroma_db are noticed through the chunk count.
+        """
+        key = self._key()
+        index = self._index
+        if index is not None and index.key == key:
+            return index
+        with self._index_lock:
+            index = self._index
+            if index is None or index.key != key:
+                index = LexicalIndex.from_collection(self.collection, key=key)
+                self._index = index
+        return index
+
+    def has_file_hash(self, file_hash: str, source_path: Optional[str] = None) -> bool:
+        """
+        Whether the shard holds a chunk of a document with this content hash.
+
+        A filtered lookup of one id, so it never loads the chunks or builds the
+        lexical index; `source_path` limits it to chunks loaded from that path.
+        """
+        where = {"file_hash": file_hash}
+        if source_path is not None:
+            where = {"$and": [where, {"source_path": source_path}]}
+        return bool(self.collection.get(where=where, limit=1, include=[])["ids"])
+
+    def version(self) -> Tuple:
+        """Changes whenever the shard's contents do, for keying results derived from them."""
+        return self._key()
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._index = None
+
+    def adopt(self, index: LexicalIndex) -> None:
+        """Use a lexical index built elsewhere (e.g. restored from a snapshot) for the current contents."""
+        self.invalidate()
+        index.key = self._key()
+        self._index = index
+
+    def __repr__(self) -> str:
+        return f"Shard({self.name!r})"
+
+
+def _collection_name(base_name: str, value: str) -> str:
+    """Collection name for a shard value, within ChromaDB's naming rules ([A-Za-z0-9._-], alphanumeric ends)."""
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "-", value).strip("-_")
+    if slug != value or not slug:
+        slug = f"{slug}-{hashlib.sha1(value.encode()).hexdigest()[:8]}".strip("-")
+    return f"{base_name}.{slug}"
+
+
+class ShardSet:
+    """
+    A knowledge base split into one collection per value of a metadata key.
+
+    Shards are created on first write and found again at startup through their
+    collection metadata. The set also quacks like a collection (count, get,
+    add), so snapshots can be built from and restored into it.
+
+    Args:
+        client: ChromaDB client
+        embedding_function: Embedding function of every shard collection
+        base_name: Collection name prefix (shard collections are "<base_name>.<value>")
+        key: Metadata key chunks are sharded by
+        default: Shard for chunks without the key
+        workers: Threads used to fan queries out across shards
+        pool: Executor to fan queries out on instead of a pool of its own
+            (tenants' shard sets share one)
+    """
+
+    def __init__(self, client, embedding_function, base_name: str, key: str,
+                 default: str = "general", workers: int = 8, pool: Optional[ThreadPoolExecutor] = None):
+        self.client = client
+        self.embedding_function = embedding_function
+        self.base_name = base_name
+        self.key = key
+        self.default = default
+        self.pool = pool or ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard")
+        self._shards: Dict[str, Shard] = {}
+        self._lock = threading.Lock()
+        for found in client.list_collections():
+            metadata = found.metadata or {}
+            if metadata.get("shard_key") == key and found.name.startswith(base_name + "."):
+                collection = client.get_collection(found.name, embedding_function=embedding_function)
+                self._shards[metadata["shard_value"]] = Shard(found.name, collection, metadata["shard_value"])
+        logger.info("Knowledge base sharded by %s: %d shard(s)", key, len(self._shards))
+
+    def value_of(self, metadata: Dict) -> str:
+        """The shard a chunk with this metadata belongs in."""
+        value = metadata.get(self.key)
+        return str(value) if value not in (None, "") else self.default
+
+    def shard(self, value: str, create: bool = True) -> Optional[Shard]:
+        shard = self._shards.get(value)
+        if shard is None and create:
+            with self._lock:
+                shard = self._shards.get(value)
+                if shard is None:
+                    name = _collection_name(self.base_name, value)
+                    collection = self.client.get_or_create_collection(
+                        name=name,
+                        embedding_function=self.embedding_function,
+                        metadata={"shard_key": self.key, "shard_value": value}
+                    )
+                    shard = self._shards[value] = Shard(name, collection, value)
+                    logger.info("Created shard %s", name)
+        return shard
+
+    def shards(self) -> List[Shard]:
+        return [self._shards[value] for value in sorted(self._shards)]
+
+    def route(self, where: Optional[Dict]) -> Optional[List[str]]:
+        """
+        Shard values a Chroma `where` filter restricts the shard key to.
+
+        Returns:
+            The values ({"domain": "x"}, {"domain": {"$in": [...]}}, also inside
+            $and / $or), or None if the filter doesn't pin the key and every
+            shard has to be searched
+        """
+        if not where:
+            return None
+        routed: Optional[set] = None
+        for field, condition in where.items():
+            values = None
+            if field == "$and":
+                for clause in condition:
+                    clause_values = self.route(clause)
+                    if clause_values is not None:
+                        values = set(clause_values) if values is None else values & set(clause_values)
+            elif field == "$or":
+                branches = [self.route(clause) for clause in condition]
+                if branches and all(branch is not None for branch in branches):
+                    values = {value for branch in branches for value in branch}
+            elif field == self.key:
+                if not isinstance(condition, dict):
+                    values = {str(condition)}
+                elif "$eq" in condition:
+                    values = {str(condition["$eq"])}
+                elif "$in" in condition:
+                    values = {str(value) for value in condition["$in"]}
+            if values is not None:
+                routed = values if routed is None else routed & values
+        return sorted(routed) if routed is not None else None
+
+    # --- Collection-like interface (snapshots, migration) ---
+
+    def count(self) -> int:
+        return sum(shard.count() for shard in self.shards())
+
+    def get(self, include: List[str], limit: Optional[int] = None, offset: int = 0) -> Dict[str, list]:
+        """Chunks of every shard, concatenated in shard order (paged like Collection.get)."""
+        merged: Dict[str, list] = {"ids": [], **{field: [] for field in include}}
+        for shard in self.shards():
+            count = shard.count()
+            if offset >= count:
+                offset -= count
+                continue
+            if limit is None:
+                data = get_all(shard.collection, include) if not offset else \
+                    shard.collection.get(include=include, offset=offset, limit=count - offset)
+            else:
+                wanted = limit - len(merged["ids"])
+                if wanted <= 0:
+                    break
+                data = shard.collection.get(include=include, limit=wanted, offset=offset)
+            offset = 0
+            merged["ids"].extend(data["ids"])
+            for field in include:
+                merged[field].extend(data[field] if data[field] is not None else [])
+        return merged
+
+    def add(self, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict]) -> None:
+        """Store chunks with precomputed embeddings in their shards."""
+        groups: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            groups.setdefault(self.value_of(metadata), []).append(i)
+        for value, members in groups.items():
+            shard = self.shard(value)
+            for start in range(0, len(members), _ADD_BATCH):
+                batch = members[start:start + _ADD_BATCH]
+                with shard.lock.write():
+                    shard.collection.add(ids=[ids[i] for i in batch],
+                                         embeddings=[embeddings[i] for i in batch],
+                                         documents=[documents[i] for i in batch],
+                                         metadatas=[metadatas[i] for i in batch])
+                    shard.invalidate()
+
+    def import_collection(self, collection) -> int:
+        """Copy an unsharded collection's chunks, with their stored vectors, into the shards."""
+        data = get_all(collection, ["documents", "metadatas", "embeddings"])
+        self.add(data["ids"], data["embeddings"], data["documents"], [meta or {} for meta in data["metadatas"]])
+        return len(data["ids"])
+
+    def stats(self) -> Dict[str, int]:
+        """Chunks per shard value."""
+        return {shard.value: shard.count() for shard in self.shards()}
@@ -0,0 +1,191 @@
+"""
+In-flight request coalescing ("singleflight") for the Telecom Architecture Advisor.
+
+When several callers ask for the same thing at the same time, only the first
+(the leader) does the work; the others attach to the in-flight computation and
+receive the same result or exception. Nothing is cached: once the leader
+finishes, the next request with the same key starts a fresh computation.
+
+Streamed results are fanned out to every attached caller. Late joiners first
+replay the fragments produced so far, then follow the live stream.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+from typing import Callable, Dict, Hashable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a question for coalescing: case, whitespace and trailing punctuation."""
+    return re.sub(r"\s+", " ", prompt).strip().lower().rstrip("?!. ")
+
+
+def fingerprint(*parts: str) -> str:
+    """Stable short digest of the given strings (e.g. retrieved context, history)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class _Call:
+    """A single in-flight computation shared by a leader and its followers."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class _Broadcast:
+    """Buffered fan-out of a streamed result to any number of subscribers."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+        self._cond = threading.Condition()
+
+    def publish(self, chunk: str) -> None:
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self.finished = True
+            self.error = error
+            self._cond.notify_all()
+
+    def subscribe(self) -> Iterator[str]:
+        position = 0
+        while True:
+            with self._cond:
+                while position >= len(self.chunks) and not self.finished:
+                    self._cond.wait()
+                pending = self.chunks[position:]
+                finished = self.finished
+                error = self.error
+            for chunk in pending:
+                yield chunk
+            position += len(pending)
+            if finished and position >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key.
+
+    Args:
+        name: Label used in logs and stats
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key: Hashable, fn: Callable, timeout: Optional[float] = None):
+        """
+        Run fn() once for all concurrent callers with the same key.
+
+        Args:
+            key: Identity of the computation
+            fn: Zero-argument callable run by the leader
+            timeout: Longest a follower waits for the leader before raising TimeoutError
+
+        Returns:
+            The leader's result; the leader's exception is re-raised for every caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self.followers += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            logger.debug("[%s] attached to in-flight call", self.name)
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"[{self.name}] timed out waiting for in-flight call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.followers:
+                logger.info("[%s] shared one result with %d coalesced caller(s)", self.name, call.followers)
+            call.done.set()
+
+    def stream(self, key: Hashable, factory: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """
+        Fan out one streamed computation to all concurrent callers with the same key.
+
+        The source iterator is drained on a background thread so that a caller
+        disconnecting early does not stall the others.
+
+        Returns:
+            Iterator over the stream's fragments, replaying any already produced
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is not None:
+                broadcast.followers += 1
+                self.followers += 1
+                logger.debug("[%s] attached to in-flight stream", self.name)
+                return broadcast.subscribe()
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            self.leaders += 1
+
+        def _pump():
+            error = None
+            try:
+                for chunk in factory():
+                    broadcast.publish(chunk)
+            except BaseException as e:
+                error = e
+            finally:
+                with self._lock:
+                    del self._streams[key]
+                if broadcast.followers:
+                    logger.info("[%s] streamed one result to %d callers", self.name, broadcast.followers + 1)
+                broadcast.finish(error)
+
+        threading.Thread(target=_pump, name=f"{self.name}-stream", daemon=True).start()
+        return broadcast.subscribe()
+
+    def stats(self) -> Dict[str, int]:
+        """Counts of computations started (leaders) and callers that were coalesced (followers)."""
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "followers": self.followers,
+                "in_flight": len(self._calls) + len(self._streams),
+            }
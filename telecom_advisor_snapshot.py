@@ -0,0 +1,250 @@
+"""
+Knowledge-base snapshots for the Telecom Architecture Advisor.
+
+A snapshot is one uncompressed tar file, built once (e.g. in CI) and restored
+by every new pod instead of re-parsing, re-chunking and re-embedding the
+knowledge sources. Members, written and read in this order:
+
+- manifest.json   - format version, embedding model and dimension, chunk and
+                    document counts, and the SHA-256 and size of every member
+- embeddings.npy  - float32 matrix, one row per chunk
+- chunks.jsonl    - chunk store: {"id", "document", "metadata"} per line, in row order
+- lexical.json    - BM25 statistics, so the lexical index needn't be rebuilt
+- registry.json   - ingested documents keyed by file hash
+
+Restore reads the tar front to back, verifies every checksum, refuses
+snapshots built with a different embedding model or format version, and bulk
+loads the stored vectors into the collection (nothing is re-embedded).
+
+Usage:
+    python telecom_advisor_snapshot.py build kb_snapshot.tar   # from ./chroma_db (initializes it if empty)
+    python telecom_advisor_snapshot.py verify kb_snapshot.tar
+    SNAPSHOT_PATH=kb_snapshot.tar streamlit run streamlit_app.py
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+import tarfile
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from telecom_advisor_index import LexicalIndex, get_all
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+MEMBERS = ("embeddings.npy", "chunks.jsonl", "lexical.json", "registry.json")
+_ADD_BATCH = 5000
+
+
+class SnapshotError(Exception):
+    """The snapshot is unreadable, corrupt, or incompatible with this advisor."""
+
+
+def _add_member(tar: tarfile.TarFile, name: str, payload: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(payload)
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(payload))
+
+
+def build_snapshot(collection, path: str, embedding_model: str, extra: Optional[Dict] = None) -> Dict:
+    """
+    Write the collection's vectors, chunks, lexical index and document registry to path.
+
+    The file is written next to path and renamed into place, so a reader never
+    sees a partial snapshot.
+
+    Returns:
+        The manifest
+    """
+    data = get_all(collection, ["documents", "metadatas", "embeddings"])
+    ids: List[str] = list(data["ids"])
+    if not ids:
+        raise SnapshotError("Collection is empty; nothing to snapshot")
+    embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+    index = LexicalIndex(ids, list(data["documents"]), list(data["metadatas"]))
+
+    buffer = io.BytesIO()
+    np.save(buffer, embeddings, allow_pickle=False)
+    chunks = "".join(json.dumps({"id": chunk_id, "document": doc, "metadata": meta}, ensure_ascii=False) + "\n"
+                     for chunk_id, doc, meta in zip(index.ids, index.documents, index.metadatas))
+    registry = index.registry()
+    payloads = {
+        "embeddings.npy": buffer.getvalue(),
+        "chunks.jsonl": chunks.encode("utf-8"),
+        "lexical.json": json.dumps(index.bm25_state()).encode("utf-8"),
+        "registry.json": json.dumps(registry, ensure_ascii=False).encode("utf-8"),
+    }
+    checksums = {name: {"sha256": hashlib.sha256(payload).hexdigest(), "bytes": len(payload)}
+                 for name, payload in payloads.items()}
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "snapshot_id": hashlib.sha256("".join(c["sha256"] for c in checksums.values()).encode()).hexdigest()[:16],
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "embedding_model": embedding_model,
+        "embedding_dim": int(embeddings.shape[1]),
+        "chunks": len(ids),
+        "documents": len(registry),
+        "members": checksums,
+        **(extra or {}),
+    }
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".snapshot_", suffix=".tar", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f, tarfile.open(fileobj=f, mode="w", format=tarfile.PAX_FORMAT) as tar:
+            _add_member(tar, "manifest.json", json.dumps(manifest, indent=2).encode("utf-8"))
+            for name in MEMBERS:
+                _add_member(tar, name, payloads[name])
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    logger.info("Snapshot %s written to %s (%d chunks, %d documents)",
+                manifest["snapshot_id"], path, len(ids), len(registry))
+    return manifest
+
+
+def _read_members(path: str) -> Iterator[Tuple[str, bytes]]:
+    try:
+        with tarfile.open(path, mode="r:") as tar:
+            for member in tar:
+                f = tar.extractfile(member)
+                if f is not None:
+                    yield member.name, f.read()
+    except (OSError, tarfile.TarError) as e:
+        raise SnapshotError(f"Cannot read snapshot {path}: {e}") from e
+
+
+def _parse_manifest(path: str, payload: bytes) -> Dict:
+    """Decode manifest.json (no checksum covers it) and check its version and the fields restore uses."""
+    try:
+        manifest = json.loads(payload)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise SnapshotError(f"Corrupt manifest in {path}: {e}") from e
+    if not isinstance(manifest, dict):
+        raise SnapshotError(f"Corrupt manifest in {path}: not a JSON object")
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(f"Snapshot format {manifest.get('format_version')} is not supported "
+                            f"(expected {SNAPSHOT_FORMAT_VERSION})")
+    members = manifest.get("members")
+    if not isinstance(members, dict) or not all(
+            isinstance(entry, dict) and isinstance(entry.get("sha256"), str) for entry in members.values()):
+        raise SnapshotError(f"Corrupt manifest in {path}: bad member checksums")
+    for field, kind in (("snapshot_id", str), ("chunks", int), ("documents", int)):
+        if not isinstance(manifest.get(field), kind):
+            raise SnapshotError(f"Corrupt manifest in {path}: missing or invalid {field!r}")
+    return manifest
+
+
+def read_snapshot(path: str, embedding_model: Optional[str] = None) -> Tuple[Dict, Dict[str, bytes]]:
+    """
+    Read and validate a snapshot in one sequential pass.
+
+    Args:
+        path: Snapshot file
+        embedding_model: If given, the model the snapshot must have been built with
+
+    Returns:
+        (manifest, member payloads)
+
+    Raises:
+        SnapshotError: Unreadable, corrupt manifest, wrong format version, wrong embedding model,
+            or a checksum mismatch
+    """
+    members = _read_members(path)
+    name, payload = next(members, (None, b""))
+    if name != "manifest.json":
+        raise SnapshotError(f"{path} is not an advisor snapshot (no leading manifest.json)")
+    manifest = _parse_manifest(path, payload)
+    # Checked before reading the bulk of the file: vectors from another model are meaningless here
+    if embedding_model is not None and manifest.get("embedding_model") != embedding_model:
+        raise SnapshotError(f"Snapshot was built with embedding model {manifest.get('embedding_model')!r}, "
+                            f"this advisor uses {embedding_model!r}")
+
+    payloads: Dict[str, bytes] = {}
+    for name, payload in members:
+        expected = manifest["members"].get(name)
+        if expected is None:
+            continue
+        if hashlib.sha256(payload).hexdigest() != expected["sha256"]:
+            raise SnapshotError(f"Checksum mismatch for {name} in {path}")
+        payloads[name] = payload
+    missing = set(manifest["members"]) - set(payloads)
+    if missing:
+        raise SnapshotError(f"Snapshot {path} is missing {', '.join(sorted(missing))}")
+    return manifest, payloads
+
+
+def restore_snapshot(path: str, collection, embedding_model: str) -> Tuple[Dict, LexicalIndex]:
+    """
+    Load a validated snapshot into an (empty) collection.
+
+    Returns:
+        (manifest, lexical index over the restored chunks)
+    """
+    manifest, payloads = read_snapshot(path, embedding_model)
+    embeddings = np.load(io.BytesIO(payloads["embeddings.npy"]), allow_pickle=False)
+    records = [json.loads(line) for line in payloads["chunks.jsonl"].decode("utf-8").splitlines() if line]
+    if len(records) != len(embeddings) or len(records) != manifest["chunks"]:
+        raise SnapshotError(f"Snapshot {path} has {len(records)} chunks and {len(embeddings)} vectors, "
+                            f"manifest says {manifest['chunks']}")
+    ids = [record["id"] for record in records]
+    documents = [record["document"] for record in records]
+    metadatas = [record["metadata"] for record in records]
+
+    for start in range(0, len(ids), _ADD_BATCH):
+        end = start + _ADD_BATCH
+        collection.add(ids=ids[start:end], embeddings=embeddings[start:end],
+                       documents=documents[start:end], metadatas=metadatas[start:end])
+    index = LexicalIndex.from_state(ids, documents, metadatas, json.loads(payloads["lexical.json"]))
+    logger.info("Restored snapshot %s from %s (%d chunks)", manifest["snapshot_id"], path, len(ids))
+    return manifest, index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or verify knowledge-base snapshots")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Snapshot ./chroma_db (initializing the knowledge base if it is empty)")
+    build.add_argument("output", help="Snapshot file to write, e.g. kb_snapshot.tar")
+    verify = sub.add_parser("verify", help="Check a snapshot's checksums and print its manifest")
+    verify.add_argument("path")
+    verify.add_argument("--embedding-model", help="Also require this embedding model")
+    args = parser.parse_args()
+
+    if args.command == "verify":
+        try:
+            manifest, _ = read_snapshot(args.path, args.embedding_model)
+        except SnapshotError as e:
+            print(f"✗ {e}")
+            sys.exit(1)
+        print(json.dumps(manifest, indent=2))
+        print(f"\n✓ Snapshot {manifest['snapshot_id']} is valid")
+        return
+
+    import telecom_advisor_enhanced as advisor
+    if advisor.kb_chunk_count() == 0:
+        advisor.initialize_knowledge_base()
+    start = time.perf_counter()
+    # A sharded knowledge base is snapshotted as one; restore redistributes the chunks by SHARD_KEY
+    store = advisor.shard_set if advisor.shard_set is not None else advisor.collection
+    manifest = build_snapshot(store, args.output, advisor.EMBEDDING_MODEL,
+                              extra={"chunk_size": advisor.CHUNK_SIZE})
+    print(f"✓ Snapshot {manifest['snapshot_id']} written to {args.output}: {manifest['chunks']} chunks, "
+          f"{manifest['documents']} documents, {os.path.getsize(args.output) / 1e6:.1f} MB "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Cold-start timing for the Telecom Architecture Advisor.
+
+Startup is split into phases recorded in STARTUP_TIMINGS (seconds):
+
+- import      - third-party and advisor modules imported by telecom_advisor_enhanced
+- model_load  - embedding model load (torch backend: imports torch and loads MiniLM;
+                onnx backend: ONNX Runtime session)
+- index_open  - ChromaDB persistent client and collection
+- kb_sync     - initialize_knowledge_base(): seed files and knowledge_sources.json
+- warm_up     - first retrieval (HTTP API server only)
+- cache_warmup - waiting for frequent past questions to be prefetched
+                (telecom_advisor_warmup; HTTP API server only)
+
+Each entry point calls mark_ready() once it can serve; that logs the phase
+breakdown and the total since this module was first imported, and warns when
+the total exceeds the startup budget. benchmarks/startup_check.py runs the
+entry points in fresh processes and fails when they exceed the budget.
+
+This module is imported before anything heavy, so it only uses the standard
+library.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+STARTED = time.perf_counter()
+STARTUP_TIMINGS: Dict[str, float] = {}
+
+_lock = threading.Lock()
+_ready: Dict[str, object] = {}
+
+
+def record_phase(phase: str, seconds: float) -> None:
+    """Add seconds to a startup phase (ignored once the process is ready)."""
+    with _lock:
+        if not _ready:
+            STARTUP_TIMINGS[phase] = STARTUP_TIMINGS.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def startup_phase(phase: str) -> Iterator[None]:
+    """Time the enclosed block as part of a startup phase."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - start)
+
+
+def startup_report() -> Dict:
+    """Phase timings, total and budget verdict (total so far if not ready yet)."""
+    with _lock:
+        phases = {phase: round(seconds, 3) for phase, seconds in STARTUP_TIMINGS.items()}
+        total = _ready.get("total", time.perf_counter() - STARTED)
+        entry_point = _ready.get("entry_point")
+        budget = _ready.get("budget")
+    # Time outside the named phases: entry-point imports, UI setup, interpreter work
+    phases["other"] = round(max(0.0, total - sum(phases.values())), 3)
+    return {
+        "entry_point": entry_point,
+        "ready": entry_point is not None,
+        "total_seconds": round(total, 3),
+        "phases": phases,
+        "budget_seconds": budget,
+        "within_budget": None if not budget else total <= budget,
+    }
+
+
+def mark_ready(entry_point: str, budget: Optional[float] = None) -> Dict:
+    """
+    Record that startup finished; only the first call per process counts.
+
+    Args:
+        entry_point: "cli", "streamlit", "server", ...
+        budget: Seconds allowed for startup (None or 0 = no budget)
+
+    Returns:
+        startup_report()
+    """
+    with _lock:
+        first = not _ready
+        if first:
+            _ready.update(entry_point=entry_point, budget=budget or None,
+                          total=time.perf_counter() - STARTED)
+    report = startup_report()
+    if first:
+        phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in report["phases"].items())
+        logger.info("Startup (%s) ready in %.2f s: %s", entry_point, report["total_seconds"], phases,
+                    extra={"startup": report})
+        if report["within_budget"] is False:
+            logger.warning("Startup took %.2f s, over the %.1f s budget", report["total_seconds"], budget)
+    return report
@@ -0,0 +1,197 @@
+"""
+Tenant-scoped knowledge bases for the Telecom Architecture Advisor.
+
+Without a tenant, requests use the shared telecom_knowledge collection as
+before. A request can instead name a tenant (billing, oss, network, ...),
+which selects that team's own knowledge base:
+
+- its own ChromaDB collection, "tenant-<name>" (or, with SHARD_KEY set, its
+  own shards "tenant-<name>.<value>"), in the same ./chroma_db
+- its own lexical indexes, built from that collection only
+- its own comparison cache
+
+The tenant travels with the request in a context variable (see tenant_scope),
+so retrieval, ingestion and caching deep in the call stack pick the right
+knowledge base without passing it through every function. Coalescing keys
+include the tenant, so one tenant's callers never receive another's results.
+
+TenantRegistry keeps at most `max_open` tenants open, least recently used
+first out, and opens cold tenants lazily on their next request. Evicting a
+tenant drops its lexical indexes and caches - the bulk of a tenant's resident
+memory besides its vector indexes, which ChromaDB's own LRU bounds (see
+CHROMA_MEMORY_LIMIT_MB) - while its chunks stay on disk. The embedding model is shared by all
+tenants, so it is loaded once regardless of how many are open.
+"""
+
+import contextvars
+import logging
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from telecom_advisor_cache import TTLCache
+from telecom_advisor_shards import Shard, ShardSet
+
+logger = logging.getLogger(__name__)
+
+_TENANT_NAME = re.compile(r"^[a-z0-9][a-z0-9_-]{0,39}$")
+
+_current_tenant: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("tenant", default=None)
+
+
+class TenantError(ValueError):
+    """A tenant name that can't be used."""
+
+
+def validate_tenant(name: str) -> str:
+    """Return a usable tenant name: lowercase letters, digits, '-' and '_', at most 40 characters."""
+    if not isinstance(name, str) or not _TENANT_NAME.match(name):
+        raise TenantError(f"Invalid tenant {name!r}: use 1-40 lowercase letters, digits, '-' or '_'")
+    return name
+
+
+def current_tenant() -> Optional[str]:
+    """Tenant of the current request (None = the shared knowledge base)."""
+    return _current_tenant.get()
+
+
+@contextmanager
+def tenant_scope(name: Optional[str]) -> Iterator[None]:
+    """Run the enclosed block against a tenant's knowledge base (None = the shared one)."""
+    token = _current_tenant.set(validate_tenant(name) if name else None)
+    try:
+        yield
+    finally:
+        _current_tenant.reset(token)
+
+
+def use_tenant(name: Optional[str]) -> None:
+    """Select a tenant for the rest of the current context, for single-user loops (the CLI, a Streamlit script run)."""
+    _current_tenant.set(validate_tenant(name) if name else None)
+
+
+def tenant_collection_name(name: str) -> str:
+    return f"tenant-{name}"
+
+
+class TenantKnowledgeBase:
+    """
+    One tenant's collection (or shards), lexical indexes and caches.
+
+    Args:
+        name: Tenant name
+        collection: The tenant's collection, used when not sharded
+        shard_set: The tenant's shards (None when not sharded)
+        compare_cache: Cache of the tenant's generated comparisons
+    """
+
+    def __init__(self, name: str, collection, shard_set: Optional[ShardSet], compare_cache: TTLCache):
+        self.name = name
+        self.collection = collection
+        self.shard_set = shard_set
+        self.compare_cache = compare_cache
+        self._shard = Shard(collection.name, collection) if collection is not None else None
+
+    def shards(self) -> List[Shard]:
+        if self.shard_set is not None:
+            return self.shard_set.shards()
+        return [self._shard]
+
+    def count(self) -> int:
+        return sum(shard.count() for shard in self.shards())
+
+    def close(self) -> None:
+        """Drop the resident lexical indexes and cached answers; the chunks stay in ChromaDB."""
+        for shard in self.shards():
+            shard.invalidate()
+        self.compare_cache.clear()
+
+    def __repr__(self) -> str:
+        return f"TenantKnowledgeBase({self.name!r})"
+
+
+class TenantRegistry:
+    """
+    Bounded LRU of open tenant knowledge bases.
+
+    Args:
+        open_tenant: Opens a tenant's knowledge base by name
+        max_open: Tenants kept open before the least recently used is closed
+        on_close: Called with a tenant's name after it is closed, to drop its entries from shared caches
+    """
+
+    def __init__(self, open_tenant: Callable[[str], TenantKnowledgeBase], max_open: int = 8,
+                 on_close: Optional[Callable[[str], None]] = None):
+        self.open_tenant = open_tenant
+        self.on_close = on_close
+        self.max_open = max(1, max_open)
+        self.hits = 0
+        self.opened = 0
+        self.evictions = 0
+        self._open: "OrderedDict[str, TenantKnowledgeBase]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._opening: Dict[str, threading.Lock] = {}
+
+    def get(self, name: str) -> TenantKnowledgeBase:
+        """The tenant's knowledge base, opened on first use."""
+        with self._lock:
+            kb = self._open.get(name)
+            if kb is not None:
+                self._open.move_to_end(name)
+                self.hits += 1
+                return kb
+            opening = self._opening.setdefault(name, threading.Lock())
+        # Opening touches ChromaDB; other tenants aren't held up meanwhile
+        with opening:
+            with self._lock:
+                kb = self._open.get(name)
+                if kb is not None:
+                    self._open.move_to_end(name)
+                    self.hits += 1
+                    return kb
+            kb = self.open_tenant(validate_tenant(name))
+            with self._lock:
+                self._open[name] = kb
+                self.opened += 1
+                self._opening.pop(name, None)
+                evicted = []
+                while len(self._open) > self.max_open:
+                    evicted.append(self._open.popitem(last=False)[1])
+                    self.evictions += 1
+        for old in evicted:
+            # Requests already running against it keep their reference and finish normally
+            self._close(old)
+            logger.info("Closed tenant %s (least recently used of %d open)", old.name, self.max_open)
+        logger.info("Opened tenant %s", name)
+        return kb
+
+    def evict(self, name: str) -> bool:
+        """Close a tenant now (e.g. after deleting its data). Returns whether it was open."""
+        with self._lock:
+            kb = self._open.pop(name, None)
+        if kb is None:
+            return False
+        self._close(kb)
+        return True
+
+    def _close(self, kb: TenantKnowledgeBase) -> None:
+        kb.close()
+        if self.on_close is not None:
+            self.on_close(kb.name)
+
+    def open_tenants(self) -> List[str]:
+        """Open tenants, least recently used first."""
+        with self._lock:
+            return list(self._open)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "open": list(self._open),
+                "max_open": self.max_open,
+                "hits": self.hits,
+                "opened": self.opened,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,190 @@
+"""
+Persistent cache of text extracted from PDF and Word documents.
+
+Parsing a large PDF with PyPDF2 is the slowest step of ingesting it, and it
+used to be repeated on every reload, every re-ingest after a chunking change
+and every embedding experiment, although the source bytes hadn't changed.
+ExtractionCache keeps the extracted text in SQLite instead:
+
+- Keyed by (SHA-256 of the file's bytes, extractor version). Renaming or
+  moving a file still hits; editing it, or upgrading PyPDF2/python-docx (see
+  telecom_advisor_jobs.extractor_version), misses and re-extracts.
+- One row per page, zlib-compressed, so a document's pages come back in
+  order without re-parsing anything
+- Bounded by `max_mb` of compressed text; the least recently used documents
+  are dropped beyond it
+
+Connections are per thread and opened lazily, like ConversationStore.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    file_hash TEXT NOT NULL,
+    extractor TEXT NOT NULL,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    pages INTEGER NOT NULL,
+    text_bytes INTEGER NOT NULL,
+    stored_bytes INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    last_used TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (file_hash, extractor)
+);
+CREATE INDEX IF NOT EXISTS documents_last_used ON documents (last_used);
+CREATE TABLE IF NOT EXISTS pages (
+    file_hash TEXT NOT NULL,
+    extractor TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    text BLOB NOT NULL,
+    PRIMARY KEY (file_hash, extractor, page)
+) WITHOUT ROWID;
+"""
+
+
+class ExtractionCache:
+    """
+    Per-page extracted text of documents, keyed by content hash and extractor version.
+
+    Args:
+        path: SQLite database file (created if missing)
+        max_mb: Compressed text kept before the least recently used documents are dropped (0 = no limit)
+    """
+
+    def __init__(self, path: str = "extraction_cache.db", max_mb: float = 1024):
+        self.path = path
+        self.max_mb = max_mb
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # a lost entry is only re-extracted
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(_SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def get(self, file_hash: str, extractor: str) -> Optional[List[str]]:
+        """Cached page texts of a document, or None if it wasn't extracted with this extractor before."""
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT text FROM pages WHERE file_hash = ? AND extractor = ? ORDER BY page",
+            (file_hash, extractor)
+        ).fetchall()
+        document = conn.execute(
+            "SELECT pages FROM documents WHERE file_hash = ? AND extractor = ?", (file_hash, extractor)
+        ).fetchone()
+        if document is None or len(rows) != document["pages"]:
+            self.misses += 1
+            return None
+        conn.execute(
+            "UPDATE documents SET hits = hits + 1, last_used = ? WHERE file_hash = ? AND extractor = ?",
+            (datetime.now().isoformat(), file_hash, extractor)
+        )
+        self.hits += 1
+        return [zlib.decompress(row["text"]).decode("utf-8") for row in rows]
+
+    def put(self, file_hash: str, extractor: str, name: str, kind: str, pages: List[str]) -> None:
+        """Store a document's page texts, replacing any earlier entry for the same key."""
+        compressed = [zlib.compress(text.encode("utf-8"), 6) for text in pages]
+        text_bytes = sum(len(text.encode("utf-8")) for text in pages)
+        now = datetime.now().isoformat()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM pages WHERE file_hash = ? AND extractor = ?", (file_hash, extractor))
+            conn.executemany(
+                "INSERT INTO pages (file_hash, extractor, page, text) VALUES (?, ?, ?, ?)",
+                [(file_hash, extractor, number, blob) for number, blob in enumerate(compressed)]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (file_hash, extractor, name, kind, pages, text_bytes, "
+                "stored_bytes, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (file_hash, extractor, name, kind, len(pages), text_bytes, sum(map(len, compressed)), now, now)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._trim()
+
+    def _trim(self) -> None:
+        """Drop least recently used documents until the cache is within max_bytes."""
+        if not self.max_bytes:
+            return
+        conn = self._connection()
+        total = conn.execute("SELECT COALESCE(SUM(stored_bytes), 0) FROM documents").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for row in conn.execute("SELECT file_hash, extractor, name, stored_bytes FROM documents "
+                                "ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.remove(row["file_hash"], row["extractor"])
+            total -= row["stored_bytes"]
+            logger.info("Dropped cached text of %s (least recently used)", row["name"])
+
+    def remove(self, file_hash: str, extractor: Optional[str] = None) -> int:
+        """Forget a document's cached text (every extractor version unless one is given). Returns entries removed."""
+        conn = self._connection()
+        where, params = ("file_hash = ? AND extractor = ?", (file_hash, extractor)) if extractor \
+            else ("file_hash = ?", (file_hash,))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"DELETE FROM pages WHERE {where}", params)
+            removed = conn.execute(f"DELETE FROM documents WHERE {where}", params).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return removed
+
+    def documents(self, limit: int = 50) -> List[Dict]:
+        """Cached documents, most recently used first."""
+        rows = self._connection().execute(
+            "SELECT name, kind, file_hash, extractor, pages, text_bytes, stored_bytes, created_at, last_used, hits "
+            "FROM documents ORDER BY last_used DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self) -> Dict:
+        """Documents, pages and sizes cached, plus this process's hits and misses."""
+        conn = self._connection()
+        documents, pages, text_bytes, stored_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(pages), 0), COALESCE(SUM(text_bytes), 0), "
+            "COALESCE(SUM(stored_bytes), 0) FROM documents"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "documents": documents,
+            "pages": pages,
+            "text_mb": round(text_bytes / 1024 / 1024, 2),
+            "stored_mb": round(stored_bytes / 1024 / 1024, 2),
+            "max_mb": self.max_mb,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
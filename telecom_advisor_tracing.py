@@ -0,0 +1,252 @@
+"""
+Per-stage latency tracing for the Telecom Architecture Advisor.
+
+request_trace() opens a trace for one request (a chat turn, an ingestion) in a
+context variable; span() blocks anywhere below it, including worker threads
+started with a copied context, add their elapsed time to that trace under a
+stage name such as "retrieval.bm25_build" or "gemini.call". When the request
+finishes the per-stage timings are logged to "telecom_advisor.timing" as
+structured fields (one JSON line in the log file), handed to any registered
+listeners (e.g. metrics), and returned to the caller.
+
+Requests slower than a threshold can also keep a profile: pyinstrument (HTML)
+when it is installed, cProfile (.prof plus a top-functions log) otherwise.
+"""
+
+import contextvars
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+timing_logger = logging.getLogger("telecom_advisor.timing")
+
+try:
+    from pyinstrument import Profiler as _PyinstrumentProfiler
+except ImportError:
+    _PyinstrumentProfiler = None
+
+
+class Trace:
+    """Accumulated stage timings for one request."""
+
+    def __init__(self, name: str, attrs: Optional[Dict] = None):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.attrs: Dict = dict(attrs or {})
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self._spans: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._spans.setdefault(stage, {"seconds": 0.0, "count": 0})
+            entry["seconds"] += seconds
+            entry["count"] += 1
+
+    def annotate(self, **attrs) -> None:
+        """Attach extra fields (status, sizes, flags) to the structured log line."""
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def elapsed(self) -> float:
+        return self.duration if self.duration is not None else time.perf_counter() - self.started
+
+    def timings(self) -> Dict[str, float]:
+        """Milliseconds per stage plus "total"."""
+        with self._lock:
+            result = {stage: round(entry["seconds"] * 1000, 2) for stage, entry in self._spans.items()}
+        result["total"] = round(self.elapsed() * 1000, 2)
+        return result
+
+    def stage_seconds(self) -> Dict[str, float]:
+        """Total seconds per stage."""
+        with self._lock:
+            return {stage: entry["seconds"] for stage, entry in self._spans.items()}
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            spans = {stage: {"ms": round(entry["seconds"] * 1000, 2), "count": entry["count"]}
+                     for stage, entry in self._spans.items()}
+            attrs = dict(self.attrs)
+        return {
+            "event": "trace",
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "total_ms": round(self.elapsed() * 1000, 2),
+            "spans": spans,
+            **attrs,
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+
+_listeners: List[Callable[[Trace], None]] = []
+# Start hooks return a callback run when the span/trace ends (used for memory diagnostics)
+_span_hooks: List[Callable[[Trace, str], Callable[[], None]]] = []
+_trace_hooks: List[Callable[[Trace], Callable[[], None]]] = []
+
+# Only one profiler may be active per process (cProfile and pyinstrument both hook the interpreter)
+_profile_lock = threading.Lock()
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def add_trace_listener(listener: Callable[[Trace], None]) -> None:
+    """Call listener(trace) whenever a top-level request trace finishes."""
+    _listeners.append(listener)
+
+
+def add_span_hook(hook: Callable[[Trace, str], Callable[[], None]]) -> None:
+    """Call hook(trace, stage) as each span starts; the callback it returns runs when the span ends."""
+    _span_hooks.append(hook)
+
+
+def add_trace_hook(hook: Callable[[Trace], Callable[[], None]]) -> None:
+    """Call hook(trace) as each top-level trace starts; the callback it returns runs when it ends."""
+    _trace_hooks.append(hook)
+
+
+def _run_finishers(finishers: List[Callable[[], None]]) -> None:
+    for finish in reversed(finishers):
+        try:
+            finish()
+        except Exception as e:
+            logger.warning(f"Tracing hook failed: {e}")
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the enclosed block as `stage` in the current trace (no-op outside a trace)."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    finishers = [hook(trace, stage) for hook in _span_hooks]
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(stage, time.perf_counter() - start)
+        if finishers:
+            _run_finishers(finishers)
+
+
+def traced(stage: str) -> Callable:
+    """Decorator form of span()."""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _start_profiler():
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        if _PyinstrumentProfiler is not None:
+            profiler = _PyinstrumentProfiler()
+        else:
+            profiler = cProfile.Profile()
+        profiler.enable() if isinstance(profiler, cProfile.Profile) else profiler.start()
+        return profiler
+    except Exception as e:
+        _profile_lock.release()
+        logger.warning(f"Could not start profiler: {e}")
+        return None
+
+
+def _stop_profiler(profiler, trace: Trace, keep: bool, profile_dir: str) -> Optional[str]:
+    try:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+        if not keep:
+            return None
+        os.makedirs(profile_dir, exist_ok=True)
+        stem = os.path.join(profile_dir, f"{datetime.now():%Y%m%d_%H%M%S}_{trace.name}_{trace.trace_id}")
+        if isinstance(profiler, cProfile.Profile):
+            path = f"{stem}.prof"
+            profiler.dump_stats(path)
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(15)
+            logger.info(f"Slow request profile ({trace.name} {trace.trace_id}):\n{summary.getvalue()}")
+        else:
+            path = f"{stem}.html"
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+        return path
+    except Exception as e:
+        logger.warning(f"Could not save profile: {e}")
+        return None
+    finally:
+        _profile_lock.release()
+
+
+@contextmanager
+def request_trace(
+    name: str,
+    profile_threshold: Optional[float] = None,
+    profile_dir: str = "profiles",
+    **attrs
+) -> Iterator[Trace]:
+    """
+    Trace one request and log its stage timings when it completes.
+
+    A request_trace nested inside another joins the outer trace instead of
+    starting a new one, so e.g. a batch upload reports all its files together.
+
+    Args:
+        name: Request type ("advice", "ingest", ...)
+        profile_threshold: Seconds; when set, the request is profiled and the
+            profile is kept only if the request took at least this long
+        profile_dir: Directory for saved profiles
+        **attrs: Extra fields for the structured log line
+    """
+    outer = _current_trace.get()
+    if outer is not None:
+        outer.annotate(**attrs)
+        yield outer
+        return
+
+    trace = Trace(name, attrs)
+    token = _current_trace.set(trace)
+    finishers = [hook(trace) for hook in _trace_hooks]
+    if finishers:
+        trace.started = time.perf_counter()  # keep hook overhead out of the request latency
+    profiler = _start_profiler() if profile_threshold else None
+    try:
+        yield trace
+    finally:
+        trace.duration = time.perf_counter() - trace.started
+        _current_trace.reset(token)
+        if finishers:
+            _run_finishers(finishers)
+        if profiler is not None:
+            path = _stop_profiler(profiler, trace, trace.duration >= profile_threshold, profile_dir)
+            if path:
+                trace.annotate(profile=path)
+        if timing_logger.isEnabledFor(logging.INFO):
+            timing_logger.info("trace %s %s %.1f ms", trace.name, trace.trace_id, trace.elapsed() * 1000,
+                               extra={"trace": trace.as_dict()})
+        for listener in _listeners:
+            try:
+                listener(trace)
+            except Exception as e:
+                logger.warning(f"Trace listener failed: {e}")
@@ -0,0 +1,210 @@
+"""
+Cache warm-up from analytics history for the Telecom Architecture Advisor.
+
+After a restart every cache is empty, so the first users to ask the usual
+questions pay for the embedding, the hybrid search (and rerank) and the Gemini
+call. analytics.json records every question asked; the most frequent ones are
+a good forecast of the next hour's traffic. CacheWarmer replays them on a
+background thread:
+
+- Retrieval phase: each of the top-N questions (most frequent first) is
+  embedded and retrieved once, filling the query-embedding and retrieval-result
+  caches. Readiness is tied to this phase: the projected hit rate is the share
+  of the top-N questions' historical traffic that is now served from cache,
+  and the warmer reports ready only once it reaches the target, or once
+  `max_wait` has passed.
+- Answer phase (optional): up to `answer_budget` of the most frequent
+  questions are answered through the regular, rate-limited Gemini client,
+  one at a time with `answer_interval` seconds between calls, filling the
+  answer cache. It stops at the first failure so an open circuit breaker or
+  a 429 doesn't burn the budget on retries.
+
+The warmer knows nothing about the advisor; it is handed callables for the
+work so this module only uses the standard library.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def top_queries(analytics: Dict, limit: int,
+                normalize: Callable[[str], str] = str.strip) -> Tuple[List[Tuple[str, int]], int]:
+    """
+    Most frequent questions in analytics history.
+
+    Args:
+        analytics: Parsed analytics.json ({"queries": [{"query": ..., ...}], ...})
+        limit: Questions returned at most
+        normalize: Maps a question to the key questions are counted under
+            (e.g. normalize_prompt, so case and whitespace don't split counts)
+
+    Returns:
+        ([(question, count)] most frequent first, total questions in history);
+        each question is its most recent wording
+    """
+    counts: Counter = Counter()
+    wording: Dict[str, str] = {}
+    total = 0
+    for entry in analytics.get("queries", []):
+        query = (entry.get("query") or "").strip()
+        if not query:
+            continue
+        key = normalize(query)
+        counts[key] += 1
+        wording[key] = query
+        total += 1
+    return [(wording[key], count) for key, count in counts.most_common(limit)], total
+
+
+class CacheWarmer:
+    """
+    Prefetches caches for frequent past questions on a background thread.
+
+    Args:
+        queries: [(question, count)] most frequent first, as from top_queries()
+        history_total: Questions in the whole history, to report how much of it the top N covers
+        warm_query: Embeds and retrieves a question, filling the caches
+        is_warm: Whether a question's retrieval is now served from cache
+        generate: Answers a question and caches the answer; returns False if it was already cached
+        answer_budget: Most answers generated (0 = retrieval only)
+        answer_interval: Seconds between answer generations
+        target_hit_rate: Projected hit rate at which the warmer reports ready
+        max_wait: Seconds after start() at which it reports ready regardless (None = wait for the target)
+    """
+
+    def __init__(
+        self,
+        queries: List[Tuple[str, int]],
+        history_total: int,
+        warm_query: Callable[[str], None],
+        is_warm: Callable[[str], bool],
+        generate: Optional[Callable[[str], bool]] = None,
+        answer_budget: int = 0,
+        answer_interval: float = 1.0,
+        target_hit_rate: float = 0.9,
+        max_wait: Optional[float] = None
+    ):
+        self.queries = queries
+        self.history_total = history_total
+        self.warm_query = warm_query
+        self.is_warm = is_warm
+        self.generate = generate
+        self.answer_budget = answer_budget if generate is not None else 0
+        self.answer_interval = answer_interval
+        self.target_hit_rate = target_hit_rate
+        self.max_wait = max_wait
+        self.weight = sum(count for _, count in queries)
+        self.warmed = 0
+        self.warm_weight = 0
+        self.errors = 0
+        self.answers_generated = 0
+        self.answer_error: Optional[str] = None
+        self.phase = "idle"
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "CacheWarmer":
+        """Start warming on a daemon thread (once)."""
+        with self._cond:
+            if self._thread is not None:
+                return self
+            self.started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="cache-warmup", daemon=True)
+        self._thread.start()
+        return self
+
+    def hit_rate(self) -> float:
+        """Share of the top-N questions' historical traffic that is warm (1.0 with no history)."""
+        return self.warm_weight / self.weight if self.weight else 1.0
+
+    def _timed_out(self) -> bool:
+        return (self.max_wait is not None and self.started_at is not None
+                and time.monotonic() - self.started_at >= self.max_wait)
+
+    @property
+    def ready(self) -> bool:
+        """Target hit rate reached, or max_wait passed."""
+        return self.hit_rate() >= self.target_hit_rate or self._timed_out()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until ready (or `timeout` seconds, bounded by max_wait). Returns whether it is."""
+        limit = self.max_wait if timeout is None else min(timeout, self.max_wait or timeout)
+        deadline = None if limit is None else time.monotonic() + limit
+        with self._cond:
+            while not self.ready:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(timeout=remaining if remaining is not None else 1.0)
+        if not self.ready:
+            return False
+        if self.hit_rate() < self.target_hit_rate:
+            logger.warning("Cache warm-up reached %.0f%% hit rate against a %.0f%% target in %gs; "
+                           "reporting ready anyway", self.hit_rate() * 100, self.target_hit_rate * 100,
+                           self.max_wait)
+        return True
+
+    def _run(self) -> None:
+        self.phase = "retrieval"
+        for query, count in self.queries:
+            try:
+                self.warm_query(query)
+                warm = self.is_warm(query)
+            except Exception as e:
+                logger.warning("Cache warm-up failed for %.60r: %s", query, e)
+                self.errors += 1
+                warm = False
+            with self._cond:
+                self.warmed += 1
+                if warm:
+                    self.warm_weight += count
+                self._cond.notify_all()
+        logger.info("Cache warm-up: %d of %d frequent questions warm (%.0f%% projected hit rate)",
+                    self.warmed - self.errors, len(self.queries), self.hit_rate() * 100)
+
+        if self.answer_budget:
+            self.phase = "answers"
+            self._generate_answers()
+        self.phase = "done"
+        self.finished_at = time.monotonic()
+
+    def _generate_answers(self) -> None:
+        for query, _ in self.queries[:self.answer_budget]:
+            try:
+                if not self.generate(query):
+                    continue
+            except Exception as e:
+                # Most likely the circuit is open or the API is rate-limiting us; leave it for real users
+                self.answer_error = f"{type(e).__name__}: {e}"
+                logger.warning("Stopping answer pre-generation after %d answers: %s",
+                               self.answers_generated, self.answer_error)
+                return
+            self.answers_generated += 1
+            time.sleep(self.answer_interval)
+
+    def stats(self) -> Dict:
+        """Progress, projected hit rate and answer budget use."""
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.monotonic()) - self.started_at, 3)
+        return {
+            "phase": self.phase,
+            "ready": self.ready,
+            "queries": len(self.queries),
+            "warmed": self.warmed,
+            "errors": self.errors,
+            "hit_rate": round(self.hit_rate(), 4),
+            "target_hit_rate": self.target_hit_rate,
+            "history_coverage": round(self.weight / self.history_total, 4) if self.history_total else 0.0,
+            "answers_generated": self.answers_generated,
+            "answer_budget": self.answer_budget,
+            "answer_error": self.answer_error,
+            "seconds": elapsed,
+        }
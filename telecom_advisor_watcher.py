@@ -0,0 +1,288 @@
+"""
+Incremental knowledge-base sync for the Telecom Architecture Advisor.
+
+KnowledgeBaseWatcher watches the seed directory and the enabled sources in
+knowledge_sources.json for documents being added, modified and removed, and
+hands each changed file to a sync callback (telecom_advisor_enhanced.sync_file),
+which re-ingests or drops just that document instead of a full reload.
+
+- Events come from watchdog (inotify on Linux) when it is installed, with a
+  polling scan of file sizes and modification times as the fallback
+  (WATCH_BACKEND=polling forces it, e.g. for network filesystems)
+- Bursts are debounced per file: a path is synced once it has been quiet for
+  `debounce` seconds, so a slow copy or an editor's save produces one update
+- Due paths go onto a work queue drained by a single worker thread, so
+  updates are applied one at a time while queries keep being served from the
+  current index; the advisor makes each update visible atomically
+
+With watchdog, a directory moved out of a watched tree is not noticed until
+its files are touched again; the polling backend catches it on the next scan.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+_IGNORED_EVENTS = {"opened", "closed_no_write"}
+
+
+class WatchRoot:
+    """
+    A watched file or directory and the metadata its documents are ingested with.
+
+    Args:
+        path: File or directory
+        topic: Topic tag (None = the file name without extension, like the seed loader)
+        domain: Domain tag
+        recursive: Whether subdirectories are watched too
+    """
+
+    def __init__(self, path: str, topic: Optional[str] = None, domain: str = "telecom", recursive: bool = True):
+        self.path = os.path.abspath(path)
+        self.topic = topic
+        self.domain = domain
+        self.recursive = recursive
+
+    def covers(self, path: str) -> bool:
+        if path == self.path:
+            return True
+        if not path.startswith(self.path + os.sep):
+            return False
+        return self.recursive or os.path.dirname(path) == self.path
+
+    def __repr__(self) -> str:
+        return f"WatchRoot({self.path!r}, topic={self.topic!r}, domain={self.domain!r}, recursive={self.recursive})"
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "KnowledgeBaseWatcher"):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event) -> None:
+        if event.event_type in _IGNORED_EVENTS:
+            return
+        paths = [event.src_path, getattr(event, "dest_path", "")]
+        for path in filter(None, paths):
+            path = os.fsdecode(path)
+            if not event.is_directory:
+                self.watcher.notify(path)
+            elif event.event_type in ("created", "moved") and os.path.isdir(path):
+                # A folder copied or moved in arrives as one event for the folder
+                for file_path in self.watcher.walk(path):
+                    self.watcher.notify(file_path)
+
+
+class KnowledgeBaseWatcher:
+    """
+    Debounced file watcher feeding a single-threaded sync queue.
+
+    Args:
+        roots: Files and directories to watch
+        sync: Called as sync(path, root) for each changed path, on the worker thread;
+            the path may no longer exist (the file was removed)
+        extensions: File extensions to watch, e.g. (".pdf", ".md")
+        debounce: Seconds a file must go without events before it is synced
+        poll_interval: Seconds between scans with the polling backend
+        backend: "auto" (watchdog if installed, else polling), "watchdog" or "polling"
+    """
+
+    def __init__(self, roots: List[WatchRoot], sync: Callable[[str, WatchRoot], object],
+                 extensions: Iterable[str], debounce: float = 2.0, poll_interval: float = 5.0,
+                 backend: str = "auto"):
+        self.roots = roots
+        self.sync = sync
+        self.extensions = {ext.lower() for ext in extensions}
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.requested_backend = backend
+        self.backend: Optional[str] = None
+        self.synced = 0
+        self.errors = 0
+        self.last_sync: Optional[Dict] = None
+        self._pending: Dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._work: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._stop = threading.Event()
+        self._observer = None
+        self._threads: List[threading.Thread] = []
+
+    # --- Lifecycle ---
+
+    def start(self) -> "KnowledgeBaseWatcher":
+        """Start watching; returns self."""
+        if self.backend is not None:
+            return self
+        self.backend = self._start_watchdog() if self.requested_backend in ("auto", "watchdog") else None
+        if self.backend is None:
+            if self.requested_backend == "watchdog":
+                logger.warning("watchdog backend unavailable; polling the knowledge base instead")
+            self.backend = "polling"
+            self._spawn(self._poll_loop, "kb-watch-poll")
+        self._spawn(self._debounce_loop, "kb-watch-debounce")
+        self._spawn(self._work_loop, "kb-watch-sync")
+        logger.info("Watching %d knowledge source(s) with %s (debounce %.1fs)",
+                    len(self.roots), self.backend, self.debounce)
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop watching; a sync already running is allowed to finish."""
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+        with self._cond:
+            self._cond.notify_all()
+        self._work.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _spawn(self, target: Callable[[], None], name: str) -> None:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _start_watchdog(self) -> Optional[str]:
+        if Observer is None:
+            return None
+        observer = Observer()
+        handler = _EventHandler(self)
+        directories: Dict[str, bool] = {}
+        for root in self.roots:
+            # A single file is watched through its directory; notify() filters the rest out
+            directory = root.path if os.path.isdir(root.path) else os.path.dirname(root.path)
+            if os.path.isdir(directory):
+                recursive = root.recursive and directory == root.path
+                directories[directory] = directories.get(directory, False) or recursive
+        for directory, recursive in directories.items():
+            observer.schedule(handler, directory, recursive=recursive)
+        try:
+            observer.start()
+        except OSError as e:  # e.g. the inotify watch limit
+            logger.warning("Could not start file watcher (%s); falling back to polling", e)
+            return None
+        self._observer = observer
+        return "watchdog"
+
+    # --- Events ---
+
+    def root_for(self, path: str) -> Optional[WatchRoot]:
+        """The root a path belongs to, or None if it isn't a watched document."""
+        name = os.path.basename(path)
+        # Hidden files, editor swap files and Office lock files (~$report.docx)
+        if name.startswith((".", "~")) or os.path.splitext(name)[1].lower() not in self.extensions:
+            return None
+        return next((root for root in self.roots if root.covers(path)), None)
+
+    def notify(self, path: str) -> None:
+        """Record a change to path; it is synced once no further change arrives for `debounce` seconds."""
+        path = os.path.abspath(path)
+        if self.root_for(path) is None:
+            return
+        with self._cond:
+            self._pending[path] = time.monotonic() + self.debounce
+            self._cond.notify()
+
+    def walk(self, directory: str) -> Iterator[str]:
+        for dirpath, _dirs, files in os.walk(directory):
+            for name in files:
+                yield os.path.join(dirpath, name)
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        """Size and mtime of every watched document."""
+        state: Dict[str, Tuple[int, int]] = {}
+        for root in self.roots:
+            if os.path.isdir(root.path):
+                paths = self.walk(root.path) if root.recursive else (
+                    os.path.join(root.path, name) for name in os.listdir(root.path))
+            else:
+                paths = [root.path]
+            for path in paths:
+                if path in state or self.root_for(path) is not root:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if os.path.isfile(path):
+                    state[path] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    # --- Threads ---
+
+    def _poll_loop(self) -> None:
+        previous = self._scan()
+        while not self._stop.wait(self.poll_interval):
+            try:
+                current = self._scan()
+            except OSError as e:
+                logger.warning("Knowledge-base scan failed: %s", e)
+                continue
+            for path in current.keys() | previous.keys():
+                if current.get(path) != previous.get(path):
+                    self.notify(path)
+            previous = current
+
+    def _debounce_loop(self) -> None:
+        while not self._stop.is_set():
+            with self._cond:
+                now = time.monotonic()
+                due = [path for path, deadline in self._pending.items() if deadline <= now]
+                if not due:
+                    wait = min(self._pending.values(), default=now + 60) - now
+                    self._cond.wait(wait)
+                    continue
+                for path in due:
+                    del self._pending[path]
+            for path in sorted(due):
+                self._work.put(path)
+
+    def _work_loop(self) -> None:
+        while True:
+            path = self._work.get()
+            if path is None or self._stop.is_set():
+                return
+            root = self.root_for(path)
+            if root is None:
+                continue
+            start = time.perf_counter()
+            action = "removed" if not os.path.exists(path) else "changed"
+            ok = True
+            try:
+                self.sync(path, root)
+                self.synced += 1
+            except Exception as e:
+                ok = False
+                self.errors += 1
+                logger.exception("Sync of %s failed: %s", path, e)
+            self.last_sync = {
+                "path": path,
+                "action": action,
+                "ok": ok,
+                "seconds": round(time.perf_counter() - start, 3),
+                "at": time.time(),
+            }
+
+    def stats(self) -> Dict:
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "backend": self.backend,
+            "roots": [root.path for root in self.roots],
+            "pending": pending,
+            "queued": self._work.qsize(),
+            "synced": self.synced,
+            "errors": self.errors,
+            "last_sync": self.last_sync,
+        }
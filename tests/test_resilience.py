@@ -0,0 +1,70 @@
+"""Circuit breaker and hedging behaviour around request deadlines (telecom_advisor_resilience)."""
+
+import os
+import sys
+import time
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+
+from telecom_advisor_resilience import (  # noqa: E402
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    Hedger,
+    LatencyTracker,
+    deadline_scope,
+    guarded_timeout,
+)
+
+
+def half_open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+
+def test_expired_deadline_does_not_take_half_open_trial():
+    breaker = half_open_breaker()
+    with deadline_scope(0):
+        with pytest.raises(DeadlineExceeded):
+            guarded_timeout(breaker, 30)
+    # The next call is still let through as the trial
+    assert guarded_timeout(breaker, 30) == 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_released_trial_allows_next_call():
+    breaker = half_open_breaker()
+    breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.release()
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def slow_call():
+    time.sleep(2.0)
+    return "late"
+
+
+@pytest.mark.parametrize("hedge_delay", [0.05, 5.0])
+def test_hedged_call_stops_at_deadline(hedge_delay):
+    hedger = Hedger(LatencyTracker(), initial_delay=hedge_delay, min_delay=hedge_delay, max_workers=4)
+    start = time.monotonic()
+    with deadline_scope(0.2):
+        with pytest.raises(DeadlineExceeded):
+            hedger.call(slow_call)
+    assert time.monotonic() - start < 1.0
+    assert hedger.hedges_sent == (1 if hedge_delay < 0.2 else 0)
+
+
+def test_hedged_call_returns_fast_result_within_deadline():
+    hedger = Hedger(LatencyTracker(), initial_delay=0.05, min_delay=0.05, max_workers=4)
+    with deadline_scope(1.0):
+        assert hedger.call(lambda: "ok") == "ok"
@@ -0,0 +1,81 @@
+"""sync_file keeping the knowledge base in line with renamed files (telecom_advisor_enhanced)."""
+
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+
+chromadb = pytest.importorskip("chromadb")
+
+ALPHA = "Alpha document about 5G core network slicing and the session management function."
+BETA = "Beta document about BSS billing, rating and charging for prepaid subscribers."
+
+
+def fake_embeddings(texts):
+    return [[float(len(text)), float(sum(map(ord, text)) % 997), 1.0] for text in texts]
+
+
+@pytest.fixture(scope="module")
+def advisor(tmp_path_factory):
+    """The advisor, run from a scratch directory so ./chroma_db and analytics.json aren't touched."""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("advisor"))
+    try:
+        import telecom_advisor_enhanced
+        yield telecom_advisor_enhanced
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def knowledge_base(advisor, monkeypatch):
+    """An empty in-memory collection, embedded with a cheap deterministic function."""
+    client = chromadb.EphemeralClient()
+    collection = client.get_or_create_collection(name="sync_test", embedding_function=None)
+    monkeypatch.setattr(advisor, "embedding_function", fake_embeddings)
+    monkeypatch.setattr(advisor, "collection", collection)
+    monkeypatch.setattr(advisor, "shard_set", None)
+    try:
+        yield collection
+    finally:
+        client.delete_collection("sync_test")
+
+
+def indexed(collection):
+    """{source_path: {file_hash}} of the chunks in the collection."""
+    paths = {}
+    for meta in collection.get(include=["metadatas"])["metadatas"]:
+        paths.setdefault(meta["source_path"], set()).add(meta["file_hash"])
+    return paths
+
+
+@pytest.mark.parametrize("removed_first", [False, True])
+def test_rename_over_another_file(advisor, knowledge_base, tmp_path, removed_first):
+    a, b = str(tmp_path / "a.md"), str(tmp_path / "b.md")
+    with open(a, "w") as f:
+        f.write(ALPHA)
+    with open(b, "w") as f:
+        f.write(BETA)
+    beta_hash = advisor.file_sha256(b)
+    assert advisor.sync_file(a) and advisor.sync_file(b)
+
+    os.replace(b, a)  # mv b.md a.md: a.md modified, b.md removed
+    events = [b, a] if removed_first else [a, b]
+    for path in events:
+        advisor.sync_file(path)
+
+    assert indexed(knowledge_base) == {advisor.source_key(a): {beta_hash}}
+
+
+def test_unchanged_file_is_left_alone(advisor, knowledge_base, tmp_path):
+    a = str(tmp_path / "a.md")
+    with open(a, "w") as f:
+        f.write(ALPHA)
+    assert advisor.sync_file(a)
+    ids = knowledge_base.get()["ids"]
+
+    assert advisor.sync_file(a) == 0
+    assert knowledge_base.get()["ids"] == ids